@@ -0,0 +1,175 @@
+"""ZIP/TAR input and output for the date watermark CLI.
+
+Members are streamed out of the source archive one at a time (never
+extracted to disk), rendered by a thread pool and written in input order
+by a single writer into the output archive. Already-compressed images are
+stored in ZIPs without deflating them again. The output is written to a
+".part" file and renamed when complete.
+"""
+
+import io
+import os
+import posixpath
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional, Set, Tuple
+
+
+ZIP_EXTS = (".zip",)
+TAR_EXTS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+STORED_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+# Range of the DOS timestamps stored in ZIP entries
+ZIP_MIN_DATE = (1980, 1, 1, 0, 0, 0)
+ZIP_MAX_DATE = (2107, 12, 31, 23, 59, 58)
+
+# (member name, data, mtime)
+Member = Tuple[str, bytes, float]
+
+
+def is_archive(path: str) -> bool:
+	lower = str(path).lower()
+	return lower.endswith(ZIP_EXTS) or lower.endswith(TAR_EXTS)
+
+
+def archive_suffix(path: str) -> str:
+	"""'.zip', '.tar.gz', ... (the full archive suffix of path)."""
+	lower = str(path).lower()
+	for ext in sorted(ZIP_EXTS + TAR_EXTS, key=len, reverse=True):
+		if lower.endswith(ext):
+			return str(path)[-len(ext):]
+	return ""
+
+
+def safe_member_name(name: str) -> str:
+	"""Drop absolute prefixes, drive letters and '..' so members cannot escape the output."""
+	parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..") and not p.endswith(":")]
+	return "/".join(parts)
+
+
+def iter_members(path: str, accept: Callable[[str], bool]) -> Iterator[Member]:
+	"""Yield accepted file members in archive order."""
+	if str(path).lower().endswith(ZIP_EXTS):
+		with zipfile.ZipFile(path) as zf:
+			for info in zf.infolist():
+				name = safe_member_name(info.filename)
+				if info.is_dir() or not name or not accept(name):
+					continue
+				yield name, zf.read(info), time.mktime(info.date_time + (0, 0, -1))
+	else:
+		# Stream mode: compressed tars are read sequentially without seeking
+		with tarfile.open(path, "r|*") as tf:
+			for info in tf:
+				name = safe_member_name(info.name)
+				if not info.isfile() or not name or not accept(name):
+					continue
+				fp = tf.extractfile(info)
+				if fp is not None:
+					yield name, fp.read(), float(info.mtime)
+
+
+def zip_date_time(mtime: float) -> Tuple[int, int, int, int, int, int]:
+	"""Local time for a ZIP entry, clamped to the 1980-2107 range ZIP can represent."""
+	try:
+		value = tuple(time.localtime(mtime)[:6])
+	except (OverflowError, OSError, ValueError):
+		value = ZIP_MIN_DATE if mtime < 0 else ZIP_MAX_DATE
+	return max(ZIP_MIN_DATE, min(ZIP_MAX_DATE, value))
+
+
+class ArchiveWriter:
+	"""Sequential ZIP/TAR writer; duplicate names get a numeric suffix."""
+
+	def __init__(self, path: str) -> None:
+		self.path = str(path)
+		self._tmp = self.path + ".part"
+		self._names: Set[str] = set()
+		lower = self.path.lower()
+		if lower.endswith(ZIP_EXTS):
+			self._zip: Optional[zipfile.ZipFile] = zipfile.ZipFile(self._tmp, "w", allowZip64=True)
+			self._tar: Optional[tarfile.TarFile] = None
+		else:
+			mode = {".gz": "w:gz", ".tgz": "w:gz", ".bz2": "w:bz2", ".tbz2": "w:bz2",
+				".xz": "w:xz", ".txz": "w:xz"}.get(os.path.splitext(lower)[1], "w")
+			self._zip = None
+			self._tar = tarfile.open(self._tmp, mode)
+
+	def add(self, name: str, data: bytes, mtime: Optional[float]) -> str:
+		name = safe_member_name(name) or "image"
+		stem, ext = posixpath.splitext(name)
+		i = 1
+		while name in self._names:
+			name = f"{stem}_{i}{ext}"
+			i += 1
+		self._names.add(name)
+		if mtime is None:
+			mtime = time.time()
+		if self._zip is not None:
+			info = zipfile.ZipInfo(name, zip_date_time(mtime))
+			info.compress_type = zipfile.ZIP_STORED if ext.lower() in STORED_EXTS else zipfile.ZIP_DEFLATED
+			self._zip.writestr(info, data)
+		else:
+			info = tarfile.TarInfo(name)
+			info.size = len(data)
+			info.mtime = int(mtime)
+			self._tar.addfile(info, io.BytesIO(data))
+		return name
+
+	def close(self, commit: bool = True) -> None:
+		(self._zip or self._tar).close()
+		if commit:
+			os.replace(self._tmp, self.path)
+		else:
+			try:
+				os.remove(self._tmp)
+			except OSError:
+				pass
+
+
+def process_archive(
+	src: str,
+	dst: str,
+	accept: Callable[[str], bool],
+	render: Callable[[str, bytes, float], Optional[Tuple[str, bytes]]],
+	workers: int = 0,
+) -> Tuple[int, int]:
+	"""Render every accepted member of src into dst. Returns (written, skipped_or_failed).
+
+	render(name, data, mtime) returns (output name, output bytes) or None to skip.
+	"""
+	workers = workers or (os.cpu_count() or 1)
+	writer = ArchiveWriter(dst)
+	pending: deque = deque()
+	written = skipped = 0
+
+	def flush_one() -> None:
+		nonlocal written, skipped
+		(name, _, mtime), future = pending.popleft()
+		try:
+			result = future.result()
+		except Exception as e:
+			print(f"[WARN] Failed to process {name}: {e}")
+			result = None
+		if result is None:
+			skipped += 1
+			return
+		out_name, data = result
+		print(f"Saved: {dst}!{writer.add(out_name, data, mtime)}")
+		written += 1
+
+	try:
+		with ThreadPoolExecutor(max_workers=workers) as pool:
+			for member in iter_members(src, accept):
+				pending.append((member, pool.submit(render, *member)))
+				# Bounded in-flight members keep memory flat for multi-GB archives
+				if len(pending) >= workers * 2:
+					flush_one()
+			while pending:
+				flush_one()
+	except BaseException:
+		writer.close(commit=False)
+		raise
+	writer.close()
+	return written, skipped
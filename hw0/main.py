@@ -1,13 +1,18 @@
 import argparse
 import os
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import IO, Iterator, Optional, Tuple
 
-from PIL import Image, ImageDraw, ImageFont, ExifTags
+from PIL import Image, ImageDraw, ImageFont, ExifTags, TiffImagePlugin
 from datetime import datetime
 
+from phash import SEEN_MODES, HashIndex, fingerprint, load_for_check
 
-SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp"}
+
+SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp", ".gif"}
+# Formats whose extra frames/pages are kept (animated GIF/WebP/PNG, multi-page TIFF)
+MULTI_FRAME_FORMATS = {"GIF", "WEBP", "PNG", "TIFF"}
+GIF_PALETTE_SAMPLES = 16
 
 
 def parse_color(color_str: str) -> Tuple[int, int, int, int]:
@@ -144,100 +149,304 @@ def compute_position(pos: str, text_size: Tuple[int, int], image_size: Tuple[int
 	return margin, margin
 
 
-def is_image_file(path: Path) -> bool:
-	return path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS
+def text_box(text: str, font: ImageFont.ImageFont, position: str, image_size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+	"""Pixel box covered by the text and its shadow, as drawn by draw_date_watermark/text_layer."""
+	bbox = ImageDraw.Draw(Image.new("RGBA", (1, 1))).textbbox((0, 0), text, font=font)
+	x, y = compute_position(position, (bbox[2] - bbox[0], bbox[3] - bbox[1]), image_size)
+	return x + bbox[0], y + bbox[1], x + bbox[2] + 2, y + bbox[3] + 2
 
 
-def list_images(target_path: Path) -> List[Path]:
-	if target_path.is_file():
-		return [target_path] if is_image_file(target_path) else []
-	if target_path.is_dir():
-		# Only files directly under the directory
-		return [p for p in target_path.iterdir() if is_image_file(p)]
-	return []
+def draw_date_watermark(im: Image.Image, text: str, font: ImageFont.ImageFont, color: Tuple[int, int, int, int], position: str, jpeg: bool) -> Image.Image:
+	"""Draw the text onto a copy of the image and return the image ready to save."""
+	# Convert to RGBA to draw with alpha
+	im_rgba = im.convert("RGBA")
+	draw = ImageDraw.Draw(im_rgba)
 
+	# Measure text
+	bbox = draw.textbbox((0, 0), text, font=font)
+	text_w = bbox[2] - bbox[0]
+	text_h = bbox[3] - bbox[1]
+	x, y = compute_position(position, (text_w, text_h), im_rgba.size)
 
-def watermark_image(src_path: Path, text: str, font: ImageFont.ImageFont, color: Tuple[int, int, int, int], position: str, output_dir: Path) -> Optional[Path]:
-	try:
-		with Image.open(src_path) as im:
-			# Convert to RGBA to draw with alpha
-			im_rgba = im.convert("RGBA")
-			draw = ImageDraw.Draw(im_rgba)
-
-			# Measure text
-			bbox = draw.textbbox((0, 0), text, font=font)
-			text_w = bbox[2] - bbox[0]
-			text_h = bbox[3] - bbox[1]
-			x, y = compute_position(position, (text_w, text_h), im_rgba.size)
-
-			# Optional shadow for visibility
-			shadow = (0, 0, 0, min(160, color[3]))
-			for dx, dy in ((1, 1), (2, 2)):
-				draw.text((x + dx, y + dy), text, font=font, fill=shadow)
-
-			# Main text
-			draw.text((x, y), text, font=font, fill=color)
-
-			# Preserve original format when possible
-			output_dir.mkdir(parents=True, exist_ok=True)
-			out_name = src_path.stem + "_watermarked" + src_path.suffix
-			out_path = output_dir / out_name
-
-			# Convert back if original didn't support alpha
-			if im.mode != "RGBA" and color[3] == 255:
-				im_to_save = im_rgba.convert(im.mode)
-			else:
-				im_to_save = im_rgba
-
-			# For JPEG, avoid saving with RGBA
-			if out_path.suffix.lower() in {".jpg", ".jpeg"} and im_to_save.mode in {"RGBA", "LA"}:
-				im_to_save = im_to_save.convert("RGB")
-
-			im_to_save.save(out_path)
+	# Optional shadow for visibility
+	shadow = (0, 0, 0, min(160, color[3]))
+	for dx, dy in ((1, 1), (2, 2)):
+		draw.text((x + dx, y + dy), text, font=font, fill=shadow)
+
+	# Main text
+	draw.text((x, y), text, font=font, fill=color)
+
+	# Convert back if original didn't support alpha
+	if im.mode != "RGBA" and color[3] == 255:
+		im_to_save = im_rgba.convert(im.mode)
+	else:
+		im_to_save = im_rgba
+
+	# For JPEG, avoid saving with RGBA
+	if jpeg and im_to_save.mode in {"RGBA", "LA"}:
+		im_to_save = im_to_save.convert("RGB")
+	return im_to_save
+
+
+def is_multi_frame(im: Image.Image) -> bool:
+	return im.format in MULTI_FRAME_FORMATS and getattr(im, "is_animated", False)
+
+
+def text_layer(text: str, font: ImageFont.ImageFont, color: Tuple[int, int, int, int]) -> Tuple[Image.Image, Tuple[int, int]]:
+	"""Render the shadowed text once onto a transparent layer. Returns (layer, measured text size)."""
+	probe = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+	bbox = probe.textbbox((0, 0), text, font=font)
+	# Same geometry as draw_date_watermark: text drawn at the layer origin, shadow offset by 1-2 px
+	layer = Image.new("RGBA", (max(1, bbox[2] + 2), max(1, bbox[3] + 2)), (0, 0, 0, 0))
+	draw = ImageDraw.Draw(layer)
+	shadow = (0, 0, 0, min(160, color[3]))
+	for dx, dy in ((1, 1), (2, 2)):
+		draw.text((dx, dy), text, font=font, fill=shadow)
+	draw.text((0, 0), text, font=font, fill=color)
+	return layer, (bbox[2] - bbox[0], bbox[3] - bbox[1])
+
+
+def _frames(im: Image.Image, layer: Image.Image, text_size: Tuple[int, int], position: str, indices=None) -> Iterator[Tuple[Image.Image, int, int]]:
+	"""Decode frames one at a time and composite the text layer onto the covered region only.
+
+	Yields (RGBA frame, duration ms, GIF disposal).
+	"""
+	for index in (indices if indices is not None else range(im.n_frames)):
+		im.seek(index)
+		im.load()
+		frame = im.convert("RGBA")
+		x, y = compute_position(position, text_size, frame.size)
+		w, h = min(layer.width, frame.width - x), min(layer.height, frame.height - y)
+		if w > 0 and h > 0:
+			frame.alpha_composite(layer, dest=(x, y), source=(0, 0, w, h))
+		yield frame, int(im.info.get("duration") or 0), int(getattr(im, "disposal_method", 0) or 0)
+
+
+def save_frames(im: Image.Image, fp: IO[bytes], text: str, font: ImageFont.ImageFont, color: Tuple[int, int, int, int], position: str) -> int:
+	"""Watermark every frame/page of a multi-frame image and save it in its own format. Returns the frame count.
+
+	TIFF pages are appended one at a time (fp must be readable and seekable), so only one page is in memory.
+	GIF frames share one global palette built from sampled frames, and keep their timing and disposal.
+	"""
+	fmt = im.format
+	layer, text_size = text_layer(text, font, color)
+	has_alpha = "A" in im.getbands() or "transparency" in im.info
+
+	def flatten(frame: Image.Image) -> Image.Image:
+		return frame if has_alpha else frame.convert("RGB")
+
+	if fmt == "TIFF":
+		pages = 0
+		with TiffImagePlugin.AppendingTiffWriter(fp) as tf:
+			for frame, _, _ in _frames(im, layer, text_size, position):
+				params = {"compression": "tiff_lzw"}
+				if im.info.get("dpi"):
+					params["dpi"] = im.info["dpi"]
+				flatten(frame).save(tf, format="TIFF", **params)
+				tf.newFrame()
+				pages += 1
+		return pages
+
+	loop = im.info.get("loop")
+	if fmt == "GIF":
+		step = max(1, im.n_frames // GIF_PALETTE_SAMPLES)
+		samples = [f.convert("RGB") for f, _, _ in _frames(im, layer, text_size, position, range(0, im.n_frames, step))]
+		mosaic = Image.new("RGB", (sum(f.width for f in samples), max(f.height for f in samples)))
+		x = 0
+		for sample in samples:
+			mosaic.paste(sample, (x, 0))
+			x += sample.width
+		palette = mosaic.quantize(colors=255, method=Image.Quantize.MEDIANCUT)
+		transparent = len(palette.getpalette() or []) // 3
+		frames, durations, disposals = [], [], []
+		for frame, duration, disposal in _frames(im, layer, text_size, position):
+			# No dithering: static areas map to the same colours in every frame
+			mapped = frame.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE)
+			mapped.paste(transparent, mask=frame.getchannel("A").point(lambda a: 255 if a < 128 else 0))
+			frames.append(mapped)
+			durations.append(duration)
+			disposals.append(disposal)
+		params = {"palette": (palette.getpalette() or []) + [0, 0, 0], "optimize": False, "disposal": disposals}
+		if has_alpha:
+			params["transparency"] = transparent
+	else:
+		frames, durations = [], []
+		for frame, duration, _ in _frames(im, layer, text_size, position):
+			frames.append(flatten(frame))
+			durations.append(duration)
+		params = {}
+		loop = loop if loop is not None else 0
+	if loop is not None:
+		params["loop"] = loop
+	frames[0].save(fp, format=fmt, save_all=True, append_images=frames[1:], duration=durations, **params)
+	return len(frames)
+
+
+def watermarked_name(name: str) -> str:
+	"""photo.jpg -> photo_watermarked.jpg"""
+	stem, ext = os.path.splitext(name)
+	return stem + "_watermarked" + ext
+
+
+def record_output(index: HashIndex, output, text: str, font: ImageFont.ImageFont, position: str, label: str) -> None:
+	"""Fingerprint a written output (path or file object, decoded at a reduced size) and add it to the index."""
+	with Image.open(output) as im:
+		size = im.size
+		im.draft("RGB", (1024, 1024))
+		im.load()
+		sx, sy = im.width / size[0], im.height / size[1]
+		x0, y0, x1, y1 = text_box(text, font, position, size)
+		index.add(fingerprint(im, (round(x0 * sx), round(y0 * sy), round(x1 * sx), round(y1 * sy))), label)
+
+
+def watermark_image(src_path: Path, text: str, font: ImageFont.ImageFont, color: Tuple[int, int, int, int], position: str, output_dir: Path, out_name: Optional[str] = None, index: Optional[HashIndex] = None) -> Path:
+	"""Write the watermarked copy and return its path; errors propagate to the caller."""
+	with Image.open(src_path) as im:
+		# Preserve original format when possible
+		output_dir.mkdir(parents=True, exist_ok=True)
+		out_path = output_dir / (out_name or watermarked_name(src_path.name))
+		if is_multi_frame(im):
+			with open(out_path, "w+b") as f:
+				save_frames(im, f, text, font, color, position)
+			if index is not None:
+				record_output(index, out_path, text, font, position, str(out_path.resolve()))
 			return out_path
-	except Exception as e:
-		print(f"[WARN] Failed to process {src_path}: {e}")
+		im_to_save = draw_date_watermark(im, text, font, color, position, out_path.suffix.lower() in {".jpg", ".jpeg"})
+		# Fingerprint before saving, from the image already in memory
+		fp = fingerprint(im_to_save, text_box(text, font, position, im_to_save.size)) if index is not None else None
+		im_to_save.save(out_path)
+		if fp is not None:
+			index.add(fp, str(out_path.resolve()))
+		return out_path
+
+
+def encode_watermarked(im: Image.Image, text: str, font: ImageFont.ImageFont, color: Tuple[int, int, int, int], position: str) -> bytes:
+	"""Watermark an opened image and encode it in its own format, in memory."""
+	from io import BytesIO
+
+	buf = BytesIO()
+	if is_multi_frame(im):
+		save_frames(im, buf, text, font, color, position)
+		return buf.getvalue()
+	im_to_save = draw_date_watermark(im, text, font, color, position, im.format == "JPEG")
+	im_to_save.save(buf, format=im.format)
+	return buf.getvalue()
+
+
+def resolve_date_text(img_path: Path, fallback: str) -> Optional[str]:
+	"""EXIF date of the image, or the file time when fallback is mtime/ctime.
+
+	A file that cannot be opened raises (a failure, not a missing date).
+	"""
+	with Image.open(img_path) as im:
+		date_text = get_exif_datetime_str(im)
+
+	if not date_text and fallback in {"mtime", "ctime"}:
+		date_text = get_fs_date_str(img_path, fallback)
+	return date_text
+
+
+def check_seen(img_path: Path, index: Optional[HashIndex], seen: str) -> bool:
+	"""Check an input against the index of earlier outputs. Returns False when it should be skipped."""
+	if index is None or seen not in {"flag", "skip"}:
+		return True
+	try:
+		match = index.match(load_for_check(img_path))
+	except Exception:
+		return True
+	if match is None:
+		return True
+	if seen == "skip":
+		print(f"[INFO] Skipping {img_path.name}: looks already watermarked (matches {match[0]}).")
+		return False
+	print(f"[INFO] {img_path.name} looks already watermarked (matches {match[0]}).")
+	return True
+
+
+def process_image(img_path: Path, font: ImageFont.ImageFont, color: Tuple[int, int, int, int], position: str, fallback: str, output_dir: Path, out_name: Optional[str] = None, index: Optional[HashIndex] = None, seen: str = "off") -> Optional[Path]:
+	"""Watermark one image with its date. Returns the output path, or None when deliberately skipped
+	(no date, or already watermarked with --seen skip); raises when the image cannot be processed.
+
+	With an index, the input is first checked against earlier outputs (seen: flag/skip) and the output is recorded.
+	"""
+	if not check_seen(img_path, index, seen):
 		return None
+	date_text = resolve_date_text(img_path, fallback)
+	if not date_text:
+		print(f"[INFO] Skipping {img_path.name}: no date available (EXIF or {fallback}).")
+		return None
+	return watermark_image(img_path, date_text, font, color, position, output_dir, out_name, index)
 
 
-def process_path(input_path: Path, font_size: int, color_str: str, position: str, font_path: Optional[str], fallback: str) -> None:
-	images = list_images(input_path)
-	if not images:
-		print("No images found to process.")
-		return
+def open_index(args: argparse.Namespace) -> Optional[HashIndex]:
+	"""The shared index of earlier outputs, or None with --seen off."""
+	if args.seen == "off":
+		return None
+	return HashIndex(args.hash_index) if args.hash_index else HashIndex()
 
-	font = load_font(font_size, font_path)
-	color = parse_color(color_str)
 
-	# Determine output directory name based on original directory name
+def output_dir_for(input_path: Path) -> Path:
+	"""<dir>/<dir_name>_watermark, based on the original directory name."""
+	base_dir = input_path.parent if input_path.is_file() else input_path
+	return base_dir / f"{base_dir.name}_watermark"
+
+
+def iter_images(input_path: Path, args: argparse.Namespace) -> Iterator[Tuple[Path, str]]:
+	"""(image path, directory relative to the input) for a single file, or streamed from a directory tree."""
+	from walk import iter_files
+
 	if input_path.is_file():
-		base_dir = input_path.parent
-	else:
-		base_dir = input_path
-	orig_dir_name = base_dir.name
-	output_dir = base_dir / f"{orig_dir_name}_watermark"
+		if input_path.suffix.lower() in SUPPORTED_EXTENSIONS:
+			yield input_path, ""
+		return
+	if input_path.is_dir():
+		yield from iter_files(
+			input_path,
+			lambda name: os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS,
+			args.include,
+			args.exclude,
+			args.recursive,
+			prune=[output_dir_for(input_path)],
+		)
 
-	processed = 0
-	for img_path in images:
-		try:
-			with Image.open(img_path) as im:
-				date_text = get_exif_datetime_str(im)
-		except Exception:
-			date_text = None
 
-		if not date_text and fallback in {"mtime", "ctime"}:
-			date_text = get_fs_date_str(img_path, fallback)
+def process_path(input_path: Path, args: argparse.Namespace) -> None:
+	"""Watermark a file or directory tree; outputs mirror the input tree under <dir>/<dir_name>_watermark."""
+	from walk import NameClaims, map_bounded
+
+	font = load_font(args.font_size, args.font_path)
+	color = parse_color(args.color)
+	index = open_index(args)
+
+	# Determine output directory name based on original directory name
+	output_root = output_dir_for(input_path)
+	claims = NameClaims()
 
-		if not date_text:
-			print(f"[INFO] Skipping {img_path.name}: no date available (EXIF or {fallback}).")
-			continue
+	def jobs() -> Iterator[Tuple[Path, Path, str]]:
+		for img_path, rel_dir in iter_images(input_path, args):
+			output_dir = output_root.joinpath(*rel_dir.split("/")) if rel_dir else output_root
+			yield img_path, output_dir, claims.claim(output_dir, watermarked_name(img_path.name))
 
-		out = watermark_image(img_path, date_text, font, color, position, output_dir)
+	def run(job: Tuple[Path, Path, str]) -> Optional[Path]:
+		try:
+			return process_image(job[0], font, color, args.position, args.fallback, job[1], job[2], index, args.seen)
+		except Exception as e:
+			print(f"[WARN] Failed to process {job[0]}: {e}")
+			return None
+
+	found = processed = 0
+	for _, out in map_bounded(run, jobs(), args.workers):
+		found += 1
 		if out:
 			processed += 1
 			print(f"Saved: {out}")
+	if index is not None:
+		index.flush()
 
-	print(f"Done. Processed {processed} image(s). Output dir: {output_dir}")
+	if not found:
+		print("No images found to process.")
+		return
+	print(f"Done. Processed {processed} image(s). Output dir: {output_root}")
 
 
 def build_arg_parser() -> argparse.ArgumentParser:
@@ -247,7 +456,7 @@ def build_arg_parser() -> argparse.ArgumentParser:
 			"Saves to a new subdirectory named <original_dir_name>_watermark under the original directory."
 		)
 	)
-	parser.add_argument("path", help="Image file path or directory containing images")
+	parser.add_argument("path", help="Image file path, directory tree containing images, or a .zip/.tar[.gz] archive")
 	parser.add_argument("--font-size", type=int, default=32, help="Font size in points (default: 32)")
 	parser.add_argument(
 		"--color",
@@ -276,14 +485,181 @@ def build_arg_parser() -> argparse.ArgumentParser:
 		default="mtime",
 		help="When EXIF date is missing, use file time as fallback (default: mtime).",
 	)
+	parser.add_argument(
+		"--watch",
+		action="store_true",
+		help="Keep running and watermark new or changed images in the directory as they appear (honours --recursive, --include and --exclude).",
+	)
+	parser.add_argument("--interval", type=float, default=1.0, help="Watch mode: poll/event wait interval in seconds (default: 1.0)")
+	parser.add_argument("--settle", type=float, default=2.0, help="Watch mode: seconds a file's size/mtime must stay unchanged before processing (default: 2.0)")
+	parser.add_argument("--workers", type=int, default=0, help="Number of worker threads (default: CPU count)")
+	parser.add_argument(
+		"--recursive",
+		action=argparse.BooleanOptionalAction,
+		default=True,
+		help="Directory input: also process subdirectories, mirroring them in the output (default: on)",
+	)
+	parser.add_argument(
+		"--include",
+		action="append",
+		default=[],
+		metavar="GLOB",
+		help="Directory input: only process files matching this glob (repeatable). Globs with '/' match the path relative to the directory, others the file name.",
+	)
+	parser.add_argument(
+		"--exclude",
+		action="append",
+		default=[],
+		metavar="GLOB",
+		help="Directory input: skip files and subdirectories matching this glob (repeatable)",
+	)
+	parser.add_argument(
+		"--checkpoint",
+		help="Watch mode: checkpoint file of processed images (default: <dir>/.watermark_checkpoint.json)",
+	)
+	parser.add_argument(
+		"--plan",
+		action="store_true",
+		help="Dry run: validate the images and estimate time, peak memory and output size without writing anything.",
+	)
+	parser.add_argument(
+		"--seen",
+		choices=SEEN_MODES,
+		default="record",
+		help="Perceptual-hash index of outputs: record outputs only, also flag inputs that look already watermarked, skip them, or off (default: record)",
+	)
+	parser.add_argument(
+		"--hash-index",
+		default="",
+		help="Index file (default: ~/.watermark_tool/outputs.phash, shared with the GUI tool)",
+	)
+	parser.add_argument(
+		"--archive-out",
+		help="Archive input: output archive path (default: <archive_name>_watermark.<ext> next to the input)",
+	)
 	return parser
 
 
+def archive_path(input_path: Path, args: argparse.Namespace) -> None:
+	"""Watermark the images inside a ZIP/TAR archive straight into a new archive."""
+	from io import BytesIO
+	from archive import archive_suffix, process_archive
+
+	font = load_font(args.font_size, args.font_path)
+	color = parse_color(args.color)
+	index = open_index(args)
+	suffix = archive_suffix(str(input_path))
+	dst = Path(args.archive_out) if args.archive_out else input_path.with_name(input_path.name[:-len(suffix)] + "_watermark" + suffix)
+
+	def render(name: str, data: bytes, mtime: float) -> Optional[Tuple[str, bytes]]:
+		with Image.open(BytesIO(data)) as im:
+			date_text = get_exif_datetime_str(im)
+			# Archives keep a single timestamp per member; use it for both mtime and ctime
+			if not date_text and args.fallback in {"mtime", "ctime"} and mtime:
+				date_text = datetime.fromtimestamp(mtime).strftime("%Y-%m-%d")
+			if not date_text:
+				print(f"[INFO] Skipping {name}: no date available (EXIF or {args.fallback}).")
+				return None
+			data = encode_watermarked(im, date_text, font, color, args.position)
+		# Archive members are recorded as "<archive>!<member>"; archive inputs are not checked
+		if index is not None:
+			record_output(index, BytesIO(data), date_text, font, args.position, f"{dst.resolve()}!{watermarked_name(name)}")
+		return watermarked_name(name), data
+
+	written, skipped = process_archive(
+		str(input_path),
+		str(dst),
+		lambda name: os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS,
+		render,
+		workers=args.workers,
+	)
+	if index is not None:
+		index.flush()
+	print(f"Done. Processed {written} image(s), skipped {skipped}. Output archive: {dst}")
+
+
+def watch_path(input_path: Path, args: argparse.Namespace) -> None:
+	from watch import FolderWatcher
+
+	if not input_path.is_dir():
+		print(f"[ERROR] --watch requires a directory: {input_path}")
+		return
+	font = load_font(args.font_size, args.font_path)
+	color = parse_color(args.color)
+	output_root = output_dir_for(input_path)
+	checkpoint = Path(args.checkpoint) if args.checkpoint else input_path / ".watermark_checkpoint.json"
+	index = open_index(args)
+
+	def handle(path: Path) -> Optional[Path]:
+		# Subdirectories are mirrored under the output directory, as in batch mode
+		output_dir = output_root.joinpath(*path.parent.relative_to(input_path).parts)
+		out = process_image(path, font, color, args.position, args.fallback, output_dir, index=index, seen=args.seen)
+		if index is not None:
+			index.flush()  # the watcher runs until interrupted: write each entry right away
+		return out
+
+	watcher = FolderWatcher(
+		input_path,
+		handle,
+		lambda p: p.suffix.lower() in SUPPORTED_EXTENSIONS,
+		checkpoint,
+		workers=args.workers,
+		settle=args.settle,
+		interval=args.interval,
+		recursive=args.recursive,
+		include=args.include,
+		exclude=args.exclude,
+		prune=[output_root],
+	)
+	watcher.run()
+
+
+def plan_path(input_path: Path, args: argparse.Namespace) -> bool:
+	"""Print a dry-run plan for a file or directory. Returns False when something would fail."""
+	from plan import plan_images
+
+	images = [p for p, _ in iter_images(input_path, args)]
+	if not images:
+		print("No images found to process.")
+		return True
+	font = load_font(args.font_size, args.font_path)
+	color = parse_color(args.color)
+
+	def render(path: Path) -> bytes:
+		with Image.open(path) as im:
+			return encode_watermarked(im, resolve_date_text(path, args.fallback) or "", font, color, args.position)
+
+	plan = plan_images(
+		images,
+		lambda p: bool(resolve_date_text(p, args.fallback)),
+		render,
+		output_dir_for(input_path),
+		worker_counts=(args.workers,) if args.workers else (),
+	)
+	print(plan.summary())
+	return not plan.invalid and plan.fits
+
+
 def main() -> None:
 	parser = build_arg_parser()
 	args = parser.parse_args()
 	target = Path(args.path)
-	process_path(target, args.font_size, args.color, args.position, args.font_path, args.fallback)
+	if args.plan:
+		from archive import is_archive
+
+		if target.is_file() and is_archive(str(target)):
+			print("[ERROR] --plan supports image files and directories, not archives")
+			raise SystemExit(2)
+		raise SystemExit(0 if plan_path(target, args) else 1)
+	if args.watch:
+		watch_path(target, args)
+		return
+	from archive import is_archive
+
+	if target.is_file() and is_archive(str(target)):
+		archive_path(target, args)
+		return
+	process_path(target, args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,269 @@
+"""Perceptual-hash index of watermarked outputs, used to spot inputs that were already watermarked.
+
+Each output is fingerprinted with a 64-bit dHash of the whole image plus a 128-bit gradient hash
+of the area around the watermark text and that area's normalized position. A small watermark barely
+changes the whole-image dHash, so an original and its output usually hash alike; an input only counts
+as already watermarked when the area under the watermark matches too.
+
+The index file is shared with the GUI tool (hw01, ~/.watermark_tool/outputs.phash) and uses the same
+fixed-width line format: "hash<TAB>mark hash<TAB>packed box<TAB>path". Lookups use multi-index
+hashing: the 64 bits are split into three chunks, and two hashes within distance r agree to within
+r // 3 bits on at least one chunk, so only a few chunk values near the query need probing. Each chunk
+is a sorted array searched with bisect, which keeps millions of entries fast and compact. The file is
+read lazily on the first lookup (recording alone only appends), and paths are read back by file offset
+for matches only.
+"""
+
+import bisect
+import itertools
+import math
+import os
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+
+INDEX_PATH = os.path.join(os.path.expanduser("~"), ".watermark_tool", "outputs.phash")
+SEEN_MODES = ("off", "record", "flag", "skip")
+CHUNK_WIDTHS = (22, 21, 21)
+DEFAULT_THRESHOLD = 8  # whole-image distance; re-encoding and resizing usually stay within 0-6
+MARK_THRESHOLD = 20  # watermark-area distance out of 128; an original is usually 28+ away from its output
+MAX_MARK_AREA = 0.5  # larger watermark areas are not recorded separately
+CHECK_SIZE = 1024  # inputs are decoded at a reduced size (JPEG draft) for checking
+BOX_SCALE = 65535
+LINE_PREFIX = 67  # "16 hex\t32 hex\t16 hex\t"
+FLUSH_EVERY = 256
+GRIDS = ((4, 16), (8, 8), (16, 4), (32, 2), (64, 1))  # watermark-area grids by aspect ratio, 64 cells each
+
+NormBox = Tuple[float, float, float, float]
+
+
+class Fingerprint:
+	__slots__ = ("hash", "mark", "box")
+
+	def __init__(self, hash_: int, mark: int = 0, box: Optional[NormBox] = None) -> None:
+		self.hash = hash_
+		self.mark = mark
+		self.box = box  # watermark area normalized to the image size, None to compare the whole image only
+
+
+def _small_gray(img: Image.Image, size: Tuple[int, int], box: Optional[Tuple[float, float, float, float]] = None) -> bytes:
+	if img.mode not in ("RGB", "RGBA", "L", "LA"):
+		img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+	return img.resize(size, Image.BILINEAR, box=box, reducing_gap=2.0).convert("L").tobytes()
+
+
+def dhash(img: Image.Image) -> int:
+	"""64-bit dHash: 9x8 grayscale, each pixel compared with its right neighbour."""
+	px = _small_gray(img, (9, 8))
+	value = 0
+	for r in range(8):
+		for c in range(8):
+			value = (value << 1) | (px[r * 9 + c] > px[r * 9 + c + 1])
+	return value
+
+
+def mark_hash(img: Image.Image, box: Tuple[float, float, float, float]) -> int:
+	"""128-bit gradient hash of a pixel box: 64 cells, each compared with its right and lower neighbour.
+
+	Thin translucent text hardly changes neighbouring cells along the text line, but clearly changes
+	the contrast between the text and the margin above and below it.
+	"""
+	x0, y0, x1, y1 = box
+	ratio = max(x1 - x0, 1e-6) / max(y1 - y0, 1e-6)
+	cols, rows = min(GRIDS, key=lambda g: abs(math.log(g[0] / g[1] / ratio)))
+	px = _small_gray(img, (cols + 1, rows + 1), box)
+	value = 0
+	for r in range(rows):
+		for c in range(cols):
+			i = r * (cols + 1) + c
+			value = (value << 2) | (px[i] > px[i + 1]) << 1 | (px[i] > px[i + cols + 1])
+	return value
+
+
+def fingerprint(img: Image.Image, mark_box: Optional[Tuple[int, int, int, int]] = None) -> Fingerprint:
+	"""Fingerprint of an output image; mark_box is the watermark's pixel bounding box, if any."""
+	fp = Fingerprint(dhash(img))
+	if mark_box is None:
+		return fp
+	w, h = img.size
+	x0, y0, x1, y1 = mark_box
+	# A margin of a quarter of the short side: the contrast with the surroundings is the main signal
+	pad = max(1, min(x1 - x0, y1 - y0) // 4)
+	x0, y0, x1, y1 = max(0, x0 - pad), max(0, y0 - pad), min(w, x1 + pad), min(h, y1 + pad)
+	if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) > MAX_MARK_AREA * w * h:
+		return fp
+	fp.box = (x0 / w, y0 / h, x1 / w, y1 / h)
+	fp.mark = mark_hash(img, (x0, y0, x1, y1))
+	return fp
+
+
+def load_for_check(path) -> Image.Image:
+	"""Open an input at a reduced size, in display orientation (first frame for animations)."""
+	with Image.open(path) as im:
+		im.draft("RGB", (CHECK_SIZE, CHECK_SIZE))
+		return ImageOps.exif_transpose(im)
+
+
+def _pack_box(box: Optional[NormBox]) -> int:
+	if box is None:
+		return 0
+	value = 0
+	for v in box:
+		value = (value << 16) | min(BOX_SCALE, max(0, round(v * BOX_SCALE)))
+	return value
+
+
+def _unpack_box(value: int) -> NormBox:
+	return tuple(((value >> shift) & 0xFFFF) / BOX_SCALE for shift in (48, 32, 16, 0))
+
+
+def _chunk_keys(value: int) -> List[int]:
+	keys, shift = [], 0
+	for width in CHUNK_WIDTHS:
+		keys.append((value >> shift) & ((1 << width) - 1))
+		shift += width
+	return keys
+
+
+def _probe_masks(width: int, radius: int) -> List[int]:
+	masks = [0]
+	for r in range(1, radius + 1):
+		for bits in itertools.combinations(range(width), r):
+			masks.append(sum(1 << b for b in bits))
+	return masks
+
+
+class HashIndex:
+	"""Thread-safe, append-only index file with multi-index hashing lookups."""
+
+	def __init__(self, path: str = INDEX_PATH) -> None:
+		self.path = path
+		self._hashes = array("Q")
+		self._marks = array("Q")  # two items per entry: high and low 64 bits
+		self._boxes = array("Q")
+		self._offsets = array("q")  # file offset of each entry, -1 while unsaved
+		self._sorted: List[array] = [array("Q") for _ in CHUNK_WIDTHS]  # (chunk value << 32 | entry), sorted
+		self._recent: List[Dict[int, List[int]]] = [{} for _ in CHUNK_WIDTHS]  # entries added after loading
+		self._unsaved: Dict[int, str] = {}
+		self._pending: List[list] = []  # [fingerprint, path, entry or -1 when not loaded]
+		self._lock = threading.Lock()
+		self._loaded = False
+
+	def _load(self) -> None:
+		"""Read the index file (caller holds the lock)."""
+		if self._loaded:
+			return
+		self._loaded = True
+		offset = 0
+		try:
+			with open(self.path, "rb") as f:
+				for line in f:
+					start, offset = offset, offset + len(line)
+					if len(line) <= LINE_PREFIX or not line.endswith(b"\n"):
+						continue  # a line another process is still appending
+					try:
+						value, mark, box = int(line[0:16], 16), int(line[17:49], 16), int(line[50:66], 16)
+					except ValueError:
+						continue
+					self._hashes.append(value)
+					self._marks.extend((mark >> 64, mark & 0xFFFFFFFFFFFFFFFF))
+					self._boxes.append(box)
+					self._offsets.append(start)
+		except FileNotFoundError:
+			pass
+		shift = 0
+		for i, width in enumerate(CHUNK_WIDTHS):
+			mask = (1 << width) - 1
+			self._sorted[i] = array("Q", sorted(((v >> shift) & mask) << 32 | n for n, v in enumerate(self._hashes)))
+			shift += width
+		for entry in self._pending:
+			entry[2] = self._insert(entry[0], entry[1])
+
+	def _insert(self, fp: Fingerprint, path: str) -> int:
+		n = len(self._hashes)
+		self._hashes.append(fp.hash)
+		self._marks.extend((fp.mark >> 64, fp.mark & 0xFFFFFFFFFFFFFFFF))
+		self._boxes.append(_pack_box(fp.box))
+		self._offsets.append(-1)
+		self._unsaved[n] = path
+		for recent, key in zip(self._recent, _chunk_keys(fp.hash)):
+			recent.setdefault(key, []).append(n)
+		return n
+
+	def _path(self, n: int) -> str:
+		if self._offsets[n] < 0:
+			return self._unsaved[n]
+		with open(self.path, "rb") as f:
+			f.seek(self._offsets[n])
+			return f.readline()[LINE_PREFIX:].rstrip(b"\n").decode("utf-8", "replace")
+
+	def add(self, fp: Fingerprint, path: str) -> None:
+		"""Record an output; entries are buffered and appended in batches (see flush)."""
+		path = path.replace("\n", " ")
+		with self._lock:
+			n = self._insert(fp, path) if self._loaded else -1
+			self._pending.append([fp, path, n])
+			if len(self._pending) < FLUSH_EVERY:
+				return
+		self.flush()
+
+	def flush(self) -> None:
+		"""Append buffered entries with a single write, so concurrent appenders never interleave lines."""
+		with self._lock:
+			if not self._pending:
+				return
+			lines = [f"{fp.hash:016x}\t{fp.mark:032x}\t{_pack_box(fp.box):016x}\t{path}\n".encode("utf-8") for fp, path, _ in self._pending]
+			data = b"".join(lines)
+			os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+			fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+			try:
+				os.write(fd, data)
+				offset = os.lseek(fd, 0, os.SEEK_CUR) - len(data)
+			finally:
+				os.close(fd)
+			for (_, _, n), line in zip(self._pending, lines):
+				if n >= 0:
+					self._offsets[n] = offset
+					self._unsaved.pop(n, None)
+				offset += len(line)
+			self._pending = []
+
+	def _near(self, value: int, threshold: int) -> List[Tuple[int, int]]:
+		"""(entry, distance) for entries whose whole-image hash is within threshold (caller holds the lock)."""
+		self._load()
+		radius = threshold // len(CHUNK_WIDTHS)
+		found: Dict[int, int] = {}
+		for i, key in enumerate(_chunk_keys(value)):
+			keys = self._sorted[i]
+			for mask in _probe_masks(CHUNK_WIDTHS[i], radius):
+				probe = key ^ mask
+				candidates = list(self._recent[i].get(probe, ()))
+				pos = bisect.bisect_left(keys, probe << 32)
+				while pos < len(keys) and keys[pos] >> 32 == probe:
+					candidates.append(keys[pos] & 0xFFFFFFFF)
+					pos += 1
+				for n in candidates:
+					if n not in found:
+						found[n] = (value ^ self._hashes[n]).bit_count()
+		return [(n, d) for n, d in found.items() if d <= threshold]
+
+	def match(self, img: Image.Image, threshold: int = DEFAULT_THRESHOLD, mark_threshold: int = MARK_THRESHOLD) -> Optional[Tuple[str, int]]:
+		"""(path, distance) of the closest recorded output that img looks like, or None."""
+		value = dhash(img)
+		w, h = img.size
+		with self._lock:
+			best: Optional[Tuple[int, int]] = None
+			for n, distance in sorted(self._near(value, threshold), key=lambda item: item[1]):
+				if best is not None and distance > best[1]:
+					break
+				if self._boxes[n]:
+					x0, y0, x1, y1 = _unpack_box(self._boxes[n])
+					mark = mark_hash(img, (x0 * w, y0 * h, max(x1 * w, x0 * w + 1), max(y1 * h, y0 * h + 1)))
+					if (mark ^ (self._marks[2 * n] << 64 | self._marks[2 * n + 1])).bit_count() > mark_threshold:
+						continue  # same picture but the watermark area differs: most likely the original
+				best = (n, distance)
+				break
+			return (self._path(best[0]), best[1]) if best is not None else None
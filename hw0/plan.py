@@ -0,0 +1,199 @@
+"""Dry-run planning for the date watermark CLI.
+
+Reads only image headers to validate every input (unreadable, unsupported or truncated
+files are reported), renders a few samples per format in memory to measure throughput,
+and projects wall time per worker count, peak memory and total output size.
+Nothing is written to disk.
+"""
+
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+
+PROCESS_BASE_BYTES = 60 * 1024 * 1024  # Python + Pillow baseline (rough)
+TAIL_BYTES = 64
+# Format -> marker expected near the end of a complete file
+END_MARKERS = {"JPEG": b"\xff\xd9", "PNG": b"IEND", "GIF": b"\x3b"}
+BUFFERED_FORMATS = {"GIF", "WEBP", "PNG"}  # animated outputs whose frames are held until saved
+
+
+@dataclass
+class ImageInfo:
+	path: Path
+	format: str
+	size: Tuple[int, int]
+	frames: int
+
+	@property
+	def megapixels(self) -> float:
+		return self.size[0] * self.size[1] * self.frames / 1e6
+
+
+@dataclass
+class Plan:
+	total: int = 0
+	invalid: List[Tuple[Path, str]] = field(default_factory=list)
+	skipped: int = 0  # no date available, would be skipped
+	images: int = 0  # would be watermarked
+	formats: Dict[str, int] = field(default_factory=dict)
+	megapixels: float = 0.0
+	seconds_per_mp: Dict[str, float] = field(default_factory=dict)  # from samples
+	bytes_per_mp: Dict[str, float] = field(default_factory=dict)
+	samples: int = 0
+	cpu_seconds: float = 0.0
+	wall_seconds: Dict[int, float] = field(default_factory=dict)  # workers -> projected wall time
+	peak_memory: Dict[int, int] = field(default_factory=dict)  # workers -> projected peak bytes
+	output_bytes: int = 0
+	disk_free: Optional[int] = None
+
+	@property
+	def fits(self) -> bool:
+		return self.disk_free is None or self.output_bytes <= self.disk_free
+
+	def summary(self) -> str:
+		mb = 1024 * 1024
+		lines = [
+			"Plan (dry run, nothing written)",
+			f"  {self.total} file(s): {self.images} to watermark, {self.skipped} without a date, {len(self.invalid)} invalid",
+			"  Formats: " + ", ".join(f"{fmt} {n}" for fmt, n in sorted(self.formats.items())),
+			f"  {self.megapixels:.1f} megapixels; sampled {self.samples}: " + ", ".join(
+				f"{fmt} {self.seconds_per_mp[fmt]:.3f} s/MP, {self.bytes_per_mp[fmt] / 1e6:.2f} MB/MP" for fmt in sorted(self.seconds_per_mp)),
+			"  Estimated time: " + ", ".join(f"{n} worker(s) {_duration(t)}" for n, t in sorted(self.wall_seconds.items())),
+			"  Estimated peak memory: " + ", ".join(f"{n} worker(s) {b / mb:.0f} MB" for n, b in sorted(self.peak_memory.items())),
+			f"  Estimated output: {self.output_bytes / mb:.1f} MB"
+			+ (f", free on destination: {self.disk_free / mb:.0f} MB" if self.disk_free is not None else "")
+			+ ("" if self.fits else "  [NOT ENOUGH SPACE]"),
+		]
+		for path, reason in self.invalid:
+			lines.append(f"  [INVALID] {path}: {reason}")
+		return "\n".join(lines)
+
+
+def _duration(seconds: float) -> str:
+	seconds = int(round(seconds))
+	if seconds < 60:
+		return f"{seconds}s"
+	if seconds < 3600:
+		return f"{seconds // 60}m{seconds % 60:02d}s"
+	return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+def probe(path: Path) -> ImageInfo:
+	"""Read the header only; raises ValueError for unsupported or truncated files."""
+	try:
+		with Image.open(path) as im:
+			fmt = im.format or ""
+			frames = im.n_frames if getattr(im, "is_animated", False) and fmt in {"GIF", "WEBP", "PNG", "TIFF"} else 1
+			info = ImageInfo(path, fmt, im.size, frames)
+	except Exception as e:
+		raise ValueError(f"cannot open: {e}") from e
+	marker = END_MARKERS.get(info.format)
+	if marker is not None:
+		with open(path, "rb") as f:
+			f.seek(0, os.SEEK_END)
+			f.seek(max(0, f.tell() - TAIL_BYTES))
+			if marker not in f.read().rstrip(b"\x00"):
+				raise ValueError(f"truncated (missing {info.format} end marker)")
+	return info
+
+
+def _disk_free(path: Path) -> Optional[int]:
+	folder = path.resolve()
+	while not folder.is_dir():
+		if folder.parent == folder:
+			return None
+		folder = folder.parent
+	try:
+		return shutil.disk_usage(folder).free
+	except OSError:
+		return None
+
+
+def _spread(infos: Sequence[ImageInfo], count: int) -> List[ImageInfo]:
+	"""Pick count samples evenly across the size range."""
+	ordered = sorted(infos, key=lambda i: i.megapixels)
+	if len(ordered) <= count:
+		return ordered
+	step = (len(ordered) - 1) / max(1, count - 1)
+	return [ordered[round(i * step)] for i in range(count)]
+
+
+def plan_images(
+	paths: Sequence[Path],
+	has_date: Callable[[Path], bool],
+	render: Callable[[Path], bytes],
+	output_dir: Path,
+	sample: int = 2,
+	worker_counts: Sequence[int] = (),
+) -> Plan:
+	"""Validate paths, time render() on a few samples per format and project the full run.
+
+	has_date tells whether an image would be watermarked; render returns the encoded output in memory.
+	"""
+	plan = Plan(total=len(paths))
+	infos: List[ImageInfo] = []
+	for path in paths:
+		try:
+			info = probe(path)
+		except (OSError, ValueError) as e:
+			plan.invalid.append((path, str(e)))
+			continue
+		if not has_date(path):
+			plan.skipped += 1
+			continue
+		infos.append(info)
+
+	by_format: Dict[str, List[ImageInfo]] = {}
+	for info in infos:
+		by_format.setdefault(info.format, []).append(info)
+	failed = set()
+	for fmt, members in by_format.items():
+		seconds = megapixels = 0.0
+		out_bytes = 0
+		for info in _spread(members, max(1, sample)):
+			start = time.perf_counter()
+			try:
+				data = render(info.path)
+			except Exception as e:
+				plan.invalid.append((info.path, f"render failed: {e}"))
+				failed.add(info.path)
+				continue
+			seconds += time.perf_counter() - start
+			megapixels += info.megapixels
+			out_bytes += len(data)
+			plan.samples += 1
+		if megapixels:
+			plan.seconds_per_mp[fmt] = seconds / megapixels
+			plan.bytes_per_mp[fmt] = out_bytes / megapixels
+
+	fallback_s = sum(plan.seconds_per_mp.values()) / len(plan.seconds_per_mp) if plan.seconds_per_mp else 0.0
+	fallback_b = sum(plan.bytes_per_mp.values()) / len(plan.bytes_per_mp) if plan.bytes_per_mp else 0.0
+	working_set = 0
+	for info in infos:
+		if info.path in failed:
+			continue
+		plan.images += 1
+		plan.formats[info.format] = plan.formats.get(info.format, 0) + 1
+		plan.megapixels += info.megapixels
+		plan.cpu_seconds += plan.seconds_per_mp.get(info.format, fallback_s) * info.megapixels
+		plan.output_bytes += int(plan.bytes_per_mp.get(info.format, fallback_b) * info.megapixels)
+		pixels = info.size[0] * info.size[1]
+		# Decoded frame + RGBA working copy + converted result; animated formats hold every frame until saved
+		memory = pixels * 4 * 3
+		if info.frames > 1 and info.format in BUFFERED_FORMATS:
+			memory += pixels * info.frames * (1 if info.format == "GIF" else 4)
+		working_set = max(working_set, memory)
+
+	cpus = os.cpu_count() or 1
+	for n in sorted(set(worker_counts or (1, 2, 4, cpus))):
+		# Threads scale with cores while Pillow releases the GIL in decode/encode; no gain beyond the core count
+		plan.wall_seconds[n] = plan.cpu_seconds / min(n, cpus)
+		plan.peak_memory[n] = PROCESS_BASE_BYTES + n * working_set
+	plan.disk_free = _disk_free(output_dir)
+	return plan
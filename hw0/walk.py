@@ -0,0 +1,123 @@
+"""Recursive directory traversal and bounded parallel processing for the date watermark CLI.
+
+Files are streamed from os.scandir as each directory is read (only the pending
+subdirectories are kept), filtered with include/exclude globs, and handed to a
+thread pool with a bounded number of files in flight, so memory stays flat no
+matter how many files are under the root.
+"""
+
+import fnmatch
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Set, Tuple, TypeVar
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def matches(rel_path: str, patterns: Sequence[str]) -> bool:
+	"""Glob match: patterns containing '/' match the path relative to the root, others the name only."""
+	name = rel_path.rsplit("/", 1)[-1]
+	for pattern in patterns:
+		pattern = pattern.replace("\\", "/")
+		if fnmatch.fnmatch(rel_path if "/" in pattern else name, pattern):
+			return True
+	return False
+
+
+def iter_files(
+	root: Path,
+	accept: Callable[[str], bool],
+	include: Sequence[str] = (),
+	exclude: Sequence[str] = (),
+	recursive: bool = True,
+	prune: Iterable[Path] = (),
+	visit: Optional[Callable[[Path, str], None]] = None,
+) -> Iterator[Tuple[Path, str]]:
+	"""Yield (path, relative directory) for accepted files under root, directory by directory.
+
+	accept(name) filters by name (e.g. extension); include globs further restrict files, exclude
+	globs drop files and whole subtrees. Directories in prune (e.g. the output tree) and symlinked
+	directories are not entered. The relative directory uses '/' and is '' for root itself.
+	visit(directory, relative directory) is called for each directory right before it is read.
+	"""
+	skip: Set[str] = {os.path.normcase(os.path.realpath(p)) for p in prune}
+	stack = [(str(root), "")]
+	while stack:
+		folder, rel_dir = stack.pop()
+		if visit is not None:
+			visit(Path(folder), rel_dir)
+		subdirs = []
+		try:
+			with os.scandir(folder) as it:
+				for entry in it:
+					rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+					try:
+						is_dir = entry.is_dir(follow_symlinks=False)
+						is_file = not is_dir and entry.is_file()
+					except OSError:
+						continue
+					if is_dir:
+						if recursive and not matches(rel, exclude) and os.path.normcase(os.path.realpath(entry.path)) not in skip:
+							subdirs.append((entry.path, rel))
+					elif is_file and accept(entry.name) and (not include or matches(rel, include)) and not matches(rel, exclude):
+						yield Path(entry.path), rel_dir
+		except OSError as e:
+			print(f"[WARN] Cannot read directory {folder}: {e}")
+			continue
+		# Reverse so that subdirectories are visited in name order
+		stack.extend(sorted(subdirs, reverse=True))
+
+
+class NameClaims:
+	"""Collision-safe output names within one output directory at a time.
+
+	Names are compared case-insensitively (two inputs differing only in case would overwrite each
+	other on Windows/macOS); a clash gets a " (2)", " (3)" ... suffix. Claims are kept only for the
+	current directory, which is enough because iter_files yields each directory's files together.
+	"""
+
+	def __init__(self) -> None:
+		self._folder: Optional[Path] = None
+		self._taken: Set[str] = set()
+
+	def claim(self, folder: Path, name: str) -> str:
+		if folder != self._folder:
+			self._folder = folder
+			self._taken = set()
+		stem, ext = os.path.splitext(name)
+		candidate, n = name, 1
+		while candidate.casefold() in self._taken:
+			n += 1
+			candidate = f"{stem} ({n}){ext}"
+		self._taken.add(candidate.casefold())
+		return candidate
+
+
+def map_bounded(func: Callable[[T], R], items: Iterable[T], workers: int = 0) -> Iterator[Tuple[T, Optional[R]]]:
+	"""Run func over items on a thread pool, yielding (item, result) in input order.
+
+	At most workers * 2 items are in flight, so the input iterator is consumed lazily.
+	An exception in func is printed and yields None for that item.
+	"""
+	workers = workers or (os.cpu_count() or 1)
+	pending: deque = deque()
+
+	def pop() -> Tuple[T, Optional[R]]:
+		item, future = pending.popleft()
+		try:
+			return item, future.result()
+		except Exception as e:
+			print(f"[WARN] Failed to process {item}: {e}")
+			return item, None
+
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		for item in items:
+			pending.append((item, pool.submit(func, item)))
+			if len(pending) >= workers * 2:
+				yield pop()
+		while pending:
+			yield pop()
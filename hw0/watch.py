@@ -0,0 +1,302 @@
+"""Watch-folder mode for the date watermark CLI.
+
+New or changed images are detected with inotify on Linux (polling with
+os.scandir elsewhere), debounced until their size and mtime stop changing,
+processed by a thread pool and recorded in a checkpoint file so that a
+restart does not reprocess anything. Only successes and deliberate skips
+(no date, already watermarked) are checkpointed; a failure is retried with
+exponential backoff, or right away once the file changes. Subdirectories and include/exclude
+globs are handled by the same traversal as batch mode (walk.iter_files);
+with inotify each directory gets its own watch, and a new directory
+triggers a rescan that adds it.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from walk import iter_files, matches
+
+
+# (mtime_ns, size) identifies a version of a file
+Stamp = Tuple[int, int]
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+_EVENT_HEADER = struct.Struct("iIII")
+RETRY_MIN = 5.0  # seconds before the first retry of a failed file, doubled after each failure
+RETRY_MAX = 600.0
+
+
+class Checkpoint:
+	"""Persistent {relative path: [mtime_ns, size]} map of already processed files."""
+
+	def __init__(self, path: Path) -> None:
+		self.path = path
+		self.done: Dict[str, Stamp] = {}
+		self._dirty = False
+		try:
+			with open(path, "r", encoding="utf-8") as f:
+				self.done = {k: (int(v[0]), int(v[1])) for k, v in json.load(f).items()}
+		except (OSError, ValueError, TypeError, IndexError):
+			self.done = {}
+
+	def is_done(self, name: str, stamp: Stamp) -> bool:
+		return self.done.get(name) == stamp
+
+	def mark(self, name: str, stamp: Stamp) -> None:
+		self.done[name] = stamp
+		self._dirty = True
+
+	def save(self) -> None:
+		"""Write atomically (temp file + rename) so a crash never leaves a torn checkpoint."""
+		if not self._dirty:
+			return
+		tmp = self.path.with_name(self.path.name + ".tmp")
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump({k: list(v) for k, v in self.done.items()}, f)
+		os.replace(tmp, self.path)
+		self._dirty = False
+
+
+class _Inotify:
+	"""Minimal ctypes binding to Linux inotify; raises OSError when unavailable."""
+
+	MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+
+	def __init__(self) -> None:
+		if not sys.platform.startswith("linux"):
+			raise OSError("inotify is only available on Linux")
+		self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+		self.fd = self._libc.inotify_init1(os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0))
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+		self._dirs: Dict[int, str] = {}  # watch descriptor -> directory relative to the root
+
+	def add(self, directory: Path, rel_dir: str) -> None:
+		"""Watch a directory; adding an already watched directory is a no-op."""
+		wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), self.MASK)
+		if wd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+		self._dirs[wd] = rel_dir
+
+	def read(self, timeout: float) -> Optional[Set[str]]:
+		"""Paths (relative to the root) touched within timeout; None means rescan (queue overflow or new directory)."""
+		ready, _, _ = select.select([self.fd], [], [], timeout)
+		if not ready:
+			return set()
+		try:
+			data = os.read(self.fd, 64 * 1024)
+		except BlockingIOError:
+			return set()
+		names: Set[str] = set()
+		offset = 0
+		while offset + _EVENT_HEADER.size <= len(data):
+			wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+			offset += _EVENT_HEADER.size
+			if mask & (IN_Q_OVERFLOW | IN_ISDIR):
+				return None
+			name = data[offset:offset + length].rstrip(b"\0")
+			offset += length
+			rel_dir = self._dirs.get(wd)
+			if name and rel_dir is not None:
+				name = os.fsdecode(name)
+				names.add(f"{rel_dir}/{name}" if rel_dir else name)
+		return names
+
+	def close(self) -> None:
+		os.close(self.fd)
+
+
+def _stamp(path: Path) -> Optional[Stamp]:
+	try:
+		st = path.stat()
+	except OSError:
+		return None
+	return st.st_mtime_ns, st.st_size
+
+
+class FolderWatcher:
+	"""Debounce new/changed images in a directory (tree) and feed them to a worker pool.
+
+	Files are keyed by their path relative to the directory, using '/'.
+	"""
+
+	def __init__(
+		self,
+		directory: Path,
+		handler: Callable[[Path], Optional[Path]],
+		is_image: Callable[[Path], bool],
+		checkpoint_path: Path,
+		workers: int = 0,
+		settle: float = 2.0,
+		interval: float = 1.0,
+		rescan_every: float = 60.0,
+		recursive: bool = False,
+		include: Sequence[str] = (),
+		exclude: Sequence[str] = (),
+		prune: Iterable[Path] = (),
+	) -> None:
+		self.directory = directory
+		self.handler = handler
+		self.is_image = is_image
+		self.recursive = recursive
+		self.include = list(include)
+		self.exclude = list(exclude)
+		self.prune = list(prune)
+		self.checkpoint = Checkpoint(checkpoint_path)
+		self.workers = workers or (os.cpu_count() or 1)
+		self.settle = settle
+		self.interval = interval
+		self.rescan_every = rescan_every
+		# name -> (last seen stamp, monotonic time the stamp last changed)
+		self._pending: Dict[str, Tuple[Stamp, float]] = {}
+		self._running: Dict[str, Tuple[Future, Stamp]] = {}
+		# name -> (stamp that failed, failures so far, monotonic time of the next attempt)
+		self._retry: Dict[str, Tuple[Stamp, int, float]] = {}
+		self._notifier: Optional[_Inotify] = None
+		self._unwatched: Set[str] = set()  # directories inotify could not watch (left to the periodic rescan)
+
+	def _observe(self, name: str, stamp: Optional[Stamp], now: float) -> None:
+		failed = self._retry.get(name)
+		if failed is not None and failed[0] != stamp:
+			del self._retry[name]  # a new version of the file gets a fresh start
+		if stamp is None or self.checkpoint.is_done(name, stamp) or name in self._running:
+			self._pending.pop(name, None)
+			return
+		previous = self._pending.get(name)
+		if previous is None or previous[0] != stamp:
+			self._pending[name] = (stamp, now)
+
+	def _wanted(self, name: str) -> bool:
+		"""Filter for event paths; directories are already filtered by which ones are watched."""
+		return (
+			self.is_image(self.directory / name)
+			and (not self.include or matches(name, self.include))
+			and not matches(name, self.exclude)
+		)
+
+	def _watch_dir(self, directory: Path, rel_dir: str) -> None:
+		if self._notifier is None or rel_dir in self._unwatched:
+			return
+		try:
+			self._notifier.add(directory, rel_dir)
+		except OSError as e:
+			self._unwatched.add(rel_dir)
+			print(f"[WARN] Cannot watch {directory} ({e}); relying on the periodic rescan")
+
+	def _rescan(self, now: float) -> None:
+		for path, rel_dir in iter_files(
+			self.directory,
+			lambda name: self.is_image(Path(name)),
+			self.include,
+			self.exclude,
+			self.recursive,
+			self.prune,
+			visit=self._watch_dir,
+		):
+			name = f"{rel_dir}/{path.name}" if rel_dir else path.name
+			self._observe(name, _stamp(path), now)
+
+	def _dispatch(self, pool: ThreadPoolExecutor, now: float) -> None:
+		"""Submit files whose stamp has been stable for `settle` seconds."""
+		for name, (stamp, changed_at) in list(self._pending.items()):
+			if now - changed_at < self.settle or len(self._running) >= self.workers * 2:
+				continue
+			retry = self._retry.get(name)
+			if retry is not None and now < retry[2]:
+				continue
+			# Re-stat right before submitting: a writer may still be appending
+			current = _stamp(self.directory / name)
+			if current != stamp:
+				self._observe(name, current, now)
+				continue
+			del self._pending[name]
+			self._running[name] = (pool.submit(self.handler, self.directory / name), stamp)
+
+	def _collect(self, now: float) -> None:
+		for name, (future, stamp) in list(self._running.items()):
+			if not future.done():
+				continue
+			del self._running[name]
+			try:
+				out = future.result()
+			except Exception as e:
+				# Not checkpointed: keep the file pending and try again later
+				failures = self._retry[name][1] + 1 if name in self._retry else 1
+				delay = min(RETRY_MAX, RETRY_MIN * 2 ** (failures - 1))
+				self._retry[name] = (stamp, failures, now + delay)
+				self._pending[name] = (stamp, now)
+				print(f"[WARN] Failed to process {name}: {e} (retrying in {delay:g}s)")
+				continue
+			self._retry.pop(name, None)
+			# Deliberately skipped files (handler returned None) are checkpointed too; they only come back when changed
+			self.checkpoint.mark(name, stamp)
+			if out:
+				print(f"Saved: {out}")
+		self.checkpoint.save()
+
+	def run(self, stop: Optional[Callable[[], bool]] = None) -> None:
+		"""Watch until interrupted (or until stop() returns True)."""
+		scope = "tree" if self.recursive else "directory"
+		notifier: Optional[_Inotify] = None
+		try:
+			notifier = _Inotify()
+			notifier.add(self.directory, "")
+			print(f"Watching {self.directory} ({scope}, inotify)")
+		except (OSError, AttributeError):
+			if notifier is not None:
+				notifier.close()
+			notifier = None
+			print(f"Watching {self.directory} ({scope}, polling every {self.interval:g}s)")
+		self._notifier = notifier
+
+		last_scan = time.monotonic()
+		self._rescan(last_scan)
+		try:
+			with ThreadPoolExecutor(max_workers=self.workers) as pool:
+				while not (stop and stop()):
+					now = time.monotonic()
+					if notifier is not None:
+						names = notifier.read(self.interval)
+						now = time.monotonic()
+						if names is None:
+							self._rescan(now)
+						else:
+							for name in names:
+								if self._wanted(name):
+									self._observe(name, _stamp(self.directory / name), now)
+						# Periodic safety net for missed events
+						if now - last_scan >= self.rescan_every:
+							self._rescan(now)
+							last_scan = now
+					else:
+						time.sleep(self.interval)
+						now = time.monotonic()
+						self._rescan(now)
+					self._dispatch(pool, now)
+					self._collect(time.monotonic())
+				# Drain in-flight work before leaving
+				for future, _ in list(self._running.values()):
+					future.exception()
+				self._collect(time.monotonic())
+		except KeyboardInterrupt:
+			print("Stopping watch...")
+		finally:
+			if notifier is not None:
+				notifier.close()
+			self._notifier = None
+			self.checkpoint.save()
+
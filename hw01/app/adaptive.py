@@ -0,0 +1,58 @@
+"""
+自适应文本颜色。
+
+在低分辨率亮度副本上测量水印目标区域的平均亮度与对比度，
+从少量预渲染的变体（浅色/深色，及带反色描边的版本）中选择最醒目的一个。
+"""
+
+from typing import Dict, Tuple
+
+from PIL import Image, ImageStat
+
+
+RGBA = Tuple[int, int, int, int]
+
+LIGHT_RGB = (245, 245, 245)
+DARK_RGB = (25, 25, 25)
+BUSY_STD = 48.0  # 区域亮度标准差超过该值视为纹理复杂，加描边
+
+VARIANTS = ("light", "dark", "light_outline", "dark_outline")
+
+
+def luminance(rgb: Tuple[int, int, int]) -> float:
+    r, g, b = rgb[:3]
+    return 0.299 * r + 0.587 * g + 0.114 * b
+
+
+def variant_colors(rgba: RGBA) -> Dict[str, RGBA]:
+    """浅色/深色两种填充色；用户所选颜色保留为与其明暗一致的那一个"""
+    r, g, b, a = rgba
+    if luminance((r, g, b)) >= 128:
+        return {"light": (r, g, b, a), "dark": (*DARK_RGB, a)}
+    return {"light": (*LIGHT_RGB, a), "dark": (r, g, b, a)}
+
+
+def variant_style(variant: str, rgba: RGBA) -> Tuple[RGBA, bool, Tuple[int, int, int]]:
+    """返回 (填充色, 是否描边, 描边色)；描边取与填充相反的明暗"""
+    tone, _, outline = variant.partition("_")
+    fill = variant_colors(rgba)[tone]
+    outline_rgb = DARK_RGB if tone == "light" else LIGHT_RGB
+    return fill, bool(outline), outline_rgb
+
+
+def region_stats(proxy: Image.Image, scale: float, rect: Tuple[int, int, int, int]) -> Tuple[float, float]:
+    """在亮度副本上统计原图矩形 rect=(x, y, w, h) 的 (平均亮度, 标准差)"""
+    x, y, w, h = rect
+    x0 = max(0, min(proxy.width - 1, int(x / scale)))
+    y0 = max(0, min(proxy.height - 1, int(y / scale)))
+    x1 = max(x0 + 1, min(proxy.width, int(round((x + w) / scale))))
+    y1 = max(y0 + 1, min(proxy.height, int(round((y + h) / scale))))
+    stat = ImageStat.Stat(proxy.crop((x0, y0, x1, y1)))
+    return stat.mean[0], stat.stddev[0]
+
+
+def choose_variant(mean: float, std: float, rgba: RGBA) -> str:
+    """选与背景亮度差最大的填充色；背景纹理复杂时使用带描边的版本"""
+    colors = variant_colors(rgba)
+    tone = max(("light", "dark"), key=lambda t: abs(luminance(colors[t][:3]) - mean))
+    return f"{tone}_outline" if std > BUSY_STD else tone
@@ -0,0 +1,156 @@
+"""
+ZIP/TAR 归档的流式读写（不解压到磁盘）。
+
+读取按成员顺序进行：ZIP 按目录逐个读出，TAR（含 gz/bz2/xz 压缩）以流模式顺序读取，
+同一时刻只有正在处理的成员在内存中。写出由单个写入者顺序完成，已压缩的图片格式以
+STORED 方式存入 ZIP，避免重复压缩；归档先写入同目录的 .part 文件，完成后改名。
+"""
+
+import io
+import os
+import posixpath
+import tarfile
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional, Set, Tuple
+
+
+ZIP_EXTS = (".zip",)
+TAR_EXTS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# 这些格式本身已压缩，再 deflate 只会耗 CPU
+STORED_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+# ZIP 的 DOS 时间只能表示这个范围
+ZIP_MIN_DATE = (1980, 1, 1, 0, 0, 0)
+ZIP_MAX_DATE = (2107, 12, 31, 23, 59, 58)
+
+
+@dataclass(frozen=True)
+class Member:
+    name: str  # 归档内的相对路径（已规范化，使用 "/"）
+    data: bytes
+    mtime: float = 0.0
+
+
+def is_archive_path(path: str) -> bool:
+    lower = path.lower()
+    return lower.endswith(ZIP_EXTS) or lower.endswith(TAR_EXTS)
+
+
+def safe_member_name(name: str) -> str:
+    """去掉绝对路径、盘符和 ".." 等片段，防止写出到目标目录之外"""
+    name = name.replace("\\", "/")
+    parts = [p for p in name.split("/") if p not in ("", ".", "..") and not p.endswith(":")]
+    return "/".join(parts)
+
+
+def iter_members(path: str, accept: Optional[Callable[[str], bool]] = None) -> Iterator[Member]:
+    """按顺序产出归档中的文件成员；accept 用于按名称过滤"""
+    if path.lower().endswith(ZIP_EXTS):
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                name = safe_member_name(info.filename)
+                if info.is_dir() or not name or (accept and not accept(name)):
+                    continue
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                yield Member(name, zf.read(info), mtime)
+    else:
+        # 流模式：压缩的 tar 也无需随机访问
+        with tarfile.open(path, "r|*") as tf:
+            for info in tf:
+                name = safe_member_name(info.name)
+                if not info.isfile() or not name or (accept and not accept(name)):
+                    continue
+                fp = tf.extractfile(info)
+                if fp is None:
+                    continue
+                yield Member(name, fp.read(), float(info.mtime))
+
+
+def iter_sources(paths: Iterable[str], accept: Optional[Callable[[str], bool]] = None) -> Iterator[Member]:
+    """展开输入：归档逐个成员产出，普通文件以文件名作为成员名"""
+    for path in paths:
+        if is_archive_path(path):
+            yield from iter_members(path, accept)
+        elif accept is None or accept(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            yield Member(os.path.basename(path), data, os.path.getmtime(path))
+
+
+def zip_date_time(mtime: float) -> Tuple[int, int, int, int, int, int]:
+    """ZIP 成员的本地时间；ZIP 只能表示 1980-2107 年，超出范围的时间取边界值"""
+    try:
+        value = tuple(time.localtime(mtime)[:6])
+    except (OverflowError, OSError, ValueError):
+        value = ZIP_MIN_DATE if mtime < 0 else ZIP_MAX_DATE
+    return max(ZIP_MIN_DATE, min(ZIP_MAX_DATE, value))
+
+
+class ArchiveWriter:
+    """顺序写入 ZIP 或 TAR；重名成员自动加序号"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._tmp = path + ".part"
+        self._names: Set[str] = set()
+        self.count = 0
+        self.bytes = 0
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        lower = path.lower()
+        if lower.endswith(ZIP_EXTS):
+            self._zip: Optional[zipfile.ZipFile] = zipfile.ZipFile(self._tmp, "w", allowZip64=True)
+            self._tar: Optional[tarfile.TarFile] = None
+        elif lower.endswith(TAR_EXTS):
+            mode = {".gz": "w:gz", ".tgz": "w:gz", ".bz2": "w:bz2", ".tbz2": "w:bz2",
+                    ".xz": "w:xz", ".txz": "w:xz"}.get(os.path.splitext(lower)[1], "w")
+            self._zip = None
+            self._tar = tarfile.open(self._tmp, mode)
+        else:
+            raise ValueError(f"不支持的归档类型：{path}")
+
+    def _unique(self, name: str) -> str:
+        if name not in self._names:
+            return name
+        stem, ext = posixpath.splitext(name)
+        i = 1
+        while f"{stem}_{i}{ext}" in self._names:
+            i += 1
+        return f"{stem}_{i}{ext}"
+
+    def add(self, name: str, data: bytes, mtime: Optional[float] = None) -> str:
+        """写入一个成员，返回实际使用的成员名"""
+        name = self._unique(safe_member_name(name) or "image")
+        self._names.add(name)
+        if mtime is None:
+            mtime = time.time()
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, zip_date_time(mtime))
+            stored = posixpath.splitext(name)[1].lower() in STORED_EXTS
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            self._zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(mtime)
+            self._tar.addfile(info, io.BytesIO(data))
+        self.count += 1
+        self.bytes += len(data)
+        return name
+
+    def close(self, commit: bool = True) -> None:
+        (self._zip or self._tar).close()
+        if commit:
+            os.replace(self._tmp, self.path)
+        else:
+            try:
+                os.remove(self._tmp)
+            except OSError:
+                pass
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(commit=exc_type is None)
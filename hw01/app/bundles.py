@@ -0,0 +1,198 @@
+"""
+模板包（.wmbundle）：可在机器之间拷贝的模板。
+
+包是一个 ZIP，内含：
+- manifest.json  格式版本、内容哈希、设置指纹、预渲染资源清单
+- template.json  界面模板字典（img_wm_path 置空，由包内的 logo 代替）
+- logo.<ext>     图片水印原文件
+- overlays/*.png 预渲染的文本水印（各颜色变体）与常用输出宽度下的图片水印
+
+载入时只解码 PNG，不渲染文字（目标机器不需要安装相同字体）；
+当前设置与打包时的设置指纹不一致时忽略预渲染资源，回退到正常渲染。
+"""
+
+import hashlib
+import io
+import json
+import os
+import zipfile
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from .adaptive import VARIANTS
+from .exporter import ExportSettings, Exporter
+from .templates import settings_from_template, settings_to_dict
+from .tokens import has_tokens
+
+
+BUNDLE_EXT = ".wmbundle"
+BUNDLE_VERSION = 1
+BUNDLE_DIR = os.path.join(os.path.expanduser("~"), ".watermark_tool", "bundles")
+# 预渲染图片水印时使用的常用输出宽度
+COMMON_WIDTHS = (640, 1024, 1280, 1920, 2560, 3840)
+# 与叠加层外观无关的字段，不计入设置指纹
+_LAYOUT_ONLY_FIELDS = {"img_wm_path", "output_format", "jpeg_quality", "naming_rule", "resize_mode",
+                       "resize_value", "preset_position", "manual_pos_norm",
+                       "text_manual_enabled", "image_manual_enabled", "text_manual_pos_norm",
+                       "image_manual_pos_norm", "tile_spacing", "tile_stagger", "composite_backend",
+                       "workers", "write_mode", "writer_threads", "dedup", "dedup_link", "renditions",
+                       "frames_mode", "target_kb", "max_encodes", "invisible_payload", "invisible_key",
+                       "seen_mode", "hash_index"}
+
+
+@dataclass
+class TemplateBundle:
+    path: str
+    template: Dict[str, Any]  # img_wm_path 已指向本机解包后的 logo
+    content_hash: str
+    fingerprint: str
+    text_overlays: Dict[Tuple[str, str], Image.Image] = field(default_factory=dict)
+    logo_overlays: Dict[Tuple[int, int], Image.Image] = field(default_factory=dict)
+    logo: Optional[Image.Image] = None
+
+    def settings(self, input_paths=None, output_dir: str = "") -> ExportSettings:
+        return settings_from_template(self.template, input_paths, output_dir)
+
+    def exporter(self, settings: Optional[ExportSettings] = None) -> Exporter:
+        """创建 Exporter 并预置包内资源（设置指纹不符时不预置）"""
+        exporter = Exporter(settings or self.settings())
+        if overlay_fingerprint(exporter.settings) == self.fingerprint:
+            exporter.seed_overlays(self.text_overlays, self.logo_overlays, self.logo)
+        return exporter
+
+
+def overlay_fingerprint(settings: ExportSettings) -> str:
+    """决定叠加层外观的设置的哈希"""
+    data = {k: v for k, v in settings_to_dict(settings).items() if k not in _LAYOUT_ONLY_FIELDS}
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def _content_hash(template: Dict[str, Any], manifest: Dict[str, Any], files: Dict[str, bytes]) -> str:
+    """模板、清单中除 content_hash 外的全部条目（指纹、预渲染资源清单等）及 logo 与各 PNG 字节的哈希"""
+    entries = {k: v for k, v in manifest.items() if k != "content_hash"}
+    h = hashlib.sha256(json.dumps([template, entries], sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    for name in sorted(files):
+        data = files[name]
+        h.update(b"\0" + name.encode("utf-8") + b"\0" + len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def _png(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=6)
+    return buf.getvalue()
+
+
+def build_bundle(template: Dict[str, Any], out_path: str, widths: Sequence[int] = COMMON_WIDTHS) -> str:
+    """把模板及其 logo、预渲染叠加层打成模板包，返回内容哈希"""
+    template = dict(template)
+    logo_path = (template.get("img_wm_path") or "").strip()
+    logo_bytes = b""
+    logo_ext = ""
+    if logo_path and os.path.isfile(logo_path):
+        with open(logo_path, "rb") as f:
+            logo_bytes = f.read()
+        logo_ext = os.path.splitext(logo_path)[1].lower() or ".png"
+
+    settings = settings_from_template(template)
+    exporter = Exporter(settings)
+    overlays = []
+    files: Dict[str, bytes] = {}
+
+    text = (settings.wm_text or "").strip()
+    if settings.wm_use_text and text and not has_tokens(text):
+        variants = ("",) + (VARIANTS if settings.wm_color_mode == "adaptive" else ())
+        for i, variant in enumerate(variants):
+            overlay = exporter.text_overlay(text, variant)
+            if overlay is None:
+                continue
+            name = f"overlays/text_{i}.png"
+            files[name] = _png(overlay)
+            overlays.append({"kind": "text", "text": text, "variant": variant, "file": name})
+
+    if settings.wm_use_image and logo_bytes:
+        logo = exporter.logo_source()
+        done = set()
+        for width in widths:
+            target = exporter.logo_target((width, width), logo.size)
+            if target in done:
+                continue
+            done.add(target)
+            name = f"overlays/logo_{target[0]}x{target[1]}.png"
+            files[name] = _png(exporter.logo_overlay((width, width)))
+            overlays.append({"kind": "logo", "size": list(target), "file": name})
+
+    template["img_wm_path"] = ""
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "fingerprint": overlay_fingerprint(settings),
+        "logo": f"logo{logo_ext}" if logo_bytes else "",
+        "overlays": overlays,
+    }
+    if logo_bytes:
+        files[manifest["logo"]] = logo_bytes
+    content_hash = _content_hash(template, manifest, files)
+    manifest["content_hash"] = content_hash
+    tmp = out_path + ".part"
+    with zipfile.ZipFile(tmp, "w") as zf:
+        zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        zf.writestr("template.json", json.dumps(template, ensure_ascii=False, indent=2))
+        for name, data in files.items():
+            zf.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+    os.replace(tmp, out_path)
+    return content_hash
+
+
+def load_bundle(path: str, extract_dir: str = BUNDLE_DIR) -> TemplateBundle:
+    """载入模板包：logo 按内容哈希解包到本机目录，预渲染资源只解码不渲染
+
+    内容哈希覆盖模板、清单、logo 和每个预渲染 PNG；与清单不符（包被改动过、资源缺失）时
+    丢弃预渲染资源，模板本身仍可使用。
+    """
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        if int(manifest.get("version", 0)) > BUNDLE_VERSION:
+            raise ValueError(f"模板包版本过新：{manifest.get('version')}")
+        template = json.loads(zf.read("template.json"))
+        logo_name = manifest.get("logo") or ""
+        logo_bytes = zf.read(logo_name) if logo_name else b""
+        files = {logo_name: logo_bytes} if logo_name else {}
+        complete = True
+        for entry in manifest.get("overlays", []):
+            try:
+                files[entry["file"]] = zf.read(entry["file"])
+            except (KeyError, TypeError):
+                complete = False
+        content_hash = _content_hash(template, manifest, files)
+        intact = complete and content_hash == manifest.get("content_hash")
+
+        bundle = TemplateBundle(path=path, template=template, content_hash=content_hash,
+                                fingerprint=manifest.get("fingerprint", "") if intact else "")
+        if logo_bytes:
+            # 按内容寻址，同一 logo 只解包一次；模板中的路径指向本机副本
+            folder = os.path.join(extract_dir, content_hash[:16])
+            logo_path = os.path.join(folder, os.path.basename(logo_name))
+            if not os.path.isfile(logo_path):
+                os.makedirs(folder, exist_ok=True)
+                with open(logo_path + ".part", "wb") as f:
+                    f.write(logo_bytes)
+                os.replace(logo_path + ".part", logo_path)
+            template["img_wm_path"] = logo_path
+            with Image.open(io.BytesIO(logo_bytes)) as im:
+                bundle.logo = im.convert("RGBA")
+        if intact:
+            for entry in manifest.get("overlays", []):
+                with Image.open(io.BytesIO(files[entry["file"]])) as im:
+                    overlay = im.convert("RGBA")
+                if entry["kind"] == "text":
+                    bundle.text_overlays[(entry["text"], entry["variant"])] = overlay
+                elif entry["kind"] == "logo":
+                    bundle.logo_overlays[tuple(entry["size"])] = overlay
+    return bundle
+
+
+def is_bundle_path(path: str) -> bool:
+    return path.lower().endswith(BUNDLE_EXT)
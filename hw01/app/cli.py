@@ -0,0 +1,224 @@
+"""
+无界面的命令行入口（python main.py <子命令> ...）。
+
+    python main.py archive photos.zip -o delivered.zip --template 我的模板
+    python main.py bundle 我的模板 -o 我的模板.wmbundle
+    python main.py detect 图片目录 --key 密钥                          （读出隐形水印载荷）
+    python main.py seen 图片目录                                      （检查哪些图片像以前导出过的结果）
+    python main.py plan 图片目录 -o 输出目录 --template 我的模板     （试运行：估算耗时、内存与输出大小）
+    python main.py shard plan 图片目录 -o 输出目录 --job /共享盘/作业 --template 我的模板
+    python main.py shard work --job /共享盘/作业        （每台机器、每个进程各运行一个）
+    python main.py shard report --job /共享盘/作业
+"""
+
+import argparse
+import json
+import sys
+from dataclasses import asdict
+from typing import List, Optional
+
+from .archives import is_archive_path
+from .bundles import build_bundle, is_bundle_path, load_bundle
+from .exporter import ExportSettings, Exporter
+from .invisible import scan_files
+from .phash import DEFAULT_THRESHOLD, check_files, open_index
+from .shards import DEFAULT_CHUNK_SIZE, DEFAULT_LEASE_TIMEOUT, ShardWorker, create_job, iter_inputs, merge_report
+from .templates import TEMPLATE_DIR, load_template, settings_from_dict, settings_from_template
+
+
+def add_settings_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--template", default="", help="已保存的模板名，或 .wmbundle 模板包路径")
+    parser.add_argument("--templates", default=TEMPLATE_DIR, help="模板目录")
+    parser.add_argument("--settings", default="", help="ExportSettings 字段的 JSON，覆盖模板中的对应字段")
+    parser.add_argument("--workers", type=int, default=0, help="并行线程数（默认自动）")
+
+
+def exporter_from_args(args: argparse.Namespace, input_paths: List[str], output_dir: str) -> Exporter:
+    """--template 可以是模板名或 .wmbundle 模板包；模板包的预渲染资源会预置到 Exporter"""
+    base = bundle = None
+    if is_bundle_path(args.template):
+        bundle = load_bundle(args.template)
+        base = bundle.settings()
+    elif args.template:
+        base = settings_from_template(load_template(args.template, args.templates))
+    overrides = json.loads(args.settings) if args.settings else {}
+    settings: ExportSettings = settings_from_dict(overrides, base)
+    settings.input_paths = list(input_paths)
+    settings.output_dir = output_dir
+    if args.workers:
+        settings.workers = args.workers
+    return bundle.exporter(settings) if bundle is not None else Exporter(settings)
+
+
+def _archive(args: argparse.Namespace) -> int:
+    to_archive = is_archive_path(args.output)
+    exporter = exporter_from_args(args, args.inputs, "" if to_archive else args.output)
+    try:
+        ok, fail = exporter.export_archive(args.inputs, args.output if to_archive else None)
+    except ValueError as e:
+        print(f"无法导出：{e}", file=sys.stderr)
+        return 2
+    print(f"导出完成：成功 {ok} 张，失败 {fail} 张 -> {args.output}")
+    if exporter.seen_report is not None:
+        print(exporter.seen_report.summary())
+    return 0 if fail == 0 else 1
+
+
+def _bundle(args: argparse.Namespace) -> int:
+    content_hash = build_bundle(load_template(args.template, args.templates), args.output)
+    print(f"模板包已生成：{args.output}（内容哈希 {content_hash[:16]}）")
+    return 0
+
+
+def _detect(args: argparse.Namespace) -> int:
+    found = total = 0
+    rows = []
+    for path, result, error in scan_files(iter_inputs(args.inputs), args.key, args.workers):
+        total += 1
+        payload = result.payload if result is not None else None
+        found += payload is not None
+        if args.json:
+            rows.append({"path": path, "payload": payload, "error": error,
+                         "confidence": round(result.confidence, 3) if result is not None else 0.0})
+        elif error:
+            print(f"{path}：读取失败（{error}）")
+        elif payload is not None:
+            print(f"{path}：{payload}（置信度 {result.confidence:.2f}）")
+        elif args.verbose:
+            print(f"{path}：未检测到")
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        print(f"检测完成：{total} 个文件，{found} 个含隐形水印")
+    return 0
+
+
+def _seen(args: argparse.Namespace) -> int:
+    found = total = 0
+    rows = []
+    index = open_index(args.index)
+    for path, match in check_files(index, iter_inputs(args.inputs), args.workers, args.threshold):
+        total += 1
+        found += match is not None
+        if args.json:
+            rows.append({"path": path, "match": match.path if match else None,
+                         "distance": match.distance if match else None})
+        elif match is not None:
+            print(f"{path}：疑似已加水印（像 {match.path}，距离 {match.distance}）")
+        elif args.verbose:
+            print(f"{path}：未见过")
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        print(f"检查完成：{total} 个文件，{found} 个疑似已加水印（索引 {len(index)} 条）")
+    return 0
+
+
+def _plan(args: argparse.Namespace) -> int:
+    exporter = exporter_from_args(args, list(iter_inputs(args.inputs)), args.output)
+    counts = [int(n) for n in args.worker_counts.split(",") if n.strip()] if args.worker_counts else []
+    plan = exporter.plan(args.sample, counts)
+    if args.json:
+        data = asdict(plan)
+        data["fits"] = plan.fits
+        print(json.dumps(data, ensure_ascii=False, indent=2))
+    else:
+        print(plan.summary())
+    # 有无效文件或磁盘空间不足时返回非零，便于脚本在正式导出前拦截
+    return 0 if plan.fits and not plan.invalid else 1
+
+
+def _shard_plan(args: argparse.Namespace) -> int:
+    settings = exporter_from_args(args, [], args.output).settings
+    job = create_job(args.job, args.inputs, settings, args.chunk_size, args.lease_timeout)
+    print(f"作业已创建：{job.total} 张图片，{job.chunks} 个分片 -> {args.job}")
+    return 0
+
+
+def _shard_work(args: argparse.Namespace) -> int:
+    worker = ShardWorker(args.job, args.worker_id)
+    processed = worker.run(args.max_chunks or None)
+    print(f"{worker.worker_id}：处理了 {processed} 个分片")
+    report = merge_report(args.job, write=True)
+    if report.complete:
+        print(report.summary())
+    return 0
+
+
+def _shard_report(args: argparse.Namespace) -> int:
+    report = merge_report(args.job, write=True)
+    print(report.summary())
+    return 0 if report.complete and report.fail == 0 else 1
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="main.py", description="水印批处理工具（命令行）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    archive = sub.add_parser("archive", help="直接读写 ZIP/TAR 归档（不解压到磁盘）")
+    archive.add_argument("inputs", nargs="+", help="ZIP/TAR 归档或图片文件")
+    archive.add_argument("-o", "--output", required=True, help="输出归档（.zip/.tar[.gz]）或输出目录")
+    add_settings_arguments(archive)
+    archive.set_defaults(func=_archive)
+
+    bundle = sub.add_parser("bundle", help="把已保存的模板打成可移植的 .wmbundle 模板包")
+    bundle.add_argument("template", help="模板名")
+    bundle.add_argument("-o", "--output", required=True, help="输出的 .wmbundle 文件")
+    bundle.add_argument("--templates", default=TEMPLATE_DIR, help="模板目录")
+    bundle.set_defaults(func=_bundle)
+
+    detect = sub.add_parser("detect", help="检测图片中的隐形水印并读出载荷")
+    detect.add_argument("inputs", nargs="+", help="图片文件或目录（递归）")
+    detect.add_argument("--key", default="", help="嵌入时使用的密钥（ExportSettings.invisible_key，默认空）")
+    detect.add_argument("--workers", type=int, default=0, help="并行线程数（默认自动）")
+    detect.add_argument("--json", action="store_true", help="以 JSON 输出每个文件的结果")
+    detect.add_argument("-v", "--verbose", action="store_true", help="同时列出未检测到水印的文件")
+    detect.set_defaults(func=_detect)
+
+    seen = sub.add_parser("seen", help="按已导出结果的感知哈希索引，检查哪些图片疑似已加过水印")
+    seen.add_argument("inputs", nargs="+", help="图片文件或目录（递归）")
+    seen.add_argument("--index", default="", help="索引文件（ExportSettings.hash_index，默认 ~/.watermark_tool/outputs.phash）")
+    seen.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD, help="整幅哈希的汉明距离上限")
+    seen.add_argument("--workers", type=int, default=0, help="并行线程数（默认自动）")
+    seen.add_argument("--json", action="store_true", help="以 JSON 输出每个文件的结果")
+    seen.add_argument("-v", "--verbose", action="store_true", help="同时列出未见过的文件")
+    seen.set_defaults(func=_seen)
+
+    plan = sub.add_parser("plan", help="试运行：只读文件头并抽样渲染，估算耗时、内存与输出大小，不写任何文件")
+    plan.add_argument("inputs", nargs="+", help="图片文件或目录（递归）")
+    plan.add_argument("-o", "--output", default="", help="输出目录（用于检查剩余空间）")
+    plan.add_argument("--sample", type=int, default=2, help="每种输入格式抽样渲染的张数")
+    plan.add_argument("--worker-counts", default="", help="要估算的并行进程数，逗号分隔（默认 1,2,4,CPU 核数）")
+    plan.add_argument("--json", action="store_true", help="以 JSON 输出计划")
+    add_settings_arguments(plan)
+    plan.set_defaults(func=_plan)
+
+    shard = sub.add_parser("shard", help="分片批处理：多进程/多机器通过共享目录协作").add_subparsers(
+        dest="action", required=True)
+    plan = shard.add_parser("plan", help="把输入切成分片，创建作业目录")
+    plan.add_argument("inputs", nargs="+", help="图片文件或目录（递归）")
+    plan.add_argument("-o", "--output", required=True, help="输出目录（各工作者共享）")
+    plan.add_argument("--job", required=True, help="作业目录（各工作者共享）")
+    plan.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每个分片的图片数")
+    plan.add_argument("--lease-timeout", type=float, default=DEFAULT_LEASE_TIMEOUT,
+                      help="租约超时秒数，超时无心跳的分片由其他工作者接管")
+    add_settings_arguments(plan)
+    plan.set_defaults(func=_shard_plan)
+    work = shard.add_parser("work", help="领取并处理分片，直到作业完成")
+    work.add_argument("--job", required=True)
+    work.add_argument("--worker-id", default="", help="工作者标识（默认 主机名-进程号）")
+    work.add_argument("--max-chunks", type=int, default=0, help="最多处理的分片数（0 表示不限）")
+    work.set_defaults(func=_shard_work)
+    report = shard.add_parser("report", help="合并各分片结果，写出 report.json")
+    report.add_argument("--job", required=True)
+    report.set_defaults(func=_shard_report)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
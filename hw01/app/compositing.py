@@ -0,0 +1,182 @@
+"""
+水印合成内核。
+
+默认使用 Pillow 的 ``alpha_composite``；安装了 numpy 时可切换到向量化后端：
+叠加层预先转换为预乘 alpha，仅在叠加层覆盖的 ROI 上原地混合，
+并支持把同一个叠加层一次性盖到一叠同尺寸图像上。
+"""
+
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence, Tuple, Union
+
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时回退到 Pillow
+    np = None
+
+
+HAS_NUMPY = np is not None
+
+BACKENDS = ("auto", "numpy", "pillow")
+
+
+@dataclass
+class PreparedOverlay:
+    """预乘 alpha 后的叠加层（numpy 后端使用）"""
+    size: Tuple[int, int]
+    premul: Any  # float32 (h, w, 3)，取值 0..255，已乘以 alpha
+    alpha: Any  # float32 (h, w, 1)，取值 0..1
+
+
+def resolve_backend(name: str) -> str:
+    """把 "auto"/"numpy"/"pillow" 解析为实际可用的后端"""
+    if name in ("auto", "numpy") and HAS_NUMPY:
+        return "numpy"
+    return "pillow"
+
+
+def apply_opacity(overlay: Image.Image, opacity: int) -> Image.Image:
+    """按百分比缩放叠加层的 alpha 通道，返回新图像"""
+    opacity = max(0, min(100, int(opacity)))
+    if overlay.mode != "RGBA":
+        overlay = overlay.convert("RGBA")
+    if opacity >= 100:
+        return overlay
+    lut = [(p * opacity + 50) // 100 for p in range(256)]
+    out = overlay.copy()
+    out.putalpha(overlay.getchannel("A").point(lut))
+    return out
+
+
+def prepare_overlay(overlay: Image.Image, opacity: int = 100) -> PreparedOverlay:
+    """把 RGBA 叠加层转换为预乘 alpha 的 float32 数组（只需做一次）"""
+    if np is None:
+        raise RuntimeError("numpy 未安装，无法使用向量化合成后端")
+    if overlay.mode != "RGBA":
+        overlay = overlay.convert("RGBA")
+    arr = np.asarray(overlay, dtype=np.float32)
+    alpha = arr[..., 3:4] / 255.0
+    opacity = max(0, min(100, int(opacity)))
+    if opacity < 100:
+        alpha *= opacity / 100.0
+    return PreparedOverlay(size=overlay.size, premul=arr[..., :3] * alpha, alpha=alpha)
+
+
+def _clip_box(base_size: Tuple[int, int], overlay_size: Tuple[int, int],
+              dest: Tuple[int, int]) -> Union[None, Tuple[int, int, int, int, int, int]]:
+    """计算叠加层与底图的交集，返回 (dx, dy, sx, sy, w, h)；无交集返回 None"""
+    bw, bh = base_size
+    ow, oh = overlay_size
+    x, y = int(dest[0]), int(dest[1])
+    dx, dy = max(x, 0), max(y, 0)
+    sx, sy = dx - x, dy - y
+    w = min(bw - dx, ow - sx)
+    h = min(bh - dy, oh - sy)
+    if w <= 0 or h <= 0:
+        return None
+    return dx, dy, sx, sy, w, h
+
+
+def _blend_roi(dst, prepared: PreparedOverlay, dest: Tuple[int, int]) -> None:
+    """在 dst[..., H, W, C] 的 ROI 上原地做预乘 alpha 混合"""
+    box = _clip_box((dst.shape[-2], dst.shape[-3]), prepared.size, dest)
+    if box is None:
+        return
+    dx, dy, sx, sy, w, h = box
+    roi = dst[..., dy:dy + h, dx:dx + w, :]
+    premul = prepared.premul[sy:sy + h, sx:sx + w]
+    alpha = prepared.alpha[sy:sy + h, sx:sx + w]
+    inv = 1.0 - alpha
+    if dst.shape[-1] == 3:
+        out = premul + roi * inv
+        roi[...] = np.clip(out + 0.5, 0, 255).astype(np.uint8)
+        return
+    dst_a = roi[..., 3:4] * (1.0 / 255.0)
+    out_a = alpha + dst_a * inv
+    out_c = premul + roi[..., :3] * (dst_a * inv)
+    safe = np.where(out_a > 0, out_a, 1.0)
+    # 与 Pillow 一致：源像素完全透明时保留目标像素原值
+    out_c = np.where(alpha > 0, out_c / safe + 0.5, roi[..., :3])
+    roi[..., :3] = np.clip(out_c, 0, 255).astype(np.uint8)
+    roi[..., 3:4] = np.clip(out_a * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+
+def blend_into(dst, prepared: PreparedOverlay, dest: Tuple[int, int]) -> None:
+    """把叠加层原地混合进 uint8 RGB/RGBA 缓冲区 (H, W, 3|4)"""
+    _blend_roi(dst, prepared, dest)
+
+
+def composite_stack(stack, prepared: PreparedOverlay, dest: Tuple[int, int]) -> None:
+    """把同一个叠加层一次性原地盖到一叠同尺寸图像上，stack 形状为 (N, H, W, 3|4)"""
+    _blend_roi(stack, prepared, dest)
+
+
+def composite_layers(base: Image.Image,
+                     layers: Sequence[Tuple[Union[Image.Image, PreparedOverlay], Tuple[int, int]]],
+                     backend: str = "auto") -> Image.Image:
+    """按顺序把多个叠加层合成到底图上，返回新图像（不修改 base）
+
+    Pillow 后端输出 RGBA；numpy 后端对 RGB 底图保持 RGB，省去整幅的通道转换，
+    且多层共用一次数组转换。
+    """
+    if resolve_backend(backend) == "numpy":
+        mode = base.mode if base.mode in ("RGB", "RGBA") else ("RGBA" if "A" in base.getbands() else "RGB")
+        arr = np.array(base if base.mode == mode else base.convert(mode))
+        for overlay, dest in layers:
+            prepared = overlay if isinstance(overlay, PreparedOverlay) else prepare_overlay(overlay)
+            _blend_roi(arr, prepared, dest)
+        return Image.fromarray(arr)
+
+    result = base.convert("RGBA") if base.mode != "RGBA" else base.copy()
+    for overlay, dest in layers:
+        if isinstance(overlay, PreparedOverlay):
+            raise TypeError("Pillow 后端需要 PIL.Image 叠加层")
+        if overlay.mode != "RGBA":
+            overlay = overlay.convert("RGBA")
+        box = _clip_box(result.size, overlay.size, dest)
+        if box is not None:
+            dx, dy, sx, sy, w, h = box
+            result.alpha_composite(overlay, dest=(dx, dy), source=(sx, sy, sx + w, sy + h))
+    return result
+
+
+def layers_box(base_size: Tuple[int, int],
+               layers: Sequence[Tuple[Union[Image.Image, PreparedOverlay], Tuple[int, int]]]
+               ) -> Optional[Tuple[int, int, int, int]]:
+    """各叠加层在底图内的外接矩形 (x0, y0, x1, y1)；都在底图之外时返回 None"""
+    boxes = []
+    for overlay, dest in layers:
+        box = _clip_box(base_size, overlay.size, dest)
+        if box is not None:
+            dx, dy, _, _, w, h = box
+            boxes.append((dx, dy, dx + w, dy + h))
+    if not boxes:
+        return None
+    return min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)
+
+
+def composite_roi(base: Image.Image,
+                  layers: Sequence[Tuple[Union[Image.Image, PreparedOverlay], Tuple[int, int]]],
+                  backend: str = "auto") -> Image.Image:
+    """只在各叠加层的外接矩形内合成后贴回 base，原地修改并返回 base，模式不变
+
+    用于调用方独占的中间图像（如逐帧处理中的单帧），省去整幅的复制与模式转换。
+    """
+    box = layers_box(base.size, layers)
+    if box is None:
+        return base
+    x0, y0, x1, y1 = box
+    shifted = [(overlay, (dest[0] - x0, dest[1] - y0)) for overlay, dest in layers]
+    roi = composite_layers(base.crop((x0, y0, x1, y1)), shifted, backend)
+    if roi.mode != base.mode:
+        roi = roi.convert(base.mode)
+    base.paste(roi, (x0, y0))
+    return base
+
+
+def composite(base: Image.Image, overlay: Union[Image.Image, PreparedOverlay],
+              dest: Tuple[int, int], backend: str = "auto") -> Image.Image:
+    """把单个叠加层合成到底图上，返回新图像（不修改 base）"""
+    return composite_layers(base, [(overlay, dest)], backend)
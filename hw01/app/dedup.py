@@ -0,0 +1,144 @@
+"""
+按文件内容去重。
+
+先比较文件大小（一次 stat），只有大小相同的文件才需要进一步判断：
+同一 inode（硬链接）直接视为相同，其余并行流式计算完整哈希。
+每组相同内容只保留第一次出现的路径作为代表，其余记为其副本。
+"""
+
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .probe import default_workers
+
+
+_CHUNK = 1 << 20
+
+
+@dataclass
+class DedupReport:
+    total: int = 0
+    unique: int = 0
+    hashed: int = 0  # 实际计算过完整哈希的文件数
+    bytes_hashed: int = 0
+    duplicate_bytes: int = 0  # 副本的源文件字节总数（因此省去的解码量）
+    linked: int = 0  # 输出以硬链接生成的副本数
+    copied: int = 0  # 输出以复制生成的副本数
+    groups: Dict[str, List[str]] = field(default_factory=dict)  # 代表路径 -> 副本路径
+    skipped_reason: str = ""
+
+    @property
+    def duplicates(self) -> int:
+        return sum(len(v) for v in self.groups.values())
+
+    def summary(self) -> str:
+        if self.skipped_reason:
+            return f"未去重：{self.skipped_reason}"
+        return (f"去重：{self.total} 个文件中 {self.duplicates} 个为重复内容（{len(self.groups)} 组，"
+                f"{self.duplicate_bytes / 1e6:.1f} MB），哈希 {self.hashed} 个文件；"
+                f"副本输出硬链接 {self.linked} 个、复制 {self.copied} 个")
+
+
+def file_digest(path: str) -> str:
+    """流式计算文件哈希（复用同一块缓冲区）"""
+    h = hashlib.blake2b(digest_size=20)
+    buf = bytearray(_CHUNK)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+    return h.hexdigest()
+
+
+def _stat(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def find_duplicates(paths: Sequence[str], workers: int = 0) -> Tuple[List[str], DedupReport]:
+    """返回 (去重后的路径，保持原顺序, 报告)；无法读取的文件原样保留，交给后续流程报错"""
+    report = DedupReport(total=len(paths))
+    workers = workers or default_workers()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths) or 1))) as pool:
+        stats = list(pool.map(_stat, paths))
+
+        by_size: Dict[int, List[int]] = {}
+        for i, st in enumerate(stats):
+            if st is not None:
+                by_size.setdefault(st.st_size, []).append(i)
+
+        # 同一 inode 的硬链接无需哈希；其余大小冲突的文件才读取内容
+        identity: Dict[int, str] = {}
+        to_hash: List[int] = []
+        for members in by_size.values():
+            if len(members) < 2:
+                continue
+            seen_inodes: Dict[Tuple[int, int], int] = {}
+            for i in members:
+                st = stats[i]
+                inode = (st.st_dev, st.st_ino)
+                if st.st_ino and inode in seen_inodes:
+                    identity[i] = f"inode:{seen_inodes[inode]}"
+                else:
+                    seen_inodes[inode] = i
+                    to_hash.append(i)
+
+        def digest(i: int) -> Optional[str]:
+            try:
+                return file_digest(paths[i])
+            except OSError:
+                return None
+
+        for i, value in zip(to_hash, pool.map(digest, to_hash)):
+            if value is not None:
+                identity[i] = f"{stats[i].st_size}:{value}"
+                report.hashed += 1
+                report.bytes_hashed += stats[i].st_size
+        # 硬链接跟随其第一个路径的哈希
+        for i, value in list(identity.items()):
+            if value.startswith("inode:"):
+                identity[i] = identity.get(int(value[6:]), value)
+
+    unique: List[str] = []
+    first_of: Dict[str, int] = {}
+    for i, path in enumerate(paths):
+        key = identity.get(i)
+        if key is None:
+            unique.append(path)
+            continue
+        first = first_of.setdefault(key, i)
+        if first == i:
+            unique.append(path)
+        else:
+            report.groups.setdefault(paths[first], []).append(path)
+            report.duplicate_bytes += stats[i].st_size
+    report.unique = len(unique)
+    return unique, report
+
+
+def link_or_copy(src: str, dst: str, prefer_link: bool = True) -> str:
+    """把已写好的输出复用到 dst（原子替换），返回 "link" 或 "copy" """
+    folder = os.path.dirname(os.path.abspath(dst))
+    tmp = os.path.join(folder, f".{os.path.basename(dst)}.{os.getpid()}.dup.tmp")
+    if prefer_link:
+        try:
+            os.link(src, tmp)
+            os.replace(tmp, dst)
+            return "link"
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+    return "copy"
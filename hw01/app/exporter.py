@@ -1,25 +1,55 @@
+import io
 import os
-from dataclasses import dataclass
-from typing import List, Optional, Tuple
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 from PIL import Image
-from .utils import render_text_overlay
+from .compositing import (PreparedOverlay, apply_opacity, composite_layers, composite_roi, layers_box,
+                          prepare_overlay, resolve_backend)
+from .metadata import apply_orientation, display_size, passthrough_info
+from .archives import ArchiveWriter, Member, iter_sources, safe_member_name
+from .dedup import DedupReport, find_duplicates, link_or_copy
+from .frames import output_format, write_frames
+from .invisible import embed as embed_invisible, payload_bits
+from .phash import SEEN_MODES, Box, Fingerprint, HashIndex, SeenReport, filter_seen, fingerprint, open_index
+from .adaptive import choose_variant, region_stats, variant_style
+from .placement import auto_positions, luminance_proxy
+from .probe import GeometryKey, ImageHeader, default_workers, group_by_geometry, prefetch_headers, read_header
+from .sizing import (DEFAULT_MAX_ENCODES, MIN_QUALITY, QUALITY_LIMITS, SIZE_TARGET_FORMATS, SizeFit, SizeReport,
+                     fit_quality)
+from .tiling import TilePattern
+from .tokens import expand_text, has_tokens
+from .utils import LruCache, as_stream, is_supported_image_path, render_text_overlay
+from .writer import OutputWriter, WriteStats
+
+if TYPE_CHECKING:
+    from .planner import ExportPlan
 
 
 NamingRule = Tuple[str, str]  # ("keep"|"prefix"|"suffix", value)
+# (最大宽度, 命名后缀, 输出格式 "JPEG"|"PNG"|"WEBP"|"" 同主设置, JPEG/WebP 质量或 None 同主设置)
+Rendition = Tuple[int, str, str, Optional[int]]
+Source = Union[bytes, bytearray, memoryview, IO[bytes]]  # 内存中的图像数据或已打开的文件对象
+
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp",
+              "TIFF": "image/tiff"}
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp", "TIFF": ".tif"}
 
 
 @dataclass
 class ExportSettings:
     input_paths: List[str]
     output_dir: str
-    output_format: str  # "JPEG" | "PNG"
-    jpeg_quality: Optional[int]
+    output_format: str  # "JPEG" | "PNG" | "WEBP"
+    jpeg_quality: Optional[int]  # JPEG/WebP 质量；按目标大小编码时为质量上限
     naming_rule: NamingRule
     resize_mode: str  # "none"|"width"|"height"|"percent"
     resize_value: Optional[int]
     # text watermark
-    wm_text: str = ""
+    wm_text: str = ""  # may contain {date} {datetime:%Y} {filename} {camera} {lens} {iso} {index}
     wm_font_family: str = "Microsoft YaHei"
     wm_font_size: int = 32
     wm_bold: bool = False
@@ -27,16 +57,21 @@ class ExportSettings:
     wm_color_rgba: Tuple[int, int, int, int] = (255, 255, 255, 128)
     wm_shadow: bool = False
     wm_outline: bool = False
+    wm_color_mode: str = "fixed"  # "fixed" | "adaptive" (light/dark/outline per image)
     # image watermark
     img_wm_path: str = ""
     # (mode, percent, width, height) where mode in {"percent","size"}
     img_wm_scale: Tuple[str, Optional[int], Optional[int], Optional[int]] = ("percent", 30, None, None)
     img_wm_opacity: int = 60
     # layout & rotation
-    position_mode: str = "preset"  # "preset" | "manual"
+    position_mode: str = "preset"  # "preset" | "manual" | "tile" | "auto" (quietest region)
     preset_position: str = "bottom-right"  # 9-grid keys
     manual_pos_norm: Tuple[float, float] = (0.8, 0.8)  # top-left normalized (0..1)
     rotation_deg: float = 0.0
+    # tiled mode: gap between copies (x, y) px, odd-row shift (fraction of cell), per-copy angle
+    tile_spacing: Tuple[int, int] = (120, 80)
+    tile_stagger: float = 0.5
+    tile_angle_deg: float = 30.0
     # which watermark to use
     wm_use_text: bool = True
     wm_use_image: bool = True
@@ -45,14 +80,104 @@ class ExportSettings:
     image_manual_enabled: bool = False
     text_manual_pos_norm: Tuple[float, float] = (0.8, 0.8)
     image_manual_pos_norm: Tuple[float, float] = (0.8, 0.8)
+    # compositing backend: "auto" (numpy when installed) | "numpy" | "pillow"
+    composite_backend: str = "auto"
+    # parallel header/metadata prefetch threads (0 = auto)
+    workers: int = 0
+    # output writer: "durable" (fsync + atomic rename) | "fast" (atomic rename only)
+    write_mode: str = "durable"
+    writer_threads: int = 2
+    # content de-duplication: identical inputs are rendered once, other outputs are "hardlink" | "copy"
+    dedup: bool = False
+    dedup_link: str = "hardlink"
+    # multi-resolution output: one decode, one output per rendition (overrides resize_mode)
+    renditions: Tuple[Rendition, ...] = ()
+    # multi-frame inputs (animated GIF/WebP/PNG, multi-page TIFF): "all" keeps every frame in the source
+    # container format | "first" exports the first frame only, in output_format
+    frames_mode: str = "all"
+    # target file size for JPEG/WebP outputs (KB, 0 = off): per-image quality search, at most max_encodes
+    # full-size encodes per output
+    target_kb: int = 0
+    max_encodes: int = DEFAULT_MAX_ENCODES
+    # invisible watermark (needs numpy): payload such as a customer ID (up to 12 UTF-8 bytes) embedded in the
+    # luminance DCT of single-frame outputs; "" = off. The key must match when detecting ("" = default key)
+    invisible_payload: str = ""
+    invisible_key: str = ""
+    # perceptual-hash index of exported files ("" = ~/.watermark_tool/outputs.phash): "off" | "record" every
+    # output | "flag" inputs that look like an earlier output (seen_report) | "skip" them
+    seen_mode: str = "record"
+    hash_index: str = ""
+
+
+@dataclass
+class PreparedLayers:
+    """某一输出尺寸下准备好的叠加层，同一几何桶内的图片共用"""
+    size: Tuple[int, int]
+    entries: List[Tuple[Union[Image.Image, PreparedOverlay], Optional[Tuple[int, int]]]]  # 位置为 None 表示自动
+    backend: str
+    text: Optional[str] = None
+    text_index: int = -1  # 自适应颜色时文本层在 entries 中的下标
+
+
+@dataclass
+class RenderResult:
+    """内存导出的结果"""
+    data: bytes  # 编码后的输出文件
+    name: str  # 按命名规则得到的输出文件名
+    format: str
+    mime: str
+    size: Tuple[int, int]  # 输出像素尺寸
+    source_size: Tuple[int, int]  # 原图显示尺寸（已按 EXIF 方向换算）
+    source_format: str = ""
+    metadata: Dict[str, Any] = field(default_factory=dict)  # 写入输出的 EXIF/ICC/DPI
+    quality: Optional[int] = None  # 按目标大小编码时选定的质量
+    encodes: int = 1  # 全尺寸编码次数
+    fingerprint: Optional[Fingerprint] = None  # 感知哈希指纹（仅在记录索引的导出中计算）
+
+
+@dataclass
+class BatchStats:
+    """按几何分桶的复用统计"""
+    buckets: int = 0
+    images: int = 0
+    reused: int = 0  # 直接复用桶内已准备叠加层的图片数
+    text_renders: int = 0  # 实际渲染的文本叠加层数（按展开后的文本缓存）
+    variants: Dict[str, int] = field(default_factory=dict)  # 自适应颜色各变体的使用次数
+    bucket_sizes: Dict[GeometryKey, int] = field(default_factory=dict)
+
+    def add_bucket(self, key: GeometryKey, count: int) -> None:
+        self.buckets += 1
+        self.images += count
+        self.reused += count - 1
+        self.bucket_sizes[key] = count
+
+    def summary(self) -> str:
+        return (f"{self.images} 张图片分为 {self.buckets} 个尺寸组，复用叠加层 {self.reused} 次，"
+                f"渲染文本 {self.text_renders} 次")
 
 
 class Exporter:
     def __init__(self, settings: ExportSettings) -> None:
         self.settings = settings
-        os.makedirs(self.settings.output_dir, exist_ok=True)
+        if settings.invisible_payload:
+            payload_bits(settings.invisible_payload)  # 载荷过长时尽早报错
+        if settings.seen_mode not in SEEN_MODES:
+            raise ValueError(f"未知的 seen_mode：{settings.seen_mode}")
+        # 整批复用的渲染结果，LRU 缓存按行尾注释中的键保存对应的值，满后淘汰最久未用的项
+        self._text_cache = LruCache(256)  # (展开后的文本, 颜色变体) -> 旋转后的叠加层
+        self._entry_cache = LruCache(64)  # (图层, 输出尺寸, 文本) -> (叠加层, 位置)
+        self._logo_cache: Union[None, bool, Image.Image] = None  # 图片水印原图；False 表示已确认不可用
+        self._tile_cache = LruCache(16)  # (图层, 文本, 叠加层尺寸) -> TilePattern
+        self._logo_overlays = LruCache(16)  # 缩放后尺寸 -> 调整透明度并旋转后的图片水印
+        self.stats = BatchStats()
+        self.write_stats = WriteStats()
+        self.dedup_report: Optional[DedupReport] = None
+        self.size_report = SizeReport(settings.target_kb * 1024) if settings.target_kb else None
+        self.seen_report: Optional[SeenReport] = None
+        self._index: Optional[HashIndex] = None  # 记录输出的感知哈希索引，只在导出到文件期间设置
+        self._writer: Optional[OutputWriter] = None
 
-    def _build_output_name(self, src_path: str) -> str:
+    def _build_output_name(self, src_path: str, suffix: str = "", fmt: str = "") -> str:
         base = os.path.basename(src_path)
         name, _ = os.path.splitext(base)
         rule, val = self.settings.naming_rule
@@ -61,15 +186,32 @@ class Exporter:
         elif rule == "suffix":
             name = f"{name}{val}"
         # keep -> no change
-        ext = ".jpg" if self.settings.output_format == "JPEG" else ".png"
-        return f"{name}{ext}"
+        ext = EXTENSIONS.get(fmt or self.settings.output_format, ".png")
+        return f"{name}{suffix}{ext}"
 
-    def _resize(self, img: Image.Image) -> Image.Image:
+    def _output_names(self, src_path: str) -> List[str]:
+        """一张输入对应的全部输出文件名（多规格时每个规格一个）"""
+        if not self.settings.renditions:
+            return [self._build_output_name(src_path)]
+        return [self._build_output_name(src_path, suffix, fmt) for _, suffix, fmt, _ in self.settings.renditions]
+
+    def _rendition_plan(self, w: int, h: int) -> List[Tuple[Rendition, Tuple[int, int]]]:
+        """各规格的输出尺寸，按从大到小排列；宽度不超过原图（不放大）"""
+        plan = [(rendition, self._rendition_size(rendition, w, h)) for rendition in self.settings.renditions]
+        plan.sort(key=lambda item: item[1][0], reverse=True)
+        return plan
+
+    @staticmethod
+    def _rendition_size(rendition: Rendition, w: int, h: int) -> Tuple[int, int]:
+        new_w = max(1, min(int(rendition[0]), w))
+        return new_w, max(1, int(h * (new_w / w)))
+
+    def target_size(self, w: int, h: int) -> Tuple[int, int]:
+        """按缩放设置计算输出尺寸（只依赖原图尺寸）"""
         mode = self.settings.resize_mode
         value = self.settings.resize_value
         if mode == "none" or value is None:
-            return img
-        w, h = img.size
+            return w, h
         if mode == "width":
             new_w = value
             new_h = int(h * (new_w / w))
@@ -81,13 +223,47 @@ class Exporter:
             new_w = max(1, int(w * scale))
             new_h = max(1, int(h * scale))
         else:
+            return w, h
+        return new_w, new_h
+
+    def _resize(self, img: Image.Image, size: Optional[Tuple[int, int]] = None) -> Image.Image:
+        new_w, new_h = size or self.target_size(*img.size)
+        if (new_w, new_h) == img.size:
             return img
         if img.mode in ("P", "1"):
             img = img.convert("RGBA") if "A" in img.getbands() else img.convert("RGB")
-        return img.resize((new_w, new_h), Image.LANCZOS)
+        return img.resize((new_w, new_h), Image.LANCZOS, reducing_gap=3.0)
 
-    def _save(self, img: Image.Image, out_path: str) -> None:
-        fmt = self.settings.output_format
+    def _encode(self, img: Image.Image, meta: Optional[Dict[str, Any]] = None,
+                fmt: str = "", quality: Optional[int] = None) -> bytes:
+        """编码到内存，返回输出文件字节"""
+        buf = io.BytesIO()
+        self._write(img, buf, meta, fmt, quality)
+        return buf.getvalue()
+
+    def _encode_output(self, img: Image.Image, meta: Dict[str, Any], name: str, fmt: str = "",
+                       quality: Optional[int] = None) -> Tuple[bytes, Optional[SizeFit]]:
+        """编码一个输出；设置了目标大小且为 JPEG/WebP 时逐张搜索质量，结果计入 size_report"""
+        fmt = fmt or self.settings.output_format
+        if not self.settings.target_kb or fmt not in SIZE_TARGET_FORMATS:
+            return self._encode(img, meta, fmt, quality), None
+        lowest, highest = QUALITY_LIMITS[fmt]
+        high = max(lowest, min(highest, int(quality or self.settings.jpeg_quality or highest)))
+        # 元数据与质量无关，按原始字节计入固定开销
+        overhead = sum(len(meta[k]) for k in ("exif", "icc_profile") if k in meta)
+        fit = fit_quality(img, self.settings.target_kb * 1024,
+                          lambda q: self._encode(img, meta, fmt, q),
+                          lambda proxy, q: self._encode(proxy, None, fmt, q),
+                          (min(high, max(lowest, MIN_QUALITY)), high), self.settings.max_encodes, overhead)
+        if self.size_report is not None:
+            self.size_report.add(name, fit)
+        return fit.data, fit
+
+    def _write(self, img: Image.Image, fp: Union[str, IO[bytes]], meta: Optional[Dict[str, Any]] = None,
+               fmt: str = "", quality: Optional[int] = None) -> None:
+        # 原始 EXIF/ICC/DPI 字节直接写回（Orientation 已置 1）；fmt/quality 为空时用主设置
+        meta = meta or {}
+        fmt = fmt or self.settings.output_format
         if fmt == "JPEG":
             if img.mode in ("RGBA", "LA"):
                 # JPEG 不支持透明，转白底
@@ -96,37 +272,528 @@ class Exporter:
                 img_to_save = bg
             else:
                 img_to_save = img.convert("RGB")
-            params = {"quality": int(self.settings.jpeg_quality or 90), "optimize": True}
-            img_to_save.save(out_path, format="JPEG", **params)
+            params = {"quality": int(quality or self.settings.jpeg_quality or 90), "optimize": True}
+            img_to_save.save(fp, format="JPEG", **params, **meta)
+        elif fmt == "WEBP":
+            params = {"quality": int(quality or self.settings.jpeg_quality or 90), "method": 4}
+            img.save(fp, format="WEBP", **params, **{k: v for k, v in meta.items() if k in ("exif", "icc_profile")})
         else:  # PNG
-            img.save(out_path, format="PNG")
+            img.save(fp, format="PNG", **meta)
 
     def export_all(self) -> Tuple[int, int]:
+        """导出全部图片，返回 (成功数, 失败数)；分桶复用统计见 self.stats"""
         ok = 0
         fail = 0
-        for src in self.settings.input_paths:
-            try:
-                with Image.open(src) as im:
-                    im.load()
-                    resized = self._resize(im)
-                    # apply text watermark if provided
-                    # 先叠加图片水印，再叠加文本水印，确保文本可见
-                    final = self._apply_image_watermark(resized)
-                    final = self._apply_text_watermark(final)
-                    out_name = self._build_output_name(src)
-                    out_path = os.path.join(self.settings.output_dir, out_name)
-                    self._save(final, out_path)
+        self.stats = BatchStats()
+        if self.size_report is not None:
+            self.size_report = SizeReport(self.size_report.target)
+        os.makedirs(self.settings.output_dir, exist_ok=True)
+        # 并行预读文件头；文本含占位符时一并读取拍摄信息
+        dynamic = self.settings.wm_use_text and has_tokens(self.settings.wm_text)
+        paths = self.settings.input_paths
+        self._open_index()
+        if self._index is not None:
+            # 先排除（或标出）像已导出结果的输入，再去重
+            paths, self.seen_report = filter_seen(self._index, paths, self.settings.seen_mode)
+        self.dedup_report = None
+        if self.settings.dedup:
+            if dynamic:
+                # {filename}/{index} 等占位符使相同内容的输出也不同
+                self.dedup_report = DedupReport(total=len(paths), unique=len(paths),
+                                                skipped_reason="水印文本含占位符")
+            else:
+                paths, self.dedup_report = find_duplicates(paths, self.settings.workers)
+        headers = []
+        index_of: Dict[int, int] = {}
+        prefetched = prefetch_headers(paths, self.settings.workers, with_meta=dynamic)
+        for index, header in enumerate(prefetched, 1):
+            if header is None:
+                fail += 1
+            else:
+                headers.append(header)
+                index_of[id(header)] = index
+
+        # 编码在当前线程，落盘交给写线程池，二者并行
+        written: Dict[str, List[Future]] = {}  # 源路径 -> 各输出文件的写入 Future
+        with self._open_writer():
+            for header, target in self._iter_buckets(headers):
+                try:
+                    text = self.expand_text(header, index_of[id(header)]) if dynamic else None
+                    if self._frames_format(header):
+                        written[header.path] = self._export_frames(header, text)
+                    elif self.settings.renditions:
+                        written[header.path] = self._export_renditions(header, text)
+                    else:
+                        written[header.path] = [self._export_one(header, self.prepare_layers(target, text))]
                     ok += 1
+                except Exception:
+                    fail += 1
+        # 写入失败的文件在 flush 之后才知道；任一输出失败即算该图片失败
+        failed = sum(1 for futures in written.values() if any(f.exception() is not None for f in futures))
+        ok, fail = ok - failed, fail + failed
+        if self.dedup_report is not None:
+            dup_ok, dup_fail = self._link_duplicates(written)
+            ok, fail = ok + dup_ok, fail + dup_fail
+        self._close_index()
+        return ok, fail
+
+    def plan(self, sample: int = 2, worker_counts: Sequence[int] = ()) -> "ExportPlan":
+        """试运行：只读文件头并在内存中渲染少量样本，估算耗时、峰值内存和输出大小，不写任何文件"""
+        from .planner import plan_export  # planner 依赖 Exporter，延迟导入避免循环
+        return plan_export(self, sample, worker_counts)
+
+    def _link_duplicates(self, written: Dict[str, List[Future]]) -> Tuple[int, int]:
+        """为重复内容的输入生成输出：从代表图片的输出硬链接或复制"""
+        ok = fail = 0
+        report = self.dedup_report
+        prefer_link = self.settings.dedup_link == "hardlink"
+        out_dir = self.settings.output_dir
+        for canonical, duplicates in report.groups.items():
+            futures = written.get(canonical)
+            if not futures or any(f.exception() is not None for f in futures):
+                fail += len(duplicates)
+                continue
+            # 多帧输入的输出沿用源格式的扩展名，以实际写出的文件为准
+            sources = [os.path.basename(f.result()) for f in futures]
+            for dup in duplicates:
+                try:
+                    for src_name, dst_name in zip(sources, self._output_names(dup)):
+                        dst_name = os.path.splitext(dst_name)[0] + os.path.splitext(src_name)[1]
+                        if src_name == dst_name:
+                            continue  # 同名输出已存在
+                        how = link_or_copy(os.path.join(out_dir, src_name), os.path.join(out_dir, dst_name), prefer_link)
+                        if how == "link":
+                            report.linked += 1
+                        else:
+                            report.copied += 1
+                    ok += 1
+                except OSError:
+                    fail += 1
+        return ok, fail
+
+    def _open_index(self) -> None:
+        self.seen_report = None
+        self._index = None
+        if self.settings.seen_mode != "off":
+            self._index = open_index(self.settings.hash_index)
+            self.seen_report = SeenReport(self.settings.seen_mode)
+
+    def _close_index(self) -> None:
+        if self._index is not None:
+            try:
+                self._index.flush()
+            except OSError:
+                pass  # 索引写不进去不影响导出结果
+            self._index = None
+
+    def _fingerprint(self, img: Image.Image, box: Optional[Box]) -> Optional[Fingerprint]:
+        return fingerprint(img, box) if self._index is not None else None
+
+    def _record(self, future: Future, fp: Optional[Fingerprint]) -> Future:
+        """输出写入成功后记入感知哈希索引（在写线程中完成）"""
+        index, report = self._index, self.seen_report
+        if fp is None or index is None:
+            return future
+
+        def done(f: Future) -> None:
+            if f.exception() is not None:
+                return
+            try:
+                index.add(fp, os.path.abspath(f.result()))
+            except OSError:
+                return
+            if report is not None:
+                report.add_recorded()
+
+        future.add_done_callback(done)
+        return future
+
+    def _open_writer(self) -> OutputWriter:
+        writer = OutputWriter(self.settings.write_mode, self.settings.writer_threads)
+        self._writer = writer
+        self.write_stats = writer.stats
+        return writer
+
+    def _require_single_output(self) -> None:
+        """内存导出与归档导出每张输入只产生一个输出，不支持多规格"""
+        if self.settings.renditions:
+            raise ValueError("多规格输出（renditions）只支持导出到文件夹（export_all）")
+
+    def export_bytes(self, source: Source, name: str = "", index: int = 1) -> RenderResult:
+        """内存导出单张图片：bytes/bytearray/memoryview/文件对象 -> 编码后的字节及元数据
+
+        与 export_all 使用同一渲染路径；name 用于命名规则和 {filename} 占位符。
+        无法识别的数据或设置了多规格时抛出 ValueError。
+        """
+        self._require_single_output()
+        return self._render_bytes(source, name, index)
+
+    def _render_bytes(self, source: Source, name: str = "", index: int = 1) -> RenderResult:
+        """export_bytes 的渲染部分；设置了多规格时只渲染主尺寸（供导出计划抽样）"""
+        stream = as_stream(source)
+        dynamic = self.settings.wm_use_text and has_tokens(self.settings.wm_text)
+        header = read_header(name, with_meta=dynamic, source=stream)
+        if header is None:
+            raise ValueError("无法识别的图像数据")
+        text = self.expand_text(header, index) if dynamic else None
+        if self._frames_format(header):
+            return self._render_frames_result(header, text, stream)
+        target = self.target_size(*display_size(header.width, header.height, header.orientation))
+        return self._render_result(header, self.prepare_layers(target, text), stream)
+
+    def export_many(self, sources: Sequence[Source], names: Optional[Sequence[str]] = None) -> List[Optional[RenderResult]]:
+        """批量内存导出，结果与输入顺序一致，失败项为 None；同尺寸的图片共用叠加层"""
+        self._require_single_output()
+        self.stats = BatchStats()
+        names = list(names) if names is not None else [f"image{i}" for i in range(1, len(sources) + 1)]
+        streams = [as_stream(s) for s in sources]
+        dynamic = self.settings.wm_use_text and has_tokens(self.settings.wm_text)
+        workers = min(self.settings.workers or default_workers(), max(1, len(streams)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            headers = list(pool.map(lambda p: read_header(p[0], dynamic, p[1]), zip(names, streams)))
+
+        results: List[Optional[RenderResult]] = [None] * len(streams)
+        index_of = {id(h): i for i, h in enumerate(headers) if h is not None}
+        for header, target in self._iter_buckets([h for h in headers if h is not None]):
+            i = index_of[id(header)]
+            try:
+                text = self.expand_text(header, i + 1) if dynamic else None
+                results[i] = self._render_result(header, self.prepare_layers(target, text), streams[i])
+            except Exception:
+                results[i] = None
+        return results
+
+    def export_archive(self, sources: Sequence[str], dst_archive: Optional[str] = None) -> Tuple[int, int]:
+        """从 ZIP/TAR（或普通图片文件）流式读取并导出，返回 (成功数, 失败数)
+
+        dst_archive 为 .zip/.tar[.gz] 时输出直接写入该归档，否则写入 output_dir 并保留归档内的目录结构。
+        多个线程并行渲染，主线程按输入顺序把结果交给唯一的写入者；在途成员数有上限，内存占用与归档大小无关。
+        不支持多规格输出，设置了 renditions 时抛出 ValueError。
+        """
+        self._require_single_output()
+        workers = self.settings.workers or default_workers(io_bound=False)
+        local = threading.local()
+        if self.size_report is not None:
+            self.size_report = SizeReport(self.size_report.target)
+        self._open_index()
+
+        def render(member: Member, index: int) -> RenderResult:
+            # 每个线程一个 Exporter，缓存互不共享，无需加锁
+            exporter = getattr(local, "exporter", None)
+            if exporter is None:
+                exporter = local.exporter = self._fork()
+            return exporter.export_bytes(member.data, member.name, index)
+
+        ok = fail = 0
+        writer = ArchiveWriter(dst_archive) if dst_archive else None
+        files = None
+        if writer is None:
+            os.makedirs(self.settings.output_dir, exist_ok=True)
+            files = self._open_writer()
+        pending: deque = deque()
+        archived: List[Tuple[Fingerprint, str]] = []  # 写入归档的输出，归档提交后再记入索引
+
+        def flush_one() -> None:
+            nonlocal ok, fail
+            member, future = pending.popleft()
+            try:
+                result = future.result()
             except Exception:
                 fail += 1
-        return ok, fail
+                return
+            folder = os.path.dirname(member.name)
+            name = f"{folder}/{result.name}" if folder else result.name
+            if writer is not None:
+                writer.add(name, result.data, member.mtime)
+                if result.fingerprint is not None:
+                    archived.append((result.fingerprint, f"{os.path.abspath(dst_archive)}!{name}"))
+            else:
+                out_path = os.path.join(self.settings.output_dir, *safe_member_name(name).split("/"))
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                self._record(files.submit(out_path, result.data), result.fingerprint)
+            ok += 1
 
-    def _apply_text_watermark(self, img: Image.Image) -> Image.Image:
-        if not self.settings.wm_use_text:
-            return img
-        text = (self.settings.wm_text or "").strip()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                members = iter_sources(sources, is_supported_image_path)
+                for index, member in enumerate(members, 1):
+                    pending.append((member, pool.submit(render, member, index)))
+                    if len(pending) >= workers * 2:
+                        flush_one()
+                while pending:
+                    flush_one()
+        except BaseException:
+            if writer is not None:
+                writer.close(commit=False)
+            if files is not None:
+                # 等在途的文件写完（写成功的会记入索引），再把已记录的条目写入索引文件
+                files.close()
+                files = None
+            self._close_index()
+            raise
+        finally:
+            if files is not None:
+                files.close()
+        if writer is not None:
+            writer.close()
+            for fp, path in archived:
+                self._index.add(fp, path)
+                self.seen_report.add_recorded()
+            self._close_index()
+            return ok, fail
+        self._close_index()
+        return ok - files.stats.failed, fail + files.stats.failed
+
+    def _iter_buckets(self, headers: Sequence[ImageHeader]) -> Iterator[Tuple[ImageHeader, Tuple[int, int]]]:
+        """按几何分桶遍历，产出 (文件头, 输出尺寸)；同一桶内的图片共用叠加层与位置，只准备一次"""
+        for key, members in group_by_geometry(headers).items():
+            width, height, _, orientation = key
+            target = self.target_size(*display_size(width, height, orientation))
+            self.stats.add_bucket(key, len(members))
+            for header in members:
+                yield header, target
+
+    def _render_result(self, header: ImageHeader, layers: PreparedLayers, stream: IO[bytes]) -> RenderResult:
+        stream.seek(0)
+        final, meta, box = self.render(header, layers, stream)
+        fmt = self.settings.output_format
+        name = self._build_output_name(header.path or "image")
+        data, fit = self._encode_output(final, meta, name)
+        return RenderResult(
+            data=data,
+            name=name,
+            format=fmt,
+            mime=MIME_TYPES.get(fmt, "application/octet-stream"),
+            size=final.size,
+            source_size=display_size(header.width, header.height, header.orientation),
+            source_format=header.format,
+            metadata=meta,
+            quality=fit.quality if fit else None,
+            encodes=fit.encodes if fit else 1,
+            fingerprint=self._fingerprint(final, box),
+        )
+
+    def _render_frames_result(self, header: ImageHeader, text: Optional[str], stream: IO[bytes]) -> RenderResult:
+        fmt = self._frames_format(header)
+        buf = io.BytesIO()
+        stream.seek(0)
+        with Image.open(stream) as im:
+            meta = passthrough_info(im)
+            compose = self._frame_composer(header, text, self.target_size)
+            write_frames(im, buf, compose, int(self.settings.jpeg_quality or 90), meta)
+        return RenderResult(
+            data=buf.getvalue(),
+            name=self._build_output_name(header.path or "image", fmt=fmt),
+            format=fmt,
+            mime=MIME_TYPES.get(fmt, "application/octet-stream"),
+            size=compose.size,
+            source_size=display_size(header.width, header.height, header.orientation),
+            source_format=header.format,
+            metadata=meta,
+            fingerprint=compose.fingerprint,
+        )
+
+    def expand_text(self, header: ImageHeader, index: int) -> str:
+        """展开水印文本中的占位符（第 index 张）"""
+        return expand_text(self.settings.wm_text, header.path, header.meta, index)
+
+    def _export_one(self, header: ImageHeader, layers: PreparedLayers) -> Future:
+        final, meta, box = self.render(header, layers)
+        out_name = self._build_output_name(header.path)
+        out_path = os.path.join(self.settings.output_dir, out_name)
+        future = self._writer.submit(out_path, self._encode_output(final, meta, out_name)[0])
+        return self._record(future, self._fingerprint(final, box))
+
+    def _export_renditions(self, header: ImageHeader, text: Optional[str]) -> List[Future]:
+        """多规格输出：只解码一次，从大到小逐级缩小，每级叠加该尺寸的水印后按规格编码"""
+        plan = self._rendition_plan(*display_size(header.width, header.height, header.orientation))
+        img, meta = self.decode(header, target=plan[0][1])
+        futures = []
+        for (_, suffix, fmt, quality), size in plan:
+            # 下一级从上一级（未加水印的）缩小，叠加层按尺寸缓存，同尺寸的图片共用
+            img = self._resize(img, size)
+            final, box = self._compose(img, self.prepare_layers(img.size, text))
+            out_name = self._build_output_name(header.path, suffix, fmt)
+            out_path = os.path.join(self.settings.output_dir, out_name)
+            future = self._writer.submit(out_path, self._encode_output(final, meta, out_name, fmt, quality)[0])
+            futures.append(self._record(future, self._fingerprint(final, box)))
+        return futures
+
+    def _frames_format(self, header: ImageHeader) -> str:
+        """多帧输入按帧处理时的输出格式（源容器格式）；单帧或只取第一帧时为空"""
+        if header.frames <= 1 or self.settings.frames_mode == "first":
+            return ""
+        return output_format(header.format)
+
+    def _frame_composer(self, header: ImageHeader, text: Optional[str],
+                        size_for: Callable[[int, int], Tuple[int, int]]) -> "_FrameComposer":
+        return _FrameComposer(self, header.orientation, text, size_for)
+
+    def _export_frames(self, header: ImageHeader, text: Optional[str]) -> List[Future]:
+        """多帧输入：逐帧合成并按源格式编码到临时文件，写线程负责落盘；多规格时每个规格一个输出"""
+        fmt = self._frames_format(header)
+        plan: List[Tuple[str, Optional[int], Callable[[int, int], Tuple[int, int]]]] = [("", None, self.target_size)]
+        if self.settings.renditions:
+            # 各规格的输出格式不适用于多帧输出，只取宽度、后缀和质量
+            plan = []
+            for rendition in self.settings.renditions:
+                _, suffix, _, quality = rendition
+                plan.append((suffix, quality, lambda w, h, r=rendition: self._rendition_size(r, w, h)))
+        futures = []
+        for suffix, quality, size_for in plan:
+            out_path = os.path.join(self.settings.output_dir, self._build_output_name(header.path, suffix, fmt))
+            tmp = self._writer.temp_path(out_path)
+            composer = self._frame_composer(header, text, size_for)
+            try:
+                with Image.open(header.path) as im, open(tmp, "w+b") as f:
+                    write_frames(im, f, composer, int(quality or self.settings.jpeg_quality or 90), passthrough_info(im))
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+            futures.append(self._record(self._writer.submit_file(out_path, tmp), composer.fingerprint))
+        return futures
+
+    def render(self, header: ImageHeader, layers: PreparedLayers,
+                source: Optional[IO[bytes]] = None) -> Tuple[Image.Image, Dict[str, Any], Optional[Box]]:
+        """解码并合成一张图片，返回 (结果图像, 透传元数据, 可见水印的外接矩形)"""
+        img, meta = self.decode(header, source)
+        if img.size != layers.size:
+            # 文件头与实际解码尺寸不符时退回逐张准备
+            layers = self.prepare_layers(img.size, layers.text)
+        final, box = self._compose(img, layers)
+        return final, meta, box
+
+    def decode(self, header: ImageHeader, source: Optional[IO[bytes]] = None,
+                target: Optional[Tuple[int, int]] = None) -> Tuple[Image.Image, Dict[str, Any]]:
+        """解码并缩放到输出尺寸（默认按缩放设置），再在小图上转到显示方向；返回 (图像, 透传元数据)"""
+        orientation = header.orientation
+        target = target or self.target_size(*display_size(header.width, header.height, orientation))
+        # 缩放目标换算回存储方向，方向转换留到缩小之后
+        stored_target = display_size(target[0], target[1], orientation)
+        with Image.open(source if source is not None else header.path) as im:
+            if stored_target[0] < im.width and stored_target[1] < im.height:
+                # JPEG 按 1/2、1/4、1/8 降采样解码，其余格式忽略
+                im.draft(im.mode, stored_target)
+            im.load()
+            meta = passthrough_info(im)
+            img = self._resize(im, stored_target)
+            img = apply_orientation(img, orientation)
+        return img, meta
+
+    def backend(self) -> str:
+        """本批使用的合成后端"""
+        backend = self.settings.composite_backend
+        if self.settings.position_mode == "tile" and backend == "auto":
+            # 整幅图层时 Pillow 的 C 实现更快，auto 不走 numpy
+            backend = "pillow"
+        return resolve_backend(backend)
+
+    def prepare_layers(self, size: Tuple[int, int], text: Optional[str] = None) -> PreparedLayers:
+        """为给定输出尺寸（及展开后的文本）准备叠加层及其位置，结果按键缓存"""
+        if text is None:
+            text = self.settings.wm_text
+        backend = self.backend()
+        # 先叠加图片水印，再叠加文本水印，确保文本可见
+        entries = []
+        if self.settings.wm_use_image:
+            entry = self._layer_entry("image", size, "", backend)
+            if entry is not None:
+                entries.append(entry)
+        text_index = -1
+        if self.settings.wm_use_text:
+            entry = self._layer_entry("text", size, text, backend)
+            if entry is not None:
+                text_index = len(entries)
+                entries.append(entry)
+        adaptive = self.settings.wm_color_mode == "adaptive" and text_index >= 0
+        return PreparedLayers(size=size, entries=entries, backend=backend, text=text,
+                              text_index=text_index if adaptive else -1)
+
+    def _layer_entry(self, layer: str, size: Tuple[int, int], text: str, backend: str,
+                     variant: str = "") -> Optional[Tuple[Union[Image.Image, PreparedOverlay], Optional[Tuple[int, int]]]]:
+        key = (layer, size, text, variant)
+        entry = self._entry_cache.get(key)
+        if entry is not None:
+            return entry
+        if layer == "image":
+            try:
+                overlay = self.logo_overlay(size)
+            except Exception:
+                overlay = None
+            manual = (self.settings.image_manual_enabled, self.settings.image_manual_pos_norm)
+        else:
+            overlay = self.text_overlay(text, variant)
+            manual = (self.settings.text_manual_enabled, self.settings.text_manual_pos_norm)
+        if overlay is None:
+            return None
+        overlay, pos = self._place(size, overlay, (layer, text, variant), *manual)
+        entry = (prepare_overlay(overlay) if backend == "numpy" else overlay, pos)
+        self._entry_cache.put(key, entry)
+        return entry
+
+    def _compose(self, img: Image.Image, layers: PreparedLayers) -> Tuple[Image.Image, Optional[Box]]:
+        """叠加水印，返回 (结果图像, 可见水印的外接矩形，没有时为 None)"""
+        box = None
+        if layers.entries:
+            entries = self.resolve_entries(img, layers)
+            box = layers_box(img.size, entries)
+            img = composite_layers(img, entries, layers.backend)
+        if self.settings.invisible_payload:
+            # 在可见水印之后嵌入，整幅（含可见水印区域）都带有载荷
+            img = embed_invisible(img, self.settings.invisible_payload, self.settings.invisible_key)
+        return img, box
+
+    def resolve_entries(self, img: Image.Image, layers: PreparedLayers):
+        """确定依赖图像内容的部分（自动位置、自适应颜色），返回可直接合成的 [(叠加层, 位置)]"""
+        entries = layers.entries
+        pending = [overlay.size for overlay, pos in entries if pos is None]
+        proxy = luminance_proxy(img) if pending or layers.text_index >= 0 else None
+        if pending:
+            # 自动位置依赖图像内容，逐张计算（只看低分辨率亮度副本）
+            chosen = iter(auto_positions(img, pending, self.margin(*img.size), proxy))
+            entries = [(overlay, pos if pos is not None else next(chosen)) for overlay, pos in entries]
+        if layers.text_index >= 0:
+            entries = list(entries)
+            entries[layers.text_index] = self._adaptive_text_entry(layers, entries[layers.text_index], proxy)
+        return entries
+
+    def _adaptive_text_entry(self, layers: PreparedLayers, entry, proxy):
+        """按目标区域亮度/对比度从缓存的颜色变体中选一个，保持中心位置不变"""
+        overlay, (x, y) = entry
+        ow, oh = overlay.size
+        mean, std = region_stats(proxy[0], proxy[1], (x, y, ow, oh))
+        variant = choose_variant(mean, std, self.settings.wm_color_rgba)
+        picked = self._layer_entry("text", layers.size, layers.text, layers.backend, variant)
+        if picked is None:
+            return entry
+        self.stats.variants[variant] = self.stats.variants.get(variant, 0) + 1
+        new_overlay, new_pos = picked
+        if self.settings.position_mode == "tile":
+            return new_overlay, new_pos
+        nw, nh = new_overlay.size
+        return new_overlay, (x + (ow - nw) // 2, y + (oh - nh) // 2)
+
+    def rotation(self) -> float:
+        """叠加层的旋转角度（度）"""
+        if self.settings.position_mode == "tile":
+            return float(self.settings.tile_angle_deg or 0)
+        return float(self.settings.rotation_deg or 0)
+
+    def text_overlay(self, text: str, variant: str = "") -> Optional[Image.Image]:
+        """渲染并旋转文本水印；按 (展开后的文本, 颜色变体) 缓存，整批只渲染一次"""
+        text = (text or "").strip()
         if not text:
-            return img
+            return None
+        cached = self._text_cache.get((text, variant))
+        if cached is not None:
+            return cached
+        rgba, outline, outline_rgb = self.settings.wm_color_rgba, bool(self.settings.wm_outline), (0, 0, 0)
+        if variant:
+            rgba, variant_outline, outline_rgb = variant_style(variant, rgba)
+            outline = outline or variant_outline
         # render overlay using PIL
         overlay = render_text_overlay(
             text=text,
@@ -134,83 +801,124 @@ class Exporter:
             point_size=int(self.settings.wm_font_size),
             bold=bool(self.settings.wm_bold),
             italic=bool(self.settings.wm_italic),
-            rgba=self.settings.wm_color_rgba,
+            rgba=rgba,
             shadow=bool(self.settings.wm_shadow),
-            outline=bool(self.settings.wm_outline),
+            outline=outline,
+            outline_rgb=outline_rgb,
         )
-        if img.mode != "RGBA":
-            base = img.convert("RGBA")
-        else:
-            base = img.copy()
-
         # rotate
-        rotation = float(self.settings.rotation_deg or 0)
+        rotation = self.rotation()
         if abs(rotation) > 0.01:
             overlay = overlay.rotate(-rotation, resample=Image.BICUBIC, expand=True)
+        self._text_cache.put((text, variant), overlay)
+        self.stats.text_renders += 1
+        return overlay
 
-        bx, by = base.size
-        ox, oy = overlay.size
-        # choose position: use text-specific manual if enabled
-        if self.settings.text_manual_enabled:
-            pos = self._compute_manual_position(bx, by, ox, oy, self.settings.text_manual_pos_norm)
-        else:
-            pos = self._compute_position(bx, by, ox, oy)
-        base.alpha_composite(overlay, dest=pos)
-        return base
-
-    def _apply_image_watermark(self, img: Image.Image) -> Image.Image:
-        if not self.settings.wm_use_image:
-            return img
+    def logo_source(self) -> Optional[Image.Image]:
+        """读取图片水印原图；整批只解码一次"""
+        if self._logo_cache is not None:
+            return self._logo_cache or None
         path = (self.settings.img_wm_path or "").strip()
         if not path or not os.path.isfile(path):
-            return img
+            self._logo_cache = False
+            return None
         try:
             with Image.open(path) as wm:
-                wm = wm.convert("RGBA")
-                # scale
-                mode, percent, w, h = self.settings.img_wm_scale
-                if mode == "percent" and percent:
-                    bx, by = img.size
-                    target_w = max(1, int(bx * (percent / 100.0)))
-                    ratio = target_w / wm.width
-                    target_h = max(1, int(wm.height * ratio))
-                    wm = wm.resize((target_w, target_h), Image.LANCZOS)
-                elif mode == "size" and w and h:
-                    wm = wm.resize((int(w), int(h)), Image.LANCZOS)
-
-                # opacity
-                opacity = max(0, min(100, int(self.settings.img_wm_opacity)))
-                if opacity < 100:
-                    alpha = wm.split()[-1]
-                    alpha = alpha.point(lambda p: p * (opacity / 100.0))
-                    wm.putalpha(alpha)
-
-                # rotate
-                rotation = float(self.settings.rotation_deg or 0)
-                if abs(rotation) > 0.01:
-                    wm = wm.rotate(-rotation, resample=Image.BICUBIC, expand=True)
-
-                # compose by position
-                if img.mode != "RGBA":
-                    base = img.convert("RGBA")
-                else:
-                    base = img.copy()
-                bx, by = base.size
-                wx, wy = wm.size
-                # choose position: use image-specific manual if enabled
-                if self.settings.image_manual_enabled:
-                    pos = self._compute_manual_position(bx, by, wx, wy, self.settings.image_manual_pos_norm)
-                else:
-                    pos = self._compute_position(bx, by, wx, wy)
-                base.alpha_composite(wm, dest=pos)
-                return base
+                self._logo_cache = wm.convert("RGBA")
         except Exception:
-            return img
-        return img
+            self._logo_cache = False
+            return None
+        return self._logo_cache
+
+    def logo_target(self, base_size: Tuple[int, int], logo_size: Tuple[int, int]) -> Tuple[int, int]:
+        """图片水印缩放后的尺寸"""
+        mode, percent, w, h = self.settings.img_wm_scale
+        if mode == "percent" and percent:
+            target_w = max(1, int(base_size[0] * (percent / 100.0)))
+            return target_w, max(1, int(logo_size[1] * (target_w / logo_size[0])))
+        if mode == "size" and w and h:
+            return int(w), int(h)
+        return logo_size
+
+    def seed_overlays(self, text_overlays: Dict[Tuple[str, str], Image.Image],
+                      logo_overlays: Dict[Tuple[int, int], Image.Image], logo: Optional[Image.Image] = None) -> None:
+        """预置已渲染好的叠加层（如模板包中的资源），命中时不再渲染
+
+        text_overlays 的键为 (文本, 颜色变体)，logo_overlays 的键为缩放后尺寸；
+        调用方负责保证它们与当前设置一致。
+        """
+        if logo is not None:
+            self._logo_cache = logo.convert("RGBA")
+        for key, overlay in text_overlays.items():
+            self._text_cache.put(key, overlay)
+        for key, overlay in logo_overlays.items():
+            self._logo_overlays.put(key, overlay)
+
+    def _fork(self) -> "Exporter":
+        """同设置的新实例，带上已渲染的叠加层（只读共享），供其他线程使用"""
+        other = Exporter(self.settings)
+        other._logo_cache = self._logo_cache
+        other.size_report = self.size_report  # 统计各线程共用（内部加锁）
+        other._index, other.seen_report = self._index, self.seen_report
+        for src, dst in ((self._text_cache, other._text_cache), (self._logo_overlays, other._logo_overlays)):
+            for key, value in src.items():
+                dst.put(key, value)
+        return other
+
+    def logo_overlay(self, base_size: Tuple[int, int]) -> Optional[Image.Image]:
+        """按底图尺寸缩放、调整透明度并旋转图片水印；按缩放后尺寸缓存"""
+        wm = self.logo_source()
+        if wm is None:
+            return None
+        # scale
+        target = self.logo_target(base_size, wm.size)
+        cached = self._logo_overlays.get(target)
+        if cached is not None:
+            return cached
+        if target != wm.size:
+            wm = wm.resize(target, Image.LANCZOS)
+
+        # opacity
+        wm = apply_opacity(wm, self.settings.img_wm_opacity)
+
+        # rotate
+        rotation = self.rotation()
+        if abs(rotation) > 0.01:
+            wm = wm.rotate(-rotation, resample=Image.BICUBIC, expand=True)
+        self._logo_overlays.put(target, wm)
+        return wm
+
+    def _place(self, size: Tuple[int, int], overlay: Image.Image, layer: Tuple[str, ...],
+               manual_enabled: bool, manual_norm: Tuple[float, float]) -> Tuple[Image.Image, Optional[Tuple[int, int]]]:
+        """按布局模式确定叠加层及其位置；平铺模式返回缓存的整幅图案"""
+        if self.settings.position_mode == "tile":
+            key = (layer, overlay.size)
+            pattern = self._tile_cache.get(key)
+            if pattern is None:
+                pattern = TilePattern(overlay, self.settings.tile_spacing, self.settings.tile_stagger)
+                self._tile_cache.put(key, pattern)
+            return pattern.layer(size), (0, 0)
+        return overlay, self.position(size, overlay.size, manual_enabled, manual_norm)
+
+    def position(self, size: Tuple[int, int], overlay_size: Tuple[int, int],
+                  manual_enabled: bool, manual_norm: Tuple[float, float]) -> Optional[Tuple[int, int]]:
+        """非平铺模式下叠加层左上角的位置；自动位置返回 None（合成时按图像内容决定）"""
+        bx, by = size
+        ox, oy = overlay_size
+        # choose position: use layer-specific manual if enabled
+        if manual_enabled:
+            return self._compute_manual_position(bx, by, ox, oy, manual_norm)
+        if self.settings.position_mode == "auto":
+            return None
+        return self._compute_position(bx, by, ox, oy)
+
+    def margin(self, bw: int, bh: int) -> int:
+        """叠加层到边缘的距离"""
+        return max(8, int(min(bw, bh) * 0.01))
 
     def _compute_position(self, bw: int, bh: int, ow: int, oh: int) -> Tuple[int, int]:
         mode = self.settings.position_mode
-        margin = max(8, int(min(bw, bh) * 0.01))
+        margin = self.margin(bw, bh)
         if mode == "manual":
             # fallback manual for both when per-layer not enabled
             nx, ny = self.settings.manual_pos_norm
@@ -239,3 +947,37 @@ class Exporter:
         return (x, y)
 
 
+class _FrameComposer:
+    """多帧输入的单帧合成：缩放、转到显示方向并叠加水印
+
+    叠加层按帧尺寸准备一次；自动位置和自适应颜色在该尺寸的第一帧上确定，之后各帧沿用，
+    水印不会在帧间跳动。每帧只在叠加层覆盖的 ROI 上合成。
+    """
+
+    def __init__(self, exporter: Exporter, orientation: int, text: Optional[str],
+                 size_for: Callable[[int, int], Tuple[int, int]]) -> None:
+        self.exporter = exporter
+        self.orientation = orientation
+        self.text = text
+        self.size_for = size_for
+        self.size: Tuple[int, int] = (0, 0)  # 第一帧的输出尺寸
+        self.fingerprint: Optional[Fingerprint] = None  # 第一帧（合成后）的感知哈希指纹，记录索引时才计算
+        self._resolved: Dict[Tuple[int, int], Tuple[list, str]] = {}
+
+    def __call__(self, frame: Image.Image) -> Image.Image:
+        exporter = self.exporter
+        target = self.size_for(*display_size(frame.width, frame.height, self.orientation))
+        img = exporter._resize(frame, display_size(target[0], target[1], self.orientation))
+        img = apply_orientation(img, self.orientation)
+        first = not self.size[0]
+        if first:
+            self.size = img.size
+        resolved = self._resolved.get(img.size)
+        if resolved is None:
+            layers = exporter.prepare_layers(img.size, self.text)
+            entries = exporter.resolve_entries(img, layers) if layers.entries else []
+            resolved = self._resolved[img.size] = (entries, layers.backend)
+        img = composite_roi(img, *resolved)
+        if first:
+            self.fingerprint = exporter._fingerprint(img, layers_box(img.size, resolved[0]))
+        return img
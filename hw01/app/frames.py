@@ -0,0 +1,162 @@
+"""
+多帧图像（GIF/WebP/APNG 动图、多页 TIFF）的逐帧处理。
+
+调用方给出单帧的合成函数（缩放、叠加水印），这里负责逐帧解码和按原格式编码：
+- 多页 TIFF 逐页合成、逐页追加写入输出，内存中同时只有一页
+- GIF 先从抽样帧（已叠加水印）生成一个全局调色板，所有帧映射到同一调色板，
+  不再逐帧各自量化；保留每帧的时长与处置方式、循环次数
+- WebP/APNG 的编码器需要完整的帧序列，合成后的帧缓存在内存中，保留每帧时长与循环次数
+"""
+
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from PIL import Image, TiffImagePlugin
+
+
+# 源格式 -> 输出格式（多帧输入保持原容器格式）
+MULTI_FRAME_FORMATS = {"GIF": "GIF", "WEBP": "WEBP", "PNG": "PNG", "TIFF": "TIFF"}
+PALETTE_SAMPLES = 16  # 生成 GIF 全局调色板时抽样的帧数
+PALETTE_SAMPLE_SIZE = 256  # 抽样帧缩小到的最长边
+TIFF_COMPRESSIONS = {"raw", "tiff_lzw", "tiff_deflate", "tiff_adobe_deflate"}  # 可用于 RGB(A) 页面的压缩方式
+
+FrameComposer = Callable[[Image.Image], Image.Image]
+
+
+@dataclass
+class Frame:
+    image: Image.Image  # 完整的一帧（RGB 或 RGBA，已叠加此前各帧）
+    duration: Optional[int] = None  # 毫秒
+    disposal: Optional[int] = None  # GIF 处置方式
+
+
+def frame_count(im: Image.Image) -> int:
+    """多帧格式的帧数；单帧图像以及 MPO 等其他多帧格式返回 1"""
+    if im.format not in MULTI_FRAME_FORMATS or not getattr(im, "is_animated", False):
+        return 1
+    return int(getattr(im, "n_frames", 1))
+
+
+def output_format(source_format: str) -> str:
+    return MULTI_FRAME_FORMATS.get(source_format, "")
+
+
+def _full_frame(im: Image.Image) -> Image.Image:
+    if im.mode in ("RGB", "RGBA"):
+        return im.copy()
+    has_alpha = "A" in im.getbands() or "transparency" in im.info
+    return im.convert("RGBA" if has_alpha else "RGB")
+
+
+def iter_frames(im: Image.Image, indices: Optional[Sequence[int]] = None) -> Iterator[Frame]:
+    """按顺序解码各帧（或 indices 指定的帧），每次只保留当前帧"""
+    for i in (indices if indices is not None else range(frame_count(im))):
+        im.seek(i)
+        im.load()
+        yield Frame(_full_frame(im), im.info.get("duration"), getattr(im, "disposal_method", None))
+
+
+def shared_palette(samples: Sequence[Image.Image], colors: int = 255) -> Image.Image:
+    """从抽样帧生成全局调色板（P 模式图像），最多 colors 种颜色，其后留一个索引给透明色"""
+    thumbs = []
+    for frame in samples:
+        thumb = frame.convert("RGB")
+        thumb.thumbnail((PALETTE_SAMPLE_SIZE, PALETTE_SAMPLE_SIZE))
+        thumbs.append(thumb)
+    mosaic = Image.new("RGB", (sum(t.width for t in thumbs), max(t.height for t in thumbs)))
+    x = 0
+    for thumb in thumbs:
+        mosaic.paste(thumb, (x, 0))
+        x += thumb.width
+    return mosaic.quantize(colors=colors, method=Image.Quantize.MEDIANCUT)
+
+
+def to_palette(frame: Image.Image, palette: Image.Image, transparent: int) -> Image.Image:
+    """把一帧映射到全局调色板；alpha 低于一半的像素设为透明索引"""
+    # 不做抖动：各帧同一位置的颜色映射一致，静止区域不会闪烁，帧间差异也更小
+    mapped = frame.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE)
+    if frame.mode == "RGBA":
+        mapped.paste(transparent, mask=frame.getchannel("A").point(lambda a: 255 if a < 128 else 0))
+    return mapped
+
+
+def _write_tiff(im: Image.Image, fp: IO[bytes], compose: FrameComposer, meta: Dict[str, Any]) -> int:
+    pages = 0
+    with TiffImagePlugin.AppendingTiffWriter(fp) as tf:
+        for frame in iter_frames(im):
+            compression = im.info.get("compression")
+            params: Dict[str, Any] = {"compression": compression if compression in TIFF_COMPRESSIONS else "tiff_lzw"}
+            dpi = im.info.get("dpi")
+            if dpi:
+                params["dpi"] = tuple(int(round(float(v))) for v in dpi)
+            if pages == 0 and meta.get("icc_profile"):
+                params["icc_profile"] = meta["icc_profile"]
+            compose(frame.image).save(tf, format="TIFF", **params)
+            tf.newFrame()
+            pages += 1
+    return pages
+
+
+def _write_gif(im: Image.Image, fp: IO[bytes], compose: FrameComposer) -> int:
+    n = frame_count(im)
+    step = max(1, n // PALETTE_SAMPLES)
+    palette = shared_palette([compose(f.image) for f in iter_frames(im, range(0, n, step))])
+    colors = len(palette.getpalette() or []) // 3
+    transparent = colors  # 调色板之后的第一个索引
+    frames: List[Image.Image] = []
+    durations: List[int] = []
+    disposals: List[int] = []
+    has_alpha = False
+    for frame in iter_frames(im):
+        composed = compose(frame.image)
+        has_alpha = has_alpha or composed.mode == "RGBA"
+        frames.append(to_palette(composed, palette, transparent))
+        durations.append(int(frame.duration or 0))
+        disposals.append(int(frame.disposal or 0))
+    # 显式传入调色板时 Pillow 只写全局颜色表，不再为每帧写局部颜色表
+    params: Dict[str, Any] = {
+        "save_all": True,
+        "append_images": frames[1:],
+        "palette": (palette.getpalette() or []) + [0, 0, 0],
+        "optimize": False,
+        "duration": durations,
+        "disposal": disposals,
+    }
+    if has_alpha:
+        params["transparency"] = transparent
+    if "loop" in im.info:
+        params["loop"] = im.info["loop"]
+    frames[0].save(fp, format="GIF", **params)
+    return len(frames)
+
+
+def _write_sequence(im: Image.Image, fp: IO[bytes], compose: FrameComposer, fmt: str,
+                    quality: int, meta: Dict[str, Any]) -> int:
+    frames: List[Image.Image] = []
+    durations: List[int] = []
+    for frame in iter_frames(im):
+        frames.append(compose(frame.image))
+        durations.append(int(frame.duration or 0))
+    params: Dict[str, Any] = {"save_all": True, "append_images": frames[1:], "duration": durations,
+                              "loop": im.info.get("loop", 0)}
+    if fmt == "WEBP":
+        params["quality"] = quality
+        params.update({k: v for k, v in meta.items() if k in ("exif", "icc_profile")})
+    else:
+        params.update(meta)
+    frames[0].save(fp, format=fmt, **params)
+    return len(frames)
+
+
+def write_frames(im: Image.Image, fp: IO[bytes], compose: FrameComposer, quality: int = 90,
+                 meta: Optional[Dict[str, Any]] = None) -> int:
+    """逐帧合成已打开的多帧图像 im，按原格式编码写入 fp（TIFF 需要可读写、可 seek 的 fp），返回帧数"""
+    fmt = output_format(im.format)
+    if not fmt:
+        raise ValueError(f"不支持的多帧格式：{im.format}")
+    meta = meta or {}
+    if fmt == "TIFF":
+        return _write_tiff(im, fp, compose, meta)
+    if fmt == "GIF":
+        return _write_gif(im, fp, compose)
+    return _write_sequence(im, fp, compose, fmt, quality, meta)
@@ -0,0 +1,90 @@
+"""
+EXIF 方向与元数据透传。
+
+方向只在缩小后的缓冲区上处理；EXIF/ICC 以原始字节透传，
+仅就地把 IFD0 中的 Orientation 改为 1，不重新解析整个 EXIF。
+"""
+
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+from .probe import ORIENTATION_TAG
+
+
+# 与 ImageOps.exif_transpose 相同的映射
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+EXIF_HEADER = b"Exif\x00\x00"
+
+# 这些模式的 ICC 描述的不是 RGB 色彩空间，输出转换后不再适用
+_NON_RGB_MODES = {"1", "L", "LA", "I", "I;16", "F", "CMYK", "YCbCr", "LAB", "HSV"}
+
+
+def swaps_axes(orientation: int) -> bool:
+    """方向 5-8 需要交换宽高"""
+    return orientation in (5, 6, 7, 8)
+
+
+def display_size(width: int, height: int, orientation: int) -> Tuple[int, int]:
+    """按 EXIF 方向换算显示尺寸"""
+    return (height, width) if swaps_axes(orientation) else (width, height)
+
+
+def apply_orientation(img: Image.Image, orientation: int) -> Image.Image:
+    """把图像转到显示方向（应在缩小之后调用）"""
+    method = ORIENTATION_TRANSPOSE.get(orientation)
+    return img.transpose(method) if method is not None else img
+
+
+def reset_exif_orientation(exif: bytes) -> bytes:
+    """把原始 EXIF 字节中 IFD0 的 Orientation 改为 1，其余字节原样保留"""
+    start = len(EXIF_HEADER) if exif.startswith(EXIF_HEADER) else 0
+    tiff = memoryview(exif)[start:]
+    if len(tiff) < 8:
+        return exif
+    order = bytes(tiff[:2])
+    if order == b"II":
+        endian = "<"
+    elif order == b"MM":
+        endian = ">"
+    else:
+        return exif
+    (ifd_offset,) = struct.unpack_from(endian + "I", tiff, 4)
+    if ifd_offset + 2 > len(tiff):
+        return exif
+    (count,) = struct.unpack_from(endian + "H", tiff, ifd_offset)
+    for i in range(count):
+        entry = ifd_offset + 2 + i * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, typ = struct.unpack_from(endian + "HH", tiff, entry)
+        if tag == ORIENTATION_TAG and typ == 3:  # SHORT
+            patched = bytearray(exif)
+            struct.pack_into(endian + "H", patched, start + entry + 8, 1)
+            return bytes(patched)
+    return exif
+
+
+def passthrough_info(im: Image.Image) -> Dict[str, Any]:
+    """收集需要原样写回输出的元数据（原始字节，不解析）"""
+    info: Dict[str, Any] = {}
+    exif: Optional[bytes] = im.info.get("exif")
+    if isinstance(exif, bytes) and exif:
+        info["exif"] = reset_exif_orientation(exif)
+    icc = im.info.get("icc_profile")
+    if icc and im.mode not in _NON_RGB_MODES:
+        info["icc_profile"] = icc
+    dpi = im.info.get("dpi")
+    if dpi:
+        info["dpi"] = tuple(int(round(float(v))) for v in dpi)
+    return info
@@ -0,0 +1,414 @@
+"""
+感知哈希索引：记录每个导出结果的 dHash，导入新图片时检查它是否像某个已导出（已加水印）的结果。
+
+- 指纹：整幅图的 64 位 dHash（缩小到 9x8 的灰度图，比较相邻像素），另加可见水印所在区域的哈希及其归一化位置。
+  小水印几乎不改变整幅图的 dHash，原图与输出的整幅哈希往往相同；区域哈希用来区分二者：
+  整幅哈希相近、且同一位置的区域哈希也相近，才判定为已加水印。区域哈希比较 64 个格子与右邻、下邻的明暗（128 位）：细的半透明文字几乎不改变水平相邻格子的差别，
+  但文字与上下边距之间的差别明显
+- 索引：多索引哈希（multi-index hashing）。64 位分成 3 段，每段按段值建索引；
+  汉明距离不超过 r 的两个哈希至少有一段的距离不超过 r // 3，只需在各段探测少量邻近的段值，
+  候选再用完整距离校验，几百万条目时单次查询仍在毫秒级
+- 存储：追加写的文本文件（每行：哈希、区域哈希、区域，均为定长十六进制，再加输出路径，制表符分隔），
+  多个进程可同时追加；路径不常驻内存，匹配到时按偏移读回。同一路径的文件在进程内只加载一次（open_index），
+  且在第一次查询时才加载：只记录输出时不读文件
+"""
+
+import bisect
+import itertools
+import math
+import os
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from .metadata import apply_orientation
+from .probe import ORIENTATION_TAG, default_workers
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时加载大索引较慢
+    np = None
+
+INDEX_PATH = os.path.join(os.path.expanduser("~"), ".watermark_tool", "outputs.phash")
+SEEN_MODES = ("off", "record", "flag", "skip")  # 关闭 / 只记录输出 / 记录并标出疑似已加水印的输入 / 记录并跳过
+CHUNK_WIDTHS = (22, 21, 21)  # 多索引哈希的分段（位数）：几百万条目时每个段值平均只有约一个条目
+DEFAULT_THRESHOLD = 8  # 整幅哈希的汉明距离上限（重新压缩、缩放通常在 0~6 之间）
+MARK_THRESHOLD = 20  # 水印区域哈希（128 位）的距离上限：重新压缩、缩放通常在 12 以内，原图与输出通常相差 28 以上
+MAX_MARK_AREA = 0.5  # 水印区域超过画面一半（如平铺）时不单独记录区域，只比较整幅哈希
+CHECK_SIZE = 1024  # 检查输入时按此尺寸降采样解码（JPEG 的 draft），足够算区域哈希
+BOX_SCALE = 65535  # 归一化区域坐标的存储精度（每个坐标 16 位，四个打包成 64 位）
+LINE_PREFIX = 67  # 索引文件每行的定长前缀："哈希\t区域哈希\t区域\t"，分别为 16、32、16 位十六进制
+FLUSH_EVERY = 256  # 缓冲的条目数达到此值时追加写入文件
+GRIDS = ((4, 16), (8, 8), (16, 4), (32, 2), (64, 1))  # 区域哈希按区域宽高比选网格，每种 64 格、128 位
+
+Box = Tuple[int, int, int, int]
+
+_LOW64 = (1 << 64) - 1
+
+
+@dataclass
+class Fingerprint:
+    hash: int  # 整幅 dHash
+    mark: int = 0  # 水印区域的 128 位梯度哈希
+    box: Optional[Tuple[float, float, float, float]] = None  # 水印区域（含边距），按宽高归一化；None 表示只比较整幅
+
+
+@dataclass
+class Match:
+    path: str  # 相似的已导出文件
+    distance: int  # 整幅哈希的汉明距离
+    mark_distance: int = -1  # 区域哈希的距离，-1 表示该条目没有区域
+
+
+def _popcount(value: int) -> int:
+    return bin(value).count("1")  # int.bit_count 需要 Python 3.10
+
+
+def _small_gray(img: Image.Image, size: Tuple[int, int], box: Optional[Tuple[float, float, float, float]] = None) -> bytes:
+    """img（或其中 box 区域，像素坐标）缩小到 size 的灰度像素：先缩小再转灰度，不做整幅的模式转换"""
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    return img.resize(size, Image.BILINEAR, box=box, reducing_gap=2.0).convert("L").tobytes()
+
+
+def dhash(img: Image.Image) -> int:
+    """整幅图的 64 位 dHash：缩小到 9x8，每行相邻像素比较"""
+    px = _small_gray(img, (9, 8))
+    value = 0
+    for r in range(8):
+        for c in range(8):
+            value = (value << 1) | (px[r * 9 + c] > px[r * 9 + c + 1])
+    return value
+
+
+def mark_hash(img: Image.Image, box: Tuple[float, float, float, float]) -> int:
+    """box 区域（像素坐标）的 128 位梯度哈希：64 个格子，每格与右邻、下邻各比较一次"""
+    x0, y0, x1, y1 = box
+    ratio = max(x1 - x0, 1e-6) / max(y1 - y0, 1e-6)
+    cols, rows = min(GRIDS, key=lambda g: abs(math.log(g[0] / g[1] / ratio)))
+    px = _small_gray(img, (cols + 1, rows + 1), box)
+    value = 0
+    for r in range(rows):
+        for c in range(cols):
+            i = r * (cols + 1) + c
+            value = (value << 2) | (px[i] > px[i + 1]) << 1 | (px[i] > px[i + cols + 1])
+    return value
+
+
+def fingerprint(img: Image.Image, mark_box: Optional[Box] = None) -> Fingerprint:
+    """输出图像的指纹；mark_box 为可见水印的外接矩形（像素），None 表示没有可见水印"""
+    fp = Fingerprint(dhash(img))
+    if mark_box is None:
+        return fp
+    w, h = img.size
+    x0, y0, x1, y1 = mark_box
+    # 四周留出四分之一短边的边距：水印与周围的明暗差别是区域哈希的主要信号，
+    # 边距再大则原图内容占比过高，冲淡水印的影响
+    pad = max(1, min(x1 - x0, y1 - y0) // 4)
+    x0, y0, x1, y1 = max(0, x0 - pad), max(0, y0 - pad), min(w, x1 + pad), min(h, y1 + pad)
+    if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) > MAX_MARK_AREA * w * h:
+        return fp
+    fp.box = (x0 / w, y0 / h, x1 / w, y1 / h)
+    fp.mark = mark_hash(img, (x0, y0, x1, y1))
+    return fp
+
+
+def _probe_masks(width: int, radius: int) -> List[int]:
+    """width 位的一段内距离不超过 radius 的全部异或掩码"""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in itertools.combinations(range(width), r):
+            masks.append(sum(1 << b for b in bits))
+    return masks
+
+
+def _sorted_keys(hashes: array, shift: int, width: int) -> array:
+    """某一段的有序键 (段值 << 32 | 条目编号)；有 numpy 时用它排序（快一个数量级）"""
+    mask = (1 << width) - 1
+    if np is None:
+        return array("Q", sorted(((value >> shift) & mask) << 32 | n for n, value in enumerate(hashes)))
+    values = np.frombuffer(hashes, dtype=np.uint64) if len(hashes) else np.zeros(0, dtype=np.uint64)
+    keys = ((values >> np.uint64(shift)) & np.uint64(mask)) << np.uint64(32) | np.arange(len(values), dtype=np.uint64)
+    keys.sort()
+    return array("Q", keys.tobytes())
+
+
+def _pack_box(box: Optional[Tuple[float, float, float, float]]) -> int:
+    if box is None:
+        return 0
+    value = 0
+    for v in box:
+        value = (value << 16) | min(BOX_SCALE, max(0, round(v * BOX_SCALE)))
+    return value
+
+
+def _unpack_box(value: int) -> Optional[Tuple[float, float, float, float]]:
+    if not value:
+        return None
+    return tuple(((value >> shift) & 0xFFFF) / BOX_SCALE for shift in (48, 32, 16, 0))
+
+
+class HashIndex:
+    """已导出文件的感知哈希索引（多索引哈希），线程安全
+
+    每段按 (段值 << 32 | 条目编号) 存成有序的 array，用二分查找探测；加载之后新增的条目放在字典里。
+    路径不常驻内存：记录条目在文件中的偏移，匹配到时才读回。
+    """
+
+    def __init__(self, path: str = INDEX_PATH) -> None:
+        self.path = path
+        self._hashes = array("Q")
+        self._marks = array("Q")  # 每个条目两项：区域哈希的高、低 64 位
+        self._boxes = array("Q")  # 打包的归一化区域，0 表示没有区域
+        self._offsets = array("q")  # 条目在文件中的偏移，-1 表示尚未写入
+        self._sorted: List[array] = [array("Q") for _ in CHUNK_WIDTHS]
+        self._recent: List[Dict[int, List[int]]] = [{} for _ in CHUNK_WIDTHS]
+        self._unsaved: Dict[int, str] = {}  # 尚未写入文件的条目编号 -> 路径
+        self._masks: Dict[int, List[List[int]]] = {}
+        self._pending: List[list] = []  # [指纹, 路径, 条目编号（未加载时为 -1）]
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return len(self._hashes)
+
+    @staticmethod
+    def _chunk_keys(value: int) -> List[int]:
+        keys, shift = [], 0
+        for width in CHUNK_WIDTHS:
+            keys.append((value >> shift) & ((1 << width) - 1))
+            shift += width
+        return keys
+
+    def _load(self) -> None:
+        """读入索引文件及缓冲中尚未写入的条目（调用方持有锁）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        offset = 0
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    start, offset = offset, offset + len(line)
+                    if len(line) <= LINE_PREFIX or not line.endswith(b"\n"):
+                        continue  # 其他进程正在写入的半行
+                    try:
+                        value, mark, box = int(line[0:16], 16), int(line[17:49], 16), int(line[50:66], 16)
+                    except ValueError:
+                        continue
+                    self._hashes.append(value)
+                    self._marks.extend((mark >> 64, mark & _LOW64))
+                    self._boxes.append(box)
+                    self._offsets.append(start)
+        except FileNotFoundError:
+            pass
+        shift = 0
+        for i, width in enumerate(CHUNK_WIDTHS):
+            self._sorted[i] = _sorted_keys(self._hashes, shift, width)
+            shift += width
+        for entry in self._pending:
+            entry[2] = self._insert(entry[0], entry[1])
+
+    def _insert(self, fp: Fingerprint, path: str) -> int:
+        n = len(self._hashes)
+        self._hashes.append(fp.hash)
+        self._marks.extend((fp.mark >> 64, fp.mark & _LOW64))
+        self._boxes.append(_pack_box(fp.box))
+        self._offsets.append(-1)
+        self._unsaved[n] = path
+        for recent, key in zip(self._recent, self._chunk_keys(fp.hash)):
+            recent.setdefault(key, []).append(n)
+        return n
+
+    def _path(self, n: int) -> str:
+        """条目的路径：未写入的在内存中，其余从文件偏移处读回（调用方持有锁）"""
+        if self._offsets[n] < 0:
+            return self._unsaved[n]
+        with open(self.path, "rb") as f:
+            f.seek(self._offsets[n])
+            return f.readline()[LINE_PREFIX:].rstrip(b"\n").decode("utf-8", "replace")
+
+    def add(self, fp: Fingerprint, path: str) -> None:
+        """记录一个输出；缓冲一批后追加写入索引文件（另见 flush）"""
+        path = path.replace("\n", " ")
+        with self._lock:
+            n = self._insert(fp, path) if self._loaded else -1
+            self._pending.append([fp, path, n])
+            if len(self._pending) < FLUSH_EVERY:
+                return
+        self.flush()
+
+    def flush(self) -> None:
+        """把缓冲的条目追加写入文件（一次写入，多个进程同时追加时行不会交错）"""
+        with self._lock:
+            if not self._pending:
+                return
+            lines = [f"{fp.hash:016x}\t{fp.mark:032x}\t{_pack_box(fp.box):016x}\t{path}\n".encode("utf-8")
+                     for fp, path, _ in self._pending]
+            data = b"".join(lines)
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                offset = os.lseek(fd, 0, os.SEEK_CUR) - len(data)
+            finally:
+                os.close(fd)
+            for (_, _, n), line in zip(self._pending, lines):
+                if n >= 0:
+                    self._offsets[n] = offset
+                    self._unsaved.pop(n, None)
+                offset += len(line)
+            self._pending = []
+
+    def near(self, value: int, threshold: int = DEFAULT_THRESHOLD) -> List[Tuple[int, int]]:
+        """整幅哈希与 value 的距离不超过 threshold 的条目，返回 [(条目编号, 距离)]"""
+        radius = threshold // len(CHUNK_WIDTHS)
+        masks = self._masks.get(radius)
+        if masks is None:
+            masks = self._masks[radius] = [_probe_masks(width, radius) for width in CHUNK_WIDTHS]
+        found: Dict[int, int] = {}
+        with self._lock:
+            self._load()
+            for i, key in enumerate(self._chunk_keys(value)):
+                keys, recent = self._sorted[i], self._recent[i]
+                for mask in masks[i]:
+                    probe = key ^ mask
+                    candidates = recent.get(probe, [])
+                    pos = bisect.bisect_left(keys, probe << 32)
+                    if pos < len(keys) and keys[pos] >> 32 == probe:
+                        candidates = list(candidates)
+                        while pos < len(keys) and keys[pos] >> 32 == probe:
+                            candidates.append(keys[pos] & 0xFFFFFFFF)
+                            pos += 1
+                    for n in candidates:
+                        if n not in found:
+                            found[n] = _popcount(value ^ self._hashes[n])
+        return [(n, d) for n, d in found.items() if d <= threshold]
+
+    def match(self, img: Image.Image, threshold: int = DEFAULT_THRESHOLD,
+              mark_threshold: int = MARK_THRESHOLD) -> Optional[Match]:
+        """img（显示方向）是否像某个已导出的文件；返回最相似的一个，否则 None"""
+        best: Optional[Tuple[int, Match]] = None
+        marks: Dict[int, int] = {}  # 同一区域只算一次
+        for n, distance in sorted(self.near(dhash(img), threshold), key=lambda item: item[1]):
+            if best is not None and distance > best[1].distance:
+                break
+            box = _unpack_box(self._boxes[n])
+            if box is None:
+                match = Match("", distance)
+            else:
+                if self._boxes[n] not in marks:
+                    w, h = img.size
+                    x0, y0, x1, y1 = box
+                    marks[self._boxes[n]] = mark_hash(img, (x0 * w, y0 * h, max(x1 * w, x0 * w + 1), max(y1 * h, y0 * h + 1)))
+                mark_distance = _popcount(marks[self._boxes[n]] ^ (self._marks[2 * n] << 64 | self._marks[2 * n + 1]))
+                if mark_distance > mark_threshold:
+                    continue  # 整体相同但水印位置的内容不同：多半是原图
+                match = Match("", distance, mark_distance)
+            # 距离相同时优先经过区域校验的条目
+            if best is None or (match.distance, match.mark_distance < 0) < (best[1].distance, best[1].mark_distance < 0):
+                best = (n, match)
+        if best is None:
+            return None
+        with self._lock:
+            best[1].path = self._path(best[0])
+        return best[1]
+
+
+_indexes: Dict[str, HashIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def open_index(path: str = "") -> HashIndex:
+    """按路径共享的索引实例（"" 为默认位置），首次使用时加载"""
+    path = os.path.abspath(path or INDEX_PATH)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = HashIndex(path)
+        return index
+
+
+def load_for_check(path: str) -> Image.Image:
+    """按检查尺寸降采样解码并转到显示方向"""
+    with Image.open(path) as im:
+        try:
+            orientation = int(im.getexif().get(ORIENTATION_TAG, 1) or 1)
+        except Exception:
+            orientation = 1
+        im.draft("RGB", (CHECK_SIZE, CHECK_SIZE))
+        im.load()
+        return apply_orientation(im.copy() if im.mode in ("RGB", "RGBA", "L", "LA") else im.convert("RGB"),
+                                 orientation)
+
+
+def check_file(index: HashIndex, path: str, threshold: int = DEFAULT_THRESHOLD) -> Optional[Match]:
+    return index.match(load_for_check(path), threshold)
+
+
+def check_files(index: HashIndex, paths: Iterable[str], workers: int = 0,
+                threshold: int = DEFAULT_THRESHOLD) -> Iterator[Tuple[str, Optional[Match]]]:
+    """并行检查多个文件，按输入顺序产出 (路径, 匹配)；读不了的文件视为不匹配，在途文件数有上限"""
+    workers = workers or default_workers(io_bound=False)
+    pending: deque = deque()
+
+    def pop() -> Tuple[str, Optional[Match]]:
+        path, future = pending.popleft()
+        try:
+            return path, future.result()
+        except Exception:
+            return path, None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path in paths:
+            pending.append((path, pool.submit(check_file, index, path, threshold)))
+            if len(pending) >= workers * 2:
+                yield pop()
+        while pending:
+            yield pop()
+
+
+@dataclass
+class SeenReport:
+    """一次导出中感知哈希检查与记录的统计；记录由写线程完成，内部加锁"""
+    mode: str
+    checked: int = 0
+    matches: List[Tuple[str, Match]] = field(default_factory=list)  # (输入, 相似的已导出文件)
+    skipped: int = 0
+    recorded: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add_recorded(self) -> None:
+        with self._lock:
+            self.recorded += 1
+
+    def summary(self) -> str:
+        text = f"已加水印检查：检查 {self.checked} 张，{len(self.matches)} 张疑似已加过水印"
+        if self.skipped:
+            text += f"（已跳过 {self.skipped} 张）"
+        return text + f"；记录 {self.recorded} 个输出"
+
+
+def filter_seen(index: HashIndex, paths: Sequence[str], mode: str,
+                workers: int = 0) -> Tuple[List[str], SeenReport]:
+    """按模式检查输入：skip 时去掉疑似已加水印的输入，flag 时只记入报告；返回 (保留的输入, 报告)"""
+    report = SeenReport(mode)
+    if mode not in ("flag", "skip"):
+        return list(paths), report
+    kept = []
+    for path, match in check_files(index, paths, workers):
+        report.checked += 1
+        if match is not None:
+            report.matches.append((path, match))
+            if mode == "skip":
+                report.skipped += 1
+                continue
+        kept.append(path)
+    return kept, report
@@ -0,0 +1,130 @@
+"""
+内容感知的自动水印位置。
+
+在低分辨率亮度副本上，用积分图（亮度和、平方和、梯度和）在 O(1) 时间内
+给每个候选位置打分，选择细节最少的区域。低分辨率副本通过最近邻采样
++ 盒式缩小得到，只读取极少量像素，50MP 大图也只需几毫秒。
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageStat
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时只评估九宫格锚点
+    np = None
+
+
+PROXY_SIDE = 256  # 亮度副本长边
+_OVERSAMPLE = 4  # 最近邻采样倍数，随后盒式缩小以抑制噪声
+
+Rect = Tuple[int, int, int, int]  # (x, y, w, h)，原图坐标
+
+
+def luminance_proxy(img: Image.Image, max_side: int = PROXY_SIDE) -> Tuple[Image.Image, float]:
+    """生成长边不超过 max_side 的亮度副本，返回 (副本, 缩放比例 原图/副本)"""
+    w, h = img.size
+    scale = max(1.0, max(w, h) / float(max_side))
+    pw, ph = max(1, int(round(w / scale))), max(1, int(round(h / scale)))
+    if scale > 1.0:
+        sample = (min(w, pw * _OVERSAMPLE), min(h, ph * _OVERSAMPLE))
+        small = img.resize(sample, Image.NEAREST) if sample != (w, h) else img
+        small = small.convert("L").resize((pw, ph), Image.BOX)
+    else:
+        small = img.convert("L")
+    return small, w / float(small.width)
+
+
+def preset_anchors(bw: int, bh: int, ow: int, oh: int, margin: int) -> List[Tuple[int, int]]:
+    """九宫格锚点，顺序即同分时的偏好（右下优先）"""
+    xs = {"left": margin, "center": (bw - ow) // 2, "right": bw - ow - margin}
+    ys = {"top": margin, "center": (bh - oh) // 2, "bottom": bh - oh - margin}
+    order = [("right", "bottom"), ("left", "bottom"), ("center", "bottom"),
+             ("right", "top"), ("left", "top"), ("center", "top"),
+             ("right", "center"), ("left", "center"), ("center", "center")]
+    return [(max(0, xs[x]), max(0, ys[y])) for x, y in order]
+
+
+def _overlap(a: Rect, b: Rect) -> bool:
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+class _IntegralScorer:
+    """亮度积分图：任意矩形的标准差与平均梯度均为 O(1)，可批量向量化计算"""
+
+    def __init__(self, proxy: Image.Image) -> None:
+        lum = np.asarray(proxy, dtype=np.float64)
+        grad = np.zeros_like(lum)
+        grad[:, 1:] += np.abs(np.diff(lum, axis=1))
+        grad[1:, :] += np.abs(np.diff(lum, axis=0))
+        self.sums = [self._integral(a) for a in (lum, lum * lum, grad)]
+
+    @staticmethod
+    def _integral(a):
+        out = np.zeros((a.shape[0] + 1, a.shape[1] + 1), dtype=np.float64)
+        out[1:, 1:] = a.cumsum(0).cumsum(1)
+        return out
+
+    def scores(self, x0, y0, x1, y1):
+        n = np.maximum(1, (x1 - x0) * (y1 - y0)).astype(np.float64)
+        s, sq, g = (t[y1, x1] - t[y0, x1] - t[y1, x0] + t[y0, x0] for t in self.sums)
+        mean = s / n
+        std = np.sqrt(np.maximum(0.0, sq / n - mean * mean))
+        return std + g / n
+
+
+def _candidates(bw: int, bh: int, ow: int, oh: int, margin: int, dense: bool) -> List[Tuple[int, int]]:
+    candidates = preset_anchors(bw, bh, ow, oh, margin)
+    if dense:
+        # 在九宫格之外再加一层均匀网格候选，步长为叠加层的一半
+        step_x, step_y = max(1, ow // 2), max(1, oh // 2)
+        for y in range(margin, max(margin, bh - oh - margin) + 1, step_y):
+            for x in range(margin, max(margin, bw - ow - margin) + 1, step_x):
+                candidates.append((x, y))
+    return candidates
+
+
+def auto_positions(img: Image.Image, sizes: Sequence[Tuple[int, int]], margin: int,
+                   proxy: Optional[Tuple[Image.Image, float]] = None) -> List[Tuple[int, int]]:
+    """为多个叠加层依次选择最安静且互不重叠的位置（原图坐标）"""
+    bw, bh = img.size
+    small, scale = proxy or luminance_proxy(img)
+    scorer = _IntegralScorer(small) if np is not None else None
+    taken: List[Rect] = []
+    result: List[Tuple[int, int]] = []
+    for ow, oh in sizes:
+        candidates = _candidates(bw, bh, ow, oh, margin, dense=scorer is not None)
+        if scorer is not None:
+            pos = np.asarray(candidates, dtype=np.int64)
+            x0 = np.clip(pos[:, 0] / scale, 0, small.width - 1).astype(np.int64)
+            y0 = np.clip(pos[:, 1] / scale, 0, small.height - 1).astype(np.int64)
+            x1 = np.clip(np.rint((pos[:, 0] + ow) / scale), x0 + 1, small.width).astype(np.int64)
+            y1 = np.clip(np.rint((pos[:, 1] + oh) / scale), y0 + 1, small.height).astype(np.int64)
+            scores = scorer.scores(x0, y0, x1, y1)
+            for tx, ty, tw, th in taken:
+                hit = ((pos[:, 0] < tx + tw) & (tx < pos[:, 0] + ow)
+                       & (pos[:, 1] < ty + th) & (ty < pos[:, 1] + oh))
+                scores[hit] = np.inf
+            # 近似同分时取靠前的（九宫格）候选，避免位置来回跳动
+            index = int(np.flatnonzero(scores <= scores.min() + 0.5)[0])
+            best = candidates[index]
+        else:
+            best, best_score = candidates[0], None
+            for x, y in candidates:
+                if any(_overlap((x, y, ow, oh), t) for t in taken):
+                    continue
+                box = (int(x / scale), int(y / scale),
+                       max(int(x / scale) + 1, min(small.width, int(round((x + ow) / scale)))),
+                       max(int(y / scale) + 1, min(small.height, int(round((y + oh) / scale)))))
+                score = ImageStat.Stat(small.crop(box)).stddev[0]
+                if best_score is None or score < best_score - 0.5:
+                    best, best_score = (x, y), score
+        taken.append((best[0], best[1], ow, oh))
+        result.append(best)
+    return result
+
+
+def auto_position(img: Image.Image, overlay_size: Tuple[int, int], margin: int) -> Tuple[int, int]:
+    """为单个叠加层选择细节最少的位置"""
+    return auto_positions(img, [overlay_size], margin)[0]
@@ -0,0 +1,247 @@
+"""
+导出计划（试运行）：只读文件头和少量样本，估算耗时、峰值内存与输出大小，不写任何文件。
+
+1. 并行读取全部文件头；打不开、格式不支持或明显被截断（JPEG 缺结束标记、PNG 缺 IEND、GIF 缺结尾）的文件列为无效
+2. 每种输入格式按像素数均匀抽取几张样本，在内存中走与导出相同的渲染与编码路径，
+   得到该格式的吞吐系数：每百万源像素的耗时、每百万输出像素的输出字节数
+3. 按系数推算全部文件的单进程耗时、不同并行进程数下的墙钟时间与峰值内存、输出总字节数，
+   并与输出目录所在磁盘的剩余空间比较
+"""
+
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from .metadata import display_size
+from .probe import ImageHeader, default_workers, read_header
+
+if TYPE_CHECKING:
+    from .exporter import Exporter
+
+
+PROCESS_BASE_BYTES = 80 * 1024 * 1024  # 每个进程的基础占用（Python + Pillow，经验值）
+TAIL_BYTES = 64  # 检查文件结尾标记时读取的字节数
+# 格式 -> 文件结尾应包含的标记（只看最后 TAIL_BYTES 字节，容忍结尾的填充）
+END_MARKERS = {"JPEG": b"\xff\xd9", "PNG": b"IEND", "GIF": b"\x3b"}
+
+
+@dataclass
+class FormatCoefficients:
+    """某种输入格式在当前设置下的吞吐系数（来自抽样）"""
+    samples: int
+    seconds_per_mp: float  # 每百万源像素（含全部帧）的读取 + 解码 + 合成 + 编码耗时
+    bytes_per_mp: float  # 每百万输出像素的输出字节数
+
+
+@dataclass
+class ExportPlan:
+    total: int = 0
+    valid: int = 0
+    invalid: List[Tuple[str, str]] = field(default_factory=list)  # (路径, 原因)
+    formats: Dict[str, int] = field(default_factory=dict)  # 输入格式 -> 有效文件数
+    outputs: int = 0  # 输出文件数（多规格时每个规格一个）
+    source_mp: float = 0.0
+    output_mp: float = 0.0
+    coefficients: Dict[str, FormatCoefficients] = field(default_factory=dict)
+    cpu_seconds: float = 0.0  # 单进程预计耗时
+    wall_seconds: Dict[int, float] = field(default_factory=dict)  # 并行进程数 -> 预计墙钟时间
+    peak_memory: Dict[int, int] = field(default_factory=dict)  # 并行进程数 -> 预计峰值内存（字节）
+    output_bytes: int = 0
+    disk_free: Optional[int] = None  # 输出目录所在磁盘的剩余空间
+    sample_seconds: float = 0.0  # 抽样本身的耗时
+
+    @property
+    def fits(self) -> bool:
+        return self.disk_free is None or self.output_bytes <= self.disk_free
+
+    def summary(self) -> str:
+        lines = ["导出计划（试运行，未写入任何文件）",
+                 f"  输入 {self.total} 个文件：有效 {self.valid} 个，无效 {len(self.invalid)} 个"]
+        if self.formats:
+            lines.append("  格式：" + "，".join(f"{fmt or '未知'} {n} 个" for fmt, n in sorted(self.formats.items())))
+        lines.append(f"  源图 {self.source_mp:.1f} 百万像素 -> 输出 {self.outputs} 个文件，{self.output_mp:.1f} 百万像素")
+        if self.coefficients:
+            lines.append(f"  抽样 {sum(c.samples for c in self.coefficients.values())} 张（用时 {self.sample_seconds:.1f}s）：" +
+                         "；".join(f"{fmt} {c.seconds_per_mp:.3f} s/MP、{c.bytes_per_mp / 1e6:.2f} MB/MP"
+                                  for fmt, c in sorted(self.coefficients.items())))
+        lines.append("  预计耗时：" + "，".join(f"{n} 进程 {_duration(t)}" for n, t in sorted(self.wall_seconds.items())))
+        lines.append("  预计峰值内存：" + "，".join(f"{n} 进程 {_size(b)}" for n, b in sorted(self.peak_memory.items())))
+        free = f"，输出磁盘剩余 {_size(self.disk_free)}" if self.disk_free is not None else ""
+        lines.append(f"  预计输出 {_size(self.output_bytes)}{free}" + ("" if self.fits else "  ⚠ 空间不足"))
+        if self.invalid:
+            lines.append("  无效文件：")
+            lines.extend(f"    {path}：{reason}" for path, reason in self.invalid)
+        return "\n".join(lines)
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+def _size(n: Optional[int]) -> str:
+    value = float(n or 0)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB"
+
+
+def check_truncated(path: str, fmt: str) -> Optional[str]:
+    """只读文件末尾检查结尾标记，缺失时返回原因（只能发现截断，不保证内容完整）"""
+    marker = END_MARKERS.get(fmt)
+    if marker is None:
+        return None
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read()
+    if marker not in tail.rstrip(b"\x00"):
+        return f"文件被截断（缺少 {fmt} 结束标记）"
+    return None
+
+
+def validate(path: str) -> Tuple[Optional[ImageHeader], str]:
+    """读取文件头并检查截断，返回 (文件头, 无效原因)；有效时原因为空"""
+    header = read_header(path)
+    if header is None:
+        return None, "无法打开或格式不支持"
+    try:
+        reason = check_truncated(path, header.format)
+    except OSError as e:
+        reason = f"无法读取：{e}"
+    return (None, reason) if reason else (header, "")
+
+
+def _disk_free(path: str) -> Optional[int]:
+    folder = os.path.abspath(path or ".")
+    while not os.path.isdir(folder):
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return None
+        folder = parent
+    try:
+        return shutil.disk_usage(folder).free
+    except OSError:
+        return None
+
+
+def _pick_samples(headers: Sequence[ImageHeader], count: int) -> List[ImageHeader]:
+    """按像素数排序后均匀抽取 count 张（覆盖小图到大图）"""
+    ordered = sorted(headers, key=lambda h: h.width * h.height * h.frames)
+    if len(ordered) <= count:
+        return ordered
+    step = (len(ordered) - 1) / max(1, count - 1)
+    return [ordered[round(i * step)] for i in range(count)]
+
+
+class _Estimate:
+    """单个文件的输出尺寸、像素量与工作内存"""
+
+    def __init__(self, exporter: "Exporter", header: ImageHeader) -> None:
+        display = display_size(header.width, header.height, header.orientation)
+        frames_fmt = exporter._frames_format(header)
+        frames = header.frames if frames_fmt else 1
+        if exporter.settings.renditions:
+            sizes = [size for _, size in exporter._rendition_plan(*display)]
+        else:
+            sizes = [exporter.target_size(*display)]
+        self.outputs = len(sizes)
+        self.source_mp = header.width * header.height * frames / 1e6
+        self.output_mp = sum(w * h for w, h in sizes) * frames / 1e6
+        largest = max(w * h for w, h in sizes)
+        decoded = header.width * header.height
+        if header.format == "JPEG":
+            # draft 降采样解码：按 1/2、1/4、1/8 缩小到不小于输出尺寸
+            scale = 1
+            while scale < 8 and header.width // (scale * 2) >= max(w for w, _ in sizes):
+                scale *= 2
+            decoded //= scale * scale
+        # 解码图 + 缩放结果 + 合成副本（RGBA），动图/APNG/WebP 另需缓存全部帧（GIF 为调色板帧）
+        self.memory = decoded * 4 + largest * 4 * 2
+        if frames_fmt in ("GIF", "WEBP", "PNG"):
+            self.memory += largest * frames * (1 if frames_fmt == "GIF" else 4)
+
+
+def plan_export(exporter: "Exporter", sample: int = 2, worker_counts: Sequence[int] = ()) -> ExportPlan:
+    """为 exporter 当前的设置生成导出计划；只在内存中渲染抽样的几张，不写任何文件"""
+    settings = exporter.settings
+    paths = list(settings.input_paths)
+    plan = ExportPlan(total=len(paths))
+    headers: List[ImageHeader] = []
+    with ThreadPoolExecutor(max_workers=min(settings.workers or default_workers(), max(1, len(paths)))) as pool:
+        for path, (header, reason) in zip(paths, pool.map(validate, paths)):
+            if header is None:
+                plan.invalid.append((path, reason))
+            else:
+                headers.append(header)
+
+    # 抽样：每种格式几张，内存导出计时；渲染失败的样本也列为无效
+    by_format: Dict[str, List[ImageHeader]] = {}
+    for header in headers:
+        by_format.setdefault(header.format, []).append(header)
+    failed = set()
+    started = time.perf_counter()
+    for fmt, members in by_format.items():
+        seconds = source_mp = output_mp = 0.0
+        out_bytes = 0
+        n = 0
+        for header in _pick_samples(members, max(1, sample)):
+            estimate = _Estimate(exporter, header)
+            t0 = time.perf_counter()
+            try:
+                with open(header.path, "rb") as f:
+                    result = exporter._render_bytes(f.read(), header.path)
+            except Exception as e:
+                plan.invalid.append((header.path, f"渲染失败：{e}"))
+                failed.add(header.path)
+                continue
+            seconds += time.perf_counter() - t0
+            source_mp += estimate.source_mp
+            # 多规格时只渲染主尺寸，按该次输出的像素数折算
+            output_mp += result.size[0] * result.size[1] * (header.frames if exporter._frames_format(header) else 1) / 1e6
+            out_bytes += len(result.data)
+            n += 1
+        if n:
+            plan.coefficients[fmt] = FormatCoefficients(n, seconds / max(source_mp, 1e-6), out_bytes / max(output_mp, 1e-6))
+    plan.sample_seconds = time.perf_counter() - started
+
+    headers = [h for h in headers if h.path not in failed]
+    known = list(plan.coefficients.values())
+    # 没有成功样本的格式按其他格式的平均系数估计
+    fallback = FormatCoefficients(0, sum(c.seconds_per_mp for c in known) / len(known),
+                                  sum(c.bytes_per_mp for c in known) / len(known)) if known else None
+    working_set = 0
+    for header in headers:
+        estimate = _Estimate(exporter, header)
+        coef = plan.coefficients.get(header.format, fallback)
+        plan.valid += 1
+        plan.formats[header.format] = plan.formats.get(header.format, 0) + 1
+        plan.outputs += estimate.outputs
+        plan.source_mp += estimate.source_mp
+        plan.output_mp += estimate.output_mp
+        if coef is not None:
+            plan.cpu_seconds += coef.seconds_per_mp * estimate.source_mp
+            plan.output_bytes += int(coef.bytes_per_mp * estimate.output_mp)
+        working_set = max(working_set, estimate.memory)
+
+    cpus = os.cpu_count() or 1
+    counts = sorted(set(worker_counts or (1, 2, 4, cpus)))
+    # 写线程池中待写的编码结果（OutputWriter 默认上限 256 MB）
+    pending = min(256 * 1024 * 1024, int(plan.output_bytes / max(1, plan.outputs) * max(1, settings.writer_threads) * 2))
+    for n in counts:
+        # 多进程（分片工作者）按 CPU 核数线性扩展，超过核数不再加速
+        plan.wall_seconds[n] = plan.cpu_seconds / min(n, cpus)
+        # 每个进程：基础占用 + 最大一张图的工作内存 + 待写的编码结果
+        plan.peak_memory[n] = n * (PROCESS_BASE_BYTES + working_set + pending)
+    plan.disk_free = _disk_free(settings.output_dir)
+    return plan
@@ -0,0 +1,211 @@
+"""
+与导出等价的预览渲染。
+
+几何全部在导出坐标下计算：输出尺寸、叠加层（含旋转扩展后）的尺寸、锚点与边距，
+与 Exporter 使用同一套函数；叠加层只在预览分辨率下栅格化，再按预览比例摆放。
+因此预览中水印的比例和位置与导出结果一致，开销只与预览尺寸有关。
+描边、阴影按固定像素绘制，这类细节请用 100% 分块预览检查。
+"""
+
+import math
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from .adaptive import choose_variant, region_stats, variant_style
+from .bundles import overlay_fingerprint
+from .compositing import apply_opacity, composite_layers
+from .exporter import ExportSettings, Exporter
+from .metadata import display_size
+from .placement import auto_positions, luminance_proxy
+from .probe import ImageHeader
+from .tiling import tile_positions
+from .tokens import has_tokens
+from .utils import LruCache, render_text_overlay, text_overlay_size
+
+
+TEXT_SUPERSAMPLE = 4  # 文本叠加层按预览比例的几倍渲染后再缩小
+
+Size = Tuple[int, int]
+Rect = Tuple[int, int, int, int]
+
+
+def rotated_size(size: Size, angle: float) -> Size:
+    """与 Image.rotate(angle, expand=True) 相同的输出尺寸（不做栅格化）"""
+    angle = angle % 360.0
+    w, h = size
+    if angle in (0, 180):
+        return w, h
+    if angle in (90, 270):
+        return h, w
+    a = -math.radians(angle)
+    m = [round(math.cos(a), 15), round(math.sin(a), 15), 0.0, round(-math.sin(a), 15), round(math.cos(a), 15), 0.0]
+    cx, cy = w / 2, h / 2
+    m[2] = -m[0] * cx - m[1] * cy + cx
+    m[5] = -m[3] * cx - m[4] * cy + cy
+    corners = ((0, 0), (w, 0), (w, h), (0, h))
+    xs = [m[0] * x + m[1] * y + m[2] for x, y in corners]
+    ys = [m[3] * x + m[4] * y + m[5] for x, y in corners]
+    return math.ceil(max(xs)) - math.floor(min(xs)), math.ceil(max(ys)) - math.floor(min(ys))
+
+
+class PreviewRenderer:
+    """按导出几何把水印合成到预览底图上"""
+
+    def __init__(self) -> None:
+        self.exporter: Optional[Exporter] = None
+        self._rasters = LruCache(32)  # (图层, 文本, 颜色变体, 预览尺寸) -> 预览分辨率的叠加层
+        self._look = None
+
+    def _use(self, settings: ExportSettings) -> Exporter:
+        # 这里只用到 Exporter 的几何函数和 logo 原图缓存，换设置时沿用同一实例，避免反复解码 logo
+        if self.exporter is None or settings.img_wm_path != self.exporter.settings.img_wm_path:
+            self.exporter = Exporter(settings)
+        else:
+            self.exporter.settings = settings
+        look = (overlay_fingerprint(settings), settings.img_wm_path)
+        if look != self._look:
+            self._rasters = LruCache(32)
+            self._look = look
+        return self.exporter
+
+    def export_size(self, header: ImageHeader) -> Size:
+        return self.exporter.target_size(*display_size(header.width, header.height, header.orientation))
+
+    def _rotated(self, size: Size) -> Size:
+        rotation = self.exporter.rotation()
+        return rotated_size(size, -rotation) if abs(rotation) > 0.01 else size
+
+    def _rotate(self, overlay: Image.Image) -> Image.Image:
+        rotation = self.exporter.rotation()
+        if abs(rotation) > 0.01:
+            overlay = overlay.rotate(-rotation, resample=Image.BICUBIC, expand=True)
+        return overlay
+
+    def _text_style(self, variant: str):
+        settings = self.exporter.settings
+        rgba, outline, outline_rgb = settings.wm_color_rgba, bool(settings.wm_outline), (0, 0, 0)
+        if variant:
+            rgba, variant_outline, outline_rgb = variant_style(variant, rgba)
+            outline = outline or variant_outline
+        return rgba, outline, outline_rgb
+
+    def _text_size(self, text: str, variant: str) -> Size:
+        """文本叠加层在导出图上的尺寸（旋转扩展后）"""
+        settings = self.exporter.settings
+        _, outline, _ = self._text_style(variant)
+        return self._rotated(text_overlay_size(text, settings.wm_font_family, int(settings.wm_font_size),
+                                               bool(settings.wm_shadow), outline))
+
+    def _text_raster(self, text: str, variant: str, scale: float, target: Size) -> Image.Image:
+        key = ("text", text, variant, target)
+        cached = self._rasters.get(key)
+        if cached is not None:
+            return cached
+        settings = self.exporter.settings
+        rgba, outline, outline_rgb = self._text_style(variant)
+        overlay = render_text_overlay(
+            text=text,
+            font_family=settings.wm_font_family,
+            point_size=max(1, round(int(settings.wm_font_size) * min(1.0, scale * TEXT_SUPERSAMPLE))),
+            bold=bool(settings.wm_bold),
+            italic=bool(settings.wm_italic),
+            rgba=rgba,
+            shadow=bool(settings.wm_shadow),
+            outline=outline,
+            outline_rgb=outline_rgb,
+        )
+        overlay = self._rotate(overlay)
+        # 小字号栅格化的笔画偏细，先按若干倍大小渲染再缩小，与缩小显示的导出结果一致；
+        # 字形度量也不严格按比例缩放，最后对齐到导出尺寸乘以预览比例
+        if overlay.size != target:
+            overlay = overlay.resize(target, Image.LANCZOS)
+        self._rasters.put(key, overlay)
+        return overlay
+
+    def _logo_raster(self, scaled: Size, scale: Tuple[float, float], target: Size) -> Image.Image:
+        key = ("image", "", "", target)
+        cached = self._rasters.get(key)
+        if cached is not None:
+            return cached
+        logo = self.exporter.logo_source()
+        wm = logo.resize((max(1, round(scaled[0] * scale[0])), max(1, round(scaled[1] * scale[1]))), Image.LANCZOS)
+        wm = self._rotate(apply_opacity(wm, self.exporter.settings.img_wm_opacity))
+        if wm.size != target:
+            wm = wm.resize(target, Image.LANCZOS)
+        self._rasters.put(key, wm)
+        return wm
+
+    def render(self, settings: ExportSettings, base: Image.Image, header: ImageHeader,
+               index: int = 1) -> Tuple[Image.Image, Optional[Rect]]:
+        """把水印合成到预览底图 base 上，返回 (预览图, 最上层水印在预览中的矩形)"""
+        exporter = self._use(settings)
+        export_size = self.export_size(header)
+        sx, sy = base.width / export_size[0], base.height / export_size[1]
+        scale = (sx + sy) / 2
+
+        def to_preview(size: Size) -> Size:
+            return max(1, round(size[0] * sx)), max(1, round(size[1] * sy))
+
+        # (导出尺寸, 预览叠加层, 手动位置设置)，与 Exporter 相同的顺序：先图片后文本
+        layers: List[Tuple[Size, Image.Image, Tuple[bool, Tuple[float, float]]]] = []
+        if settings.wm_use_image and exporter.logo_source() is not None:
+            scaled = exporter.logo_target(export_size, exporter.logo_source().size)
+            size = self._rotated(scaled)
+            layers.append((size, self._logo_raster(scaled, (sx, sy), to_preview(size)),
+                           (settings.image_manual_enabled, settings.image_manual_pos_norm)))
+        text = ""
+        text_index = -1
+        if settings.wm_use_text:
+            dynamic = has_tokens(settings.wm_text)
+            text = (exporter.expand_text(header, index) if dynamic else settings.wm_text or "").strip()
+            if text:
+                size = self._text_size(text, "")
+                text_index = len(layers)
+                layers.append((size, self._text_raster(text, "", scale, to_preview(size)),
+                               (settings.text_manual_enabled, settings.text_manual_pos_norm)))
+        if not layers:
+            return base, None
+
+        tiled = settings.position_mode == "tile"
+
+        def tile_layer(size: Size, overlay: Image.Image) -> Image.Image:
+            # 按导出图案中各水印的位置逐个摆放，单独缩放间距会使周期误差向边缘累积
+            layer = Image.new("RGBA", base.size, (0, 0, 0, 0))
+            for x, y in tile_positions(export_size, size, settings.tile_spacing, settings.tile_stagger):
+                layer.paste(overlay, (round(x * sx), round(y * sy)))
+            return layer
+
+        entries = []
+        for size, overlay, manual in layers:
+            if tiled:
+                entries.append((tile_layer(size, overlay), (0, 0)))
+                continue
+            pos = exporter.position(export_size, size, *manual)
+            entries.append((overlay, None if pos is None else (round(pos[0] * sx), round(pos[1] * sy))))
+
+        adaptive = settings.wm_color_mode == "adaptive" and text_index >= 0
+        pending = [i for i, (_, pos) in enumerate(entries) if pos is None]
+        proxy = luminance_proxy(base) if pending or adaptive else None
+        if pending:
+            margin = max(1, round(exporter.margin(*export_size) * scale))
+            chosen = auto_positions(base, [entries[i][0].size for i in pending], margin, proxy)
+            for i, pos in zip(pending, chosen):
+                entries[i] = (entries[i][0], pos)
+        if adaptive:
+            # 与导出相同：按目标区域亮度选颜色变体，保持中心位置
+            overlay, (x, y) = entries[text_index]
+            ow, oh = overlay.size
+            mean, std = region_stats(proxy[0], proxy[1], (x, y, ow, oh))
+            variant = choose_variant(mean, std, settings.wm_color_rgba)
+            picked = self._text_raster(text, variant, scale, to_preview(self._text_size(text, variant)))
+            if tiled:
+                entries[text_index] = (tile_layer(self._text_size(text, variant), picked), (0, 0))
+            else:
+                entries[text_index] = (picked, (x + (ow - picked.width) // 2, y + (oh - picked.height) // 2))
+
+        result = composite_layers(base, entries, exporter.backend())
+        if tiled:
+            return result, None
+        overlay, (x, y) = entries[-1]
+        return result, (x, y, overlay.width, overlay.height)
@@ -0,0 +1,158 @@
+"""
+只读文件头的图像探测（不解码像素）。
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import IO, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from .frames import frame_count
+
+
+ORIENTATION_TAG = 0x0112
+MAKE_TAG = 0x010F
+MODEL_TAG = 0x0110
+DATETIME_TAG = 0x0132
+EXIF_IFD = 0x8769
+DATETIME_ORIGINAL_TAG = 0x9003
+DATETIME_DIGITIZED_TAG = 0x9004
+ISO_TAG = 0x8827
+LENS_MODEL_TAG = 0xA434
+
+GeometryKey = Tuple[int, int, str, int]  # (width, height, mode, orientation)
+
+
+@dataclass(frozen=True)
+class ImageMeta:
+    """文本占位符用到的拍摄信息"""
+    taken: Optional[datetime] = None
+    camera: str = ""
+    lens: str = ""
+    iso: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class ImageHeader:
+    path: str
+    width: int
+    height: int
+    mode: str
+    orientation: int = 1
+    format: str = ""
+    meta: Optional[ImageMeta] = None
+    frames: int = 1  # 动图帧数或 TIFF 页数
+
+    @property
+    def geometry(self) -> GeometryKey:
+        return (self.width, self.height, self.mode, self.orientation)
+
+
+def _text(value) -> str:
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="ignore")
+    return str(value).strip("\x00 ").strip() if value is not None else ""
+
+
+def _parse_exif_datetime(value) -> Optional[datetime]:
+    # Expected format: 'YYYY:MM:DD HH:MM:SS'
+    text = _text(value)
+    for fmt, length in (("%Y:%m:%d %H:%M:%S", 19), ("%Y:%m:%d", 10)):
+        try:
+            return datetime.strptime(text[:length], fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _read_meta(path: str, exif: Image.Exif, from_file: bool = True) -> ImageMeta:
+    try:
+        sub = exif.get_ifd(EXIF_IFD)
+    except Exception:
+        sub = {}
+    taken = None
+    for value in (sub.get(DATETIME_ORIGINAL_TAG), exif.get(DATETIME_TAG), sub.get(DATETIME_DIGITIZED_TAG)):
+        if value:
+            taken = _parse_exif_datetime(value)
+            if taken:
+                break
+    if taken is None and from_file:
+        try:
+            taken = datetime.fromtimestamp(os.path.getmtime(path))
+        except OSError:
+            taken = None
+
+    make, model = _text(exif.get(MAKE_TAG)), _text(exif.get(MODEL_TAG))
+    # 多数机型的 Model 已包含厂商名（如 "NIKON CORPORATION" + "NIKON D850"）
+    brand = make.split()[0].lower() if make else ""
+    if brand and model.lower().startswith(brand):
+        camera = model
+    else:
+        camera = " ".join(p for p in (make, model) if p)
+
+    iso = sub.get(ISO_TAG)
+    if isinstance(iso, (tuple, list)):
+        iso = iso[0] if iso else None
+    try:
+        iso = int(iso) if iso is not None else None
+    except (TypeError, ValueError):
+        iso = None
+    return ImageMeta(taken=taken, camera=camera, lens=_text(sub.get(LENS_MODEL_TAG)), iso=iso)
+
+
+def read_header(path: str, with_meta: bool = False, source: Optional[IO[bytes]] = None) -> Optional[ImageHeader]:
+    """读取尺寸、模式和 EXIF 方向（可选拍摄信息）；失败返回 None
+
+    source 为已打开的文件对象时从中读取，path 只作为名称保留。
+    """
+    try:
+        with Image.open(source if source is not None else path) as im:
+            try:
+                exif = im.getexif()
+            except Exception:
+                exif = Image.Exif()
+            try:
+                orientation = int(exif.get(ORIENTATION_TAG, 1) or 1)
+            except Exception:
+                orientation = 1
+            if orientation not in range(1, 9):
+                orientation = 1
+            return ImageHeader(
+                path=path,
+                width=im.width,
+                height=im.height,
+                mode=im.mode,
+                orientation=orientation,
+                format=im.format or "",
+                meta=_read_meta(path, exif, source is None) if with_meta else None,
+                frames=frame_count(im),
+            )
+    except Exception:
+        return None
+
+
+def default_workers(io_bound: bool = True) -> int:
+    cpus = os.cpu_count() or 1
+    return min(32, cpus * 4) if io_bound else cpus
+
+
+def prefetch_headers(paths: Sequence[str], workers: int = 0, with_meta: bool = False) -> List[Optional[ImageHeader]]:
+    """并行读取一批文件头，结果与输入顺序一致"""
+    if not paths:
+        return []
+    workers = workers or default_workers()
+    if workers <= 1 or len(paths) == 1:
+        return [read_header(p, with_meta) for p in paths]
+    with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        return list(pool.map(lambda p: read_header(p, with_meta), paths))
+
+
+def group_by_geometry(headers: Iterable[ImageHeader]) -> Dict[GeometryKey, List[ImageHeader]]:
+    """按 (宽, 高, 模式, 方向) 分桶，桶与桶内顺序均保持输入顺序"""
+    buckets: Dict[GeometryKey, List[ImageHeader]] = {}
+    for header in headers:
+        buckets.setdefault(header.geometry, []).append(header)
+    return buckets
@@ -0,0 +1,99 @@
+"""
+预览用的分辨率金字塔。
+
+第 k 层是显示方向原图的 1/2^k。首次需要某层时按该比例降采样解码（JPEG 的 draft 模式），
+更粗的层由已缓存的较细层逐级减半得到；窗口缩放、预览缩放只在缓存的层之间切换，不再读源文件。
+"""
+
+import math
+import threading
+from typing import Dict, Tuple
+
+from PIL import Image
+
+from .metadata import apply_orientation, display_size
+from .probe import read_header
+
+
+class ImagePyramid:
+    """单个文件的预览金字塔，各层按需构建并缓存（线程安全）"""
+
+    def __init__(self, path: str) -> None:
+        header = read_header(path)
+        if header is None:
+            raise ValueError(f"无法识别的图像：{path}")
+        self.path = path
+        self.orientation = header.orientation
+        self.stored_size = (header.width, header.height)
+        self.size = display_size(header.width, header.height, header.orientation)  # 原图显示尺寸
+        self.decodes = 0  # 读取源文件的次数
+        self._levels: Dict[int, Image.Image] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_level(self) -> int:
+        """最粗一层（短边不小于 1 像素）"""
+        return max(0, int(math.log2(max(1, min(self.size)))))
+
+    def level_size(self, k: int) -> Tuple[int, int]:
+        w, h = self.size
+        for _ in range(k):
+            w, h = (w + 1) // 2, (h + 1) // 2
+        return w, h
+
+    def level_for(self, scale: float) -> int:
+        """分辨率不低于 scale（相对原图的显示比例）的最粗一层"""
+        if scale >= 1.0:
+            return 0
+        return min(self.max_level, int(math.floor(math.log2(1.0 / max(scale, 1e-6)))))
+
+    def level(self, k: int) -> Image.Image:
+        k = max(0, min(k, self.max_level))
+        with self._lock:
+            cached = self._levels.get(k)
+            if cached is not None:
+                return cached
+            finer = [j for j in self._levels if j < k]
+            if finer:
+                j = max(finer)
+                img = self._levels[j]
+            else:
+                j, img = self._decode(k)
+            # 逐级减半，中间层一并缓存
+            while j < k:
+                img = img.reduce(2)
+                j += 1
+                self._levels[j] = img
+            return img
+
+    def _decode(self, k: int) -> Tuple[int, Image.Image]:
+        """按第 k 层的比例降采样解码，返回 (实际得到的层号, 显示方向图像)"""
+        scale = 2 ** k
+        stored_w, stored_h = self.stored_size
+        with Image.open(self.path) as im:
+            if k > 0:
+                im.draft(im.mode, (-(-stored_w // scale), -(-stored_h // scale)))
+            im.load()
+            img = im
+            if img.mode not in ("RGB", "RGBA", "L", "LA"):
+                img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+            elif img is im:
+                img = im.copy()
+        self.decodes += 1
+        # draft 只能按 1/2、1/4、1/8 缩小，得到的可能是更细的层
+        j = min(k, int(round(math.log2(max(1.0, stored_w / img.width)))))
+        img = apply_orientation(img, self.orientation)
+        if img.size != self.level_size(j):
+            img = img.resize(self.level_size(j), Image.LANCZOS)
+        self._levels[j] = img
+        return j, img
+
+    def render(self, box: Tuple[int, int], zoom: float = 1.0) -> Image.Image:
+        """适应 box 的预览图（乘以 zoom，不超过原图分辨率），取分辨率足够的最粗一层缩放得到"""
+        w, h = self.size
+        scale = min(1.0, min(box[0] / w, box[1] / h) * zoom)
+        target = (max(1, round(w * scale)), max(1, round(h * scale)))
+        img = self.level(self.level_for(scale))
+        if img.size == target:
+            return img.copy()
+        return img.resize(target, Image.LANCZOS)
@@ -0,0 +1,371 @@
+"""
+本地 HTTP 水印服务（仅标准库 asyncio）。
+
+    python -m app.server --port 8765 --workers 4 --queue 64
+
+POST /watermark?template=<模板名>&name=<文件名>
+    请求体为原始图片字节；可用 X-Export-Settings 头传入 ExportSettings 字段的 JSON（UTF-8），
+    覆盖模板（或默认设置）中的对应字段。返回编码后的图片。
+    模板目录中的同名 .wmbundle 模板包优先，其预渲染叠加层直接预置到工作进程。
+GET /health、GET /stats
+
+渲染在常驻的工作进程中进行：每个进程按设置缓存 Exporter，字体、图片水印、
+渲染好的叠加层在请求之间复用。等待中的请求放在有界队列里，队列满时立即返回 503。
+工作进程意外退出时重建进程池，正在处理的请求返回 500，之后的请求不受影响。
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from .bundles import BUNDLE_EXT, load_bundle
+from .exporter import MIME_TYPES, Exporter
+from .probe import default_workers
+from .templates import (TEMPLATE_DIR, load_template, settings_from_dict, settings_from_template, settings_key,
+                        template_path)
+from .utils import LruCache
+
+
+DEFAULT_PORT = 8765
+MAX_BODY = 256 * 1024 * 1024
+_CHUNK = 256 * 1024
+# 工作进程不从服务进程 fork：进程池可能在有连接时重建，fork 出的子进程会继承客户端套接字，连接就关不掉了
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large", 414: "URI Too Long",
+            431: "Request Header Fields Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str = "") -> None:
+        super().__init__(message or _REASONS.get(status, ""))
+        self.status = status
+
+
+def content_disposition(name: str) -> str:
+    """附件文件名头：去掉控制字符和引号，ASCII 回退名 + RFC 5987 的 UTF-8 文件名"""
+    name = "".join(c for c in name if c.isprintable() and c not in '"\\') or "output"
+    fallback = "".join(c if " " <= c <= "~" else "_" for c in name)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(name, safe='')}"
+
+
+# ---- 工作进程 ----
+
+_worker_exporters: Optional[LruCache] = None
+_worker_bundles: Optional[LruCache] = None
+
+
+def _init_worker() -> None:
+    global _worker_exporters, _worker_bundles
+    _worker_exporters = LruCache(32)
+    _worker_bundles = LruCache(8)
+    # Ctrl+C 由主进程处理，工作进程随进程池一起退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def _render_job(key: str, data: bytes, name: str, bundle_path: str = "") -> Tuple[bytes, str, float]:
+    """在工作进程中渲染一张图片，返回 (输出字节, 输出文件名, 耗时毫秒)"""
+    start = time.perf_counter()
+    exporter = _worker_exporters.get((key, bundle_path))
+    if exporter is None:
+        settings = settings_from_dict(json.loads(key))
+        if bundle_path:
+            # 模板包的预渲染资源每个进程只解码一次
+            bundle = _worker_bundles.get(bundle_path)
+            if bundle is None:
+                bundle = load_bundle(bundle_path)
+                _worker_bundles.put(bundle_path, bundle)
+            exporter = bundle.exporter(settings)
+        else:
+            exporter = Exporter(settings)
+        _worker_exporters.put((key, bundle_path), exporter)
+    result = exporter.export_bytes(data, name)
+    return result.data, result.name, (time.perf_counter() - start) * 1000.0
+
+
+# ---- 服务 ----
+
+@dataclass
+class ServiceStats:
+    served: int = 0
+    rejected: int = 0  # 队列已满
+    errors: int = 0
+    pool_restarts: int = 0  # 工作进程意外退出后重建进程池的次数
+    started: float = field(default_factory=time.time)
+
+
+class WatermarkService:
+    def __init__(self, workers: int = 0, queue_size: int = 64, template_dir: str = TEMPLATE_DIR,
+                 max_body: int = MAX_BODY) -> None:
+        self.workers = workers or default_workers(io_bound=False)
+        self.queue_size = queue_size
+        self.template_dir = template_dir
+        self.max_body = max_body
+        self.stats = ServiceStats()
+        self._templates: Dict[str, Tuple[float, str, str]] = {}  # 模板名 -> (mtime, 设置键, 模板包路径)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatchers = []
+
+    async def start(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        loop = asyncio.get_running_loop()
+        self._pool = self._new_pool()
+        # 预先拉起全部工作进程，首个请求不承担进程启动和导入 Pillow 的开销
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _warm_up) for _ in range(self.workers)))
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # 每个工作进程对应一个分发协程，进程内同一时刻只有一个任务，其余在有界队列中等待
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def close(self) -> None:
+        for task in self._dispatchers:
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=_MP_CONTEXT, initializer=_init_worker)
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        """进程池损坏（工作进程被杀、崩溃）后换一个新池；多个分发协程同时发现时只重建一次"""
+        if self._pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+            self.stats.pool_restarts += 1
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            args, future = await self._queue.get()
+            pool = self._pool
+            try:
+                if not future.cancelled():
+                    result = await loop.run_in_executor(pool, _render_job, *args)
+                    if not future.cancelled():
+                        future.set_result(result)
+            except BrokenProcessPool:
+                self._restart_pool(pool)
+                if not future.cancelled():
+                    future.set_exception(RuntimeError("worker process died"))
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _settings_key(self, template: str, inline: str) -> Tuple[str, str]:
+        """模板名 + 内联 JSON -> (规范化的设置键, 模板包路径)；模板按 mtime 缓存
+
+        模板目录中同名的 .wmbundle 模板包优先于 .json 模板。
+        """
+        base = None
+        bundle_path = ""
+        if template:
+            path = template_path(template, self.template_dir)
+            bundle = path[:-len(".json")] + BUNDLE_EXT
+            if os.path.isfile(bundle):
+                path = bundle
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                raise HttpError(404, f"unknown template: {template}")
+            cached = self._templates.get(template)
+            if cached is None or cached[0] != mtime:
+                if path == bundle:
+                    base_settings = load_bundle(bundle).settings()
+                else:
+                    base_settings = settings_from_template(load_template(template, self.template_dir))
+                cached = (mtime, settings_key(base_settings), path if path == bundle else "")
+                self._templates[template] = cached
+            base = settings_from_dict(json.loads(cached[1]))
+            bundle_path = cached[2]
+        try:
+            overrides = json.loads(inline) if inline else {}
+            if not isinstance(overrides, dict):
+                raise ValueError("X-Export-Settings must be a JSON object")
+            settings = settings_from_dict(overrides, base)
+            if settings.renditions:
+                raise ValueError("renditions are not supported over HTTP (one output per request)")
+            return settings_key(settings), bundle_path
+        except (ValueError, TypeError) as e:
+            raise HttpError(400, str(e))
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    status, extra, payload = await self._route(method, target, headers, body)
+                except HttpError as e:
+                    status, extra, payload = e.status, {"Content-Type": "text/plain; charset=utf-8"}, str(e).encode("utf-8")
+                    if status == 503:
+                        extra["Retry-After"] = "1"
+                except Exception as e:
+                    self.stats.errors += 1
+                    status, extra, payload = 500, {"Content-Type": "text/plain; charset=utf-8"}, str(e).encode("utf-8")
+                await self._respond(writer, status, extra, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HttpError as e:
+            try:
+                await self._respond(writer, e.status, {}, str(e).encode("utf-8"), False)
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_line(reader: asyncio.StreamReader, status: int) -> bytes:
+        """读一行；超过 StreamReader 的行长上限时以 status 拒绝（之后连接关闭）"""
+        try:
+            return await reader.readline()
+        except (asyncio.LimitOverrunError, ValueError):
+            raise HttpError(status)
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        line = await self._read_line(reader, 414)
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "malformed request line")
+        headers: Dict[str, str] = {}
+        while True:
+            line = await self._read_line(reader, 431)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = b""
+        if method == "POST":
+            if "content-length" not in headers:
+                raise HttpError(411)
+            try:
+                length = int(headers["content-length"])
+            except ValueError:
+                raise HttpError(400, "bad Content-Length")
+            if length > self.max_body:
+                raise HttpError(413)
+            body = await reader.readexactly(length)
+        return method, target, headers, body
+
+    async def _route(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"Content-Type": "text/plain"}, b"ok"
+        if url.path == "/stats":
+            data = {"served": self.stats.served, "rejected": self.stats.rejected, "errors": self.stats.errors,
+                    "pool_restarts": self.stats.pool_restarts,
+                    "queued": self._queue.qsize(), "queue_size": self.queue_size, "workers": self.workers,
+                    "uptime_s": round(time.time() - self.stats.started, 1)}
+            return 200, {"Content-Type": "application/json"}, json.dumps(data).encode("utf-8")
+        if url.path != "/watermark":
+            raise HttpError(404)
+        if method != "POST":
+            raise HttpError(405)
+        if not body:
+            raise HttpError(400, "empty body")
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            # 头部按 latin-1 解码（逐字节），设置 JSON 按 UTF-8 还原
+            inline = headers.get("x-export-settings", "").encode("latin-1").decode("utf-8")
+        except UnicodeError:
+            raise HttpError(400, "X-Export-Settings must be UTF-8")
+        key, bundle_path = self._settings_key(query.get("template", ""), inline)
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait(((key, body, query.get("name", ""), bundle_path), future))
+        except asyncio.QueueFull:
+            self.stats.rejected += 1
+            raise HttpError(503, "queue full")
+        try:
+            payload, out_name, render_ms = await future
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        self.stats.served += 1
+        fmt = json.loads(key).get("output_format", "JPEG")
+        return 200, {
+            "Content-Type": MIME_TYPES.get(fmt, "application/octet-stream"),
+            "Content-Disposition": content_disposition(out_name),
+            "X-Render-Ms": f"{render_ms:.1f}",
+        }, payload
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, headers: Dict[str, str],
+                       payload: bytes, keep_alive: bool) -> None:
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", f"Content-Length: {len(payload)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        try:
+            if any(c in v for v in headers.values() for c in "\r\n"):
+                raise ValueError("line break in header value")
+            data = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+        except ValueError:  # 含 UnicodeEncodeError
+            # 头部无法安全写出时返回 500，而不是直接断开连接
+            self.stats.errors += 1
+            payload = b"invalid response header"
+            data = (f"HTTP/1.1 500 {_REASONS[500]}\r\nContent-Length: {len(payload)}\r\n"
+                    f"Content-Type: text/plain\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    ).encode("latin-1")
+        writer.write(data)
+        # 分块写出并等待缓冲区排空，慢客户端不会让输出在内存中堆积
+        view = memoryview(payload)
+        for offset in range(0, len(view), _CHUNK):
+            writer.write(view[offset:offset + _CHUNK])
+            await writer.drain()
+        await writer.drain()
+
+
+async def serve(host: str, port: int, workers: int, queue_size: int, template_dir: str) -> None:
+    service = WatermarkService(workers, queue_size, template_dir)
+    server = await service.start(host, port)
+    print(f"水印服务已启动：http://{host}:{port}  工作进程 {service.workers}，队列上限 {queue_size}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="本地 HTTP 水印服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=0, help="工作进程数（默认 CPU 核数）")
+    parser.add_argument("--queue", type=int, default=64, help="等待队列上限，超出返回 503")
+    parser.add_argument("--templates", default=TEMPLATE_DIR, help="模板目录")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue, args.templates))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,336 @@
+"""
+分片批处理：多个进程、多台机器通过共享文件系统协作完成同一个大批次。
+
+作业目录结构：
+    job.json                     作业清单（导出设置、输出目录、分片数、租约超时）
+    chunks/000000.txt            各分片的输入，每行 "相对目录<TAB>路径"（相对目录为空表示直接在输出目录下）
+    leases/000000.<代>.lease     租约；以 O_EXCL 独占创建，持有者定期更新 mtime 作为心跳
+    done/000000.json             分片结果（临时文件 + 原子改名）
+    workers/<工作者>             各工作者的时钟探针（以共享文件系统的时间判断租约是否过期）
+    report.json                  合并后的报告
+
+同一分片的租约按代号递增创建，同一代只有一个进程能创建成功；
+最新一代超过超时时间没有心跳即视为持有者已退出，其他进程创建下一代接管。
+输出保留输入目录内的子目录结构，不同子目录中的同名文件不会互相覆盖；
+输出文件按名称原子替换，分片被重复处理只是重写相同的结果。
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .exporter import ExportSettings, Exporter
+from .templates import settings_from_dict, settings_to_dict
+from .utils import is_supported_image_path
+
+
+JOB_VERSION = 1
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_LEASE_TIMEOUT = 120.0
+
+
+@dataclass
+class JobManifest:
+    job_dir: str
+    settings: ExportSettings
+    chunks: int
+    lease_timeout: float
+    total: int
+
+
+@dataclass
+class ChunkResult:
+    chunk: int
+    worker: str
+    generation: int  # 大于 0 表示从失联的工作者手中接管
+    ok: int
+    fail: int
+    bytes: int
+    started: float
+    finished: float
+
+
+@dataclass
+class ShardReport:
+    chunks: int = 0
+    done: int = 0
+    total: int = 0
+    ok: int = 0
+    fail: int = 0
+    bytes: int = 0
+    reclaimed: int = 0
+    elapsed: float = 0.0
+    workers: Dict[str, int] = field(default_factory=dict)  # 工作者 -> 完成的分片数
+    missing: List[int] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        return self.done == self.chunks
+
+    def summary(self) -> str:
+        state = "已完成" if self.complete else f"未完成（缺 {len(self.missing)} 个分片）"
+        return (f"分片作业{state}：{self.done}/{self.chunks} 个分片，成功 {self.ok} 张，失败 {self.fail} 张，"
+                f"写出 {self.bytes / 1e6:.1f} MB，用时 {self.elapsed:.1f}s，"
+                f"{len(self.workers)} 个工作者，接管 {self.reclaimed} 个分片")
+
+
+def _chunk_name(chunk: int) -> str:
+    return f"{chunk:06d}"
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def iter_inputs_with_dirs(paths: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """展开输入为 (绝对路径, 相对目录)：文件原样产出（相对目录为空），
+    目录递归列出其中的图片（按名称排序），相对目录以 "/" 分隔、相对于给出的目录"""
+    for path in paths:
+        if os.path.isdir(path):
+            stack = [(path, "")]
+            while stack:
+                folder, rel = stack.pop()
+                with os.scandir(folder) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+                subdirs = []
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append((entry.path, f"{rel}/{entry.name}" if rel else entry.name))
+                    elif is_supported_image_path(entry.name):
+                        yield os.path.abspath(entry.path), rel
+                stack.extend(reversed(subdirs))
+        else:
+            yield os.path.abspath(path), ""
+
+
+def iter_inputs(paths: Iterable[str]) -> Iterator[str]:
+    """展开输入：文件原样产出，目录递归列出其中的图片（按名称排序）"""
+    for path, _ in iter_inputs_with_dirs(paths):
+        yield path
+
+
+def create_job(job_dir: str, inputs: Iterable[str], settings: ExportSettings,
+               chunk_size: int = DEFAULT_CHUNK_SIZE, lease_timeout: float = DEFAULT_LEASE_TIMEOUT) -> JobManifest:
+    """把输入切成分片写入作业目录；作业清单最后写入，出现即表示作业可以开始"""
+    manifest_path = os.path.join(job_dir, "job.json")
+    if os.path.exists(manifest_path):
+        raise FileExistsError(f"作业已存在：{manifest_path}")
+    if chunk_size <= 0:
+        raise ValueError("分片大小必须为正数")
+    for sub in ("chunks", "leases", "done", "workers"):
+        os.makedirs(os.path.join(job_dir, sub), exist_ok=True)
+
+    chunks = total = 0
+    batch: List[str] = []
+
+    def flush() -> None:
+        nonlocal chunks
+        _write_atomic(os.path.join(job_dir, "chunks", f"{_chunk_name(chunks)}.txt"), "\n".join(batch) + "\n")
+        chunks += 1
+        batch.clear()
+
+    for path, rel in iter_inputs_with_dirs(inputs):
+        batch.append(f"{rel}\t{path}")
+        total += 1
+        if len(batch) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+
+    data = {
+        "version": JOB_VERSION,
+        "settings": settings_to_dict(settings),
+        "output_dir": os.path.abspath(settings.output_dir),
+        "chunks": chunks,
+        "total": total,
+        "lease_timeout": float(lease_timeout),
+    }
+    _write_atomic(manifest_path, json.dumps(data, ensure_ascii=False, indent=2))
+    return load_job(job_dir)
+
+
+def load_job(job_dir: str) -> JobManifest:
+    with open(os.path.join(job_dir, "job.json"), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if int(data.get("version", 0)) > JOB_VERSION:
+        raise ValueError(f"作业版本过新：{data.get('version')}")
+    settings = settings_from_dict(data["settings"])
+    settings.output_dir = data["output_dir"]
+    return JobManifest(job_dir=job_dir, settings=settings, chunks=int(data["chunks"]),
+                       lease_timeout=float(data["lease_timeout"]), total=int(data.get("total", 0)))
+
+
+def read_chunk(job: JobManifest, chunk: int) -> List[Tuple[str, str]]:
+    """分片中的 (路径, 相对目录)"""
+    with open(os.path.join(job.job_dir, "chunks", f"{_chunk_name(chunk)}.txt"), "r", encoding="utf-8") as f:
+        lines = [line for line in f.read().splitlines() if line]
+    return [(path, rel) for rel, path in (line.split("\t", 1) for line in lines)]
+
+
+class ShardWorker:
+    """领取并处理分片，直到作业中的全部分片都有结果"""
+
+    def __init__(self, job_dir: str, worker_id: str = "", poll: Optional[float] = None) -> None:
+        self.job = load_job(job_dir)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        timeout = self.job.lease_timeout
+        self.poll = poll if poll is not None else min(5.0, timeout / 4)
+        self.heartbeat = timeout / 4
+        self._clock = os.path.join(job_dir, "workers", self.worker_id)
+        self._done = set()
+        self._exporter: Optional[Exporter] = None
+        self._output_root = self.job.settings.output_dir
+
+    def _path(self, sub: str, chunk: int, suffix: str) -> str:
+        return os.path.join(self.job.job_dir, sub, f"{_chunk_name(chunk)}{suffix}")
+
+    def _lease_path(self, chunk: int, generation: int) -> str:
+        return self._path("leases", chunk, f".{generation}.lease")
+
+    def _fs_now(self) -> float:
+        """共享文件系统的当前时间（不依赖各主机时钟一致）"""
+        with open(self._clock, "a"):
+            pass
+        os.utime(self._clock, None)
+        return os.stat(self._clock).st_mtime
+
+    def _is_done(self, chunk: int) -> bool:
+        if chunk in self._done:
+            return True
+        if os.path.exists(self._path("done", chunk, ".json")):
+            self._done.add(chunk)
+            return True
+        return False
+
+    def _claim(self, chunk: int) -> Optional[int]:
+        """尝试领取分片，成功返回租约代号；分片已完成或由存活的工作者持有时返回 None"""
+        generation = 0
+        now = None
+        while True:
+            path = self._lease_path(chunk, generation)
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                pass
+            else:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(self.worker_id)
+                # 领取前后都可能有人刚写完结果
+                if self._is_done(chunk):
+                    return None
+                return generation
+            if os.path.exists(self._lease_path(chunk, generation + 1)):
+                generation += 1
+                continue
+            # generation 为当前租约：心跳未超时则由他人持有
+            now = now if now is not None else self._fs_now()
+            try:
+                beat = os.stat(path).st_mtime
+            except FileNotFoundError:
+                return None
+            if now - beat < self.job.lease_timeout:
+                return None
+            generation += 1
+
+    def _keep_alive(self, chunk: int, generation: int, stop: threading.Event) -> None:
+        path = self._lease_path(chunk, generation)
+        while not stop.wait(self.heartbeat):
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+
+    def _process(self, chunk: int, generation: int) -> ChunkResult:
+        if self._exporter is None:
+            self._exporter = Exporter(self.job.settings)
+        exporter = self._exporter
+        # 按相对目录分组，每组导出到输出目录下的对应子目录
+        groups: Dict[str, List[str]] = {}
+        for path, rel in read_chunk(self.job, chunk):
+            groups.setdefault(rel, []).append(path)
+        stop = threading.Event()
+        beat = threading.Thread(target=self._keep_alive, args=(chunk, generation, stop), daemon=True)
+        beat.start()
+        started = time.time()
+        ok = fail = written = 0
+        try:
+            for rel, paths in groups.items():
+                exporter.settings.input_paths = paths
+                exporter.settings.output_dir = os.path.join(self._output_root, *rel.split("/")) if rel else self._output_root
+                group_ok, group_fail = exporter.export_all()
+                ok, fail, written = ok + group_ok, fail + group_fail, written + exporter.write_stats.bytes
+        finally:
+            stop.set()
+            beat.join()
+        return ChunkResult(chunk=chunk, worker=self.worker_id, generation=generation, ok=ok, fail=fail,
+                           bytes=written, started=started, finished=time.time())
+
+    def run(self, max_chunks: Optional[int] = None) -> int:
+        """处理分片直到全部完成（或处理满 max_chunks 个），返回本工作者处理的分片数"""
+        n = self.job.chunks
+        if n == 0:
+            return 0
+        # 各工作者从不同位置开始，减少争抢同一个分片
+        start = zlib.crc32(self.worker_id.encode("utf-8")) % n
+        order = [(start + i) % n for i in range(n)]
+        processed = 0
+        while True:
+            pending = [c for c in order if not self._is_done(c)]
+            if not pending:
+                return processed
+            progressed = False
+            for chunk in pending:
+                generation = self._claim(chunk)
+                if generation is None:
+                    continue
+                result = self._process(chunk, generation)
+                done_path = self._path("done", chunk, ".json")
+                if not os.path.exists(done_path):
+                    _write_atomic(done_path, json.dumps(asdict(result), ensure_ascii=False))
+                self._done.add(chunk)
+                processed += 1
+                progressed = True
+                if max_chunks is not None and processed >= max_chunks:
+                    return processed
+            if not progressed:
+                # 剩余分片都由其他存活的工作者持有，等待它们完成或租约过期
+                time.sleep(self.poll)
+
+
+def merge_report(job_dir: str, write: bool = True) -> ShardReport:
+    """合并各分片结果为一份报告；write 为 True 时写入 report.json"""
+    job = load_job(job_dir)
+    report = ShardReport(chunks=job.chunks, total=job.total)
+    started, finished = [], []
+    for chunk in range(job.chunks):
+        path = os.path.join(job_dir, "done", f"{_chunk_name(chunk)}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data: Dict[str, Any] = json.load(f)
+        except FileNotFoundError:
+            report.missing.append(chunk)
+            continue
+        result = ChunkResult(**data)
+        report.done += 1
+        report.ok += result.ok
+        report.fail += result.fail
+        report.bytes += result.bytes
+        report.reclaimed += 1 if result.generation > 0 else 0
+        report.workers[result.worker] = report.workers.get(result.worker, 0) + 1
+        started.append(result.started)
+        finished.append(result.finished)
+    if started:
+        report.elapsed = max(finished) - min(started)
+    if write:
+        _write_atomic(os.path.join(job_dir, "report.json"), json.dumps(asdict(report), ensure_ascii=False, indent=2))
+    return report
@@ -0,0 +1,191 @@
+"""
+按目标文件大小编码 JPEG/WebP：逐张搜索不超过目标字节数的最高质量。
+
+1. 把合成结果缩小成代理图（最长边 PROXY_SIZE），在若干质量下编码代理图，
+   得到"质量 -> 字节数"曲线；按面积换算成全尺寸的初始大小模型（代理图编码很便宜）
+2. 用模型预测满足目标的质量，做一次全尺寸编码；用实际大小校准模型的比例系数后再预测，
+   预测值始终落在已知"合格"与"超标"质量之间（区间逐次收窄）
+3. 合格结果已接近目标、区间收窄到相邻质量或全尺寸编码次数用完时停止；
+   预算只剩最后一次且还没有合格结果时按略小的目标预测，尽量保证有合格输出
+"""
+
+import bisect
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+
+SIZE_TARGET_FORMATS = {"JPEG", "WEBP"}
+QUALITY_LIMITS = {"JPEG": (1, 95), "WEBP": (0, 100)}  # 各格式可用的质量范围（JPEG 高于 95 收益很小）
+MIN_QUALITY = 20  # 搜索的最低质量，再低画质不可接受
+DEFAULT_MAX_ENCODES = 4  # 每张图片全尺寸编码次数的上限
+PROXY_SIZE = 512  # 代理图边长
+PROXY_GRID = 8  # 代理图由 8 x 8 个原分辨率小块拼成（每块 64 像素）
+PROXY_POINTS = 8  # 代理图编码的质量点数
+TOLERANCE = 0.03  # 合格结果达到目标的 97% 即停止
+LAST_TRY_MARGIN = 0.92  # 最后一次编码时按目标的 92% 预测
+
+
+@dataclass
+class SizeFit:
+    """一张图片的目标大小搜索结果"""
+    data: bytes
+    quality: int
+    encodes: int  # 全尺寸编码次数（不含代理图）
+    proxy_encodes: int
+    fits: bool  # 是否不超过目标；为 False 时 data 为最小的一次编码
+
+
+class SizeModel:
+    """由代理图的"质量 -> 字节数"曲线推算全尺寸输出大小：overhead + 比例系数(q) * 代理字节数(q)
+
+    比例系数初始为按面积换算的常数；每次全尺寸编码后记录该质量下的实际比例，
+    之后在已测质量之间按对数线性插值（两端取最近的实测值），代理曲线与全尺寸曲线形状不同时也能逐步逼近。
+    """
+
+    def __init__(self, proxy_sizes: Dict[int, int], scale: float, overhead: int = 0) -> None:
+        self.qualities = sorted(proxy_sizes)
+        self.logs = [math.log(max(1, proxy_sizes[q])) for q in self.qualities]
+        self.scale = scale
+        self.overhead = overhead
+        self._measured: Dict[int, float] = {}  # 质量 -> log(实际比例)
+
+    @staticmethod
+    def _interp(xs: List[int], ys: List[float], x: float) -> float:
+        if len(xs) == 1:
+            return ys[0]
+        i = min(max(1, bisect.bisect_left(xs, x)), len(xs) - 1)
+        t = (x - xs[i - 1]) / (xs[i] - xs[i - 1])
+        return ys[i - 1] + (ys[i] - ys[i - 1]) * t
+
+    def _proxy(self, quality: float) -> float:
+        """代理图在 quality 下的字节数，对数空间线性插值（两端外推）"""
+        return math.exp(self._interp(self.qualities, self.logs, quality))
+
+    def _scale(self, quality: float) -> float:
+        if not self._measured:
+            return self.scale
+        qs = sorted(self._measured)
+        quality = min(max(quality, qs[0]), qs[-1])
+        return math.exp(self._interp(qs, [self._measured[q] for q in qs], quality))
+
+    def predict(self, quality: int) -> float:
+        return self.overhead + self._scale(quality) * self._proxy(quality)
+
+    def calibrate(self, quality: int, actual: int) -> None:
+        """记录一次全尺寸编码的实际大小"""
+        payload = actual - self.overhead
+        if payload > 0:
+            self._measured[quality] = math.log(payload / self._proxy(quality))
+
+    def quality_for(self, target: float, low: int, high: int) -> int:
+        """[low, high] 中预测大小不超过 target 的最高质量；都超标时返回 low"""
+        if self.predict(high) <= target:
+            return high
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.predict(mid) <= target:
+                low = mid
+            else:
+                high = mid - 1
+        return low
+
+
+def make_proxy(img: Image.Image, size: int = PROXY_SIZE) -> Image.Image:
+    """代理图：从整幅图均匀取 PROXY_GRID x PROXY_GRID 块原分辨率小块拼成 size x size 的马赛克
+
+    不用整体缩小：缩小会抹掉噪点和细纹理，而这些正是 JPEG/WebP 体积的主要来源；
+    原分辨率的小块保留了每像素的细节量，块边长是 16 的倍数，与编码块对齐。
+    """
+    if img.width * img.height <= size * size:
+        return img
+    block = size // PROXY_GRID
+    bw, bh = min(block, img.width), min(block, img.height)
+    proxy = Image.new(img.mode, (bw * PROXY_GRID, bh * PROXY_GRID))
+    for row in range(PROXY_GRID):
+        y = (img.height - bh) * row // (PROXY_GRID - 1)
+        for col in range(PROXY_GRID):
+            x = (img.width - bw) * col // (PROXY_GRID - 1)
+            proxy.paste(img.crop((x, y, x + bw, y + bh)), (col * bw, row * bh))
+    return proxy
+
+
+def build_model(img: Image.Image, encode: Callable[[Image.Image, int], bytes], quality_range: Tuple[int, int],
+                overhead: int = 0) -> Tuple[SizeModel, int]:
+    """编码代理图建立大小模型，返回 (模型, 代理编码次数)"""
+    low, high = quality_range
+    proxy = make_proxy(img)
+    points = sorted({round(low + (high - low) * i / (PROXY_POINTS - 1)) for i in range(PROXY_POINTS)})
+    sizes = {q: len(encode(proxy, q)) for q in points}
+    ratio = (img.width * img.height) / (proxy.width * proxy.height)
+    return SizeModel(sizes, ratio, overhead), len(points)
+
+
+def fit_quality(img: Image.Image, target: int, encode: Callable[[int], bytes],
+                encode_proxy: Callable[[Image.Image, int], bytes], quality_range: Tuple[int, int],
+                max_encodes: int = DEFAULT_MAX_ENCODES, overhead: int = 0) -> SizeFit:
+    """搜索 quality_range 内编码后不超过 target 字节的最高质量
+
+    encode(q) 编码全尺寸图（含元数据），encode_proxy(image, q) 编码代理图（不含元数据）；
+    overhead 为元数据等与质量无关的字节数。全尺寸编码至多 max_encodes 次。
+    """
+    low, high = quality_range
+    model, proxy_encodes = build_model(img, encode_proxy, quality_range, overhead)
+    best: Optional[Tuple[int, bytes]] = None  # 合格的最高质量
+    smallest: Optional[Tuple[int, bytes]] = None  # 超标时最小的一次
+    fit_q, over_q = low - 1, high + 1  # 已知合格的最高质量 / 已知超标的最低质量
+    encodes = 0
+    quality = model.quality_for(target, low, high)
+    for _ in range(max(1, max_encodes)):
+        data = encode(quality)
+        encodes += 1
+        if len(data) <= target:
+            fit_q = quality
+            best = (quality, data)
+            if len(data) >= target * (1 - TOLERANCE):
+                break
+        else:
+            over_q = quality
+            if smallest is None or len(data) < len(smallest[1]):
+                smallest = (quality, data)
+        if fit_q + 1 >= over_q or fit_q >= high or over_q <= low:
+            break
+        model.calibrate(quality, len(data))
+        goal = target * LAST_TRY_MARGIN if best is None and encodes == max_encodes - 1 else target
+        quality = model.quality_for(goal, fit_q + 1, over_q - 1)
+    if best is not None:
+        return SizeFit(best[1], best[0], encodes, proxy_encodes, True)
+    return SizeFit(smallest[1], smallest[0], encodes, proxy_encodes, False)
+
+
+@dataclass
+class SizeReport:
+    """一次导出中目标大小搜索的统计；各线程共用，内部加锁"""
+    target: int  # 字节
+    images: int = 0
+    encodes: int = 0
+    proxy_encodes: int = 0
+    misses: List[str] = field(default_factory=list)  # 最低质量仍超标的输出
+    per_image: List[Tuple[str, int, int, int]] = field(default_factory=list)  # (输出名, 质量, 编码次数, 字节数)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, name: str, fit: SizeFit) -> None:
+        with self._lock:
+            self.images += 1
+            self.encodes += fit.encodes
+            self.proxy_encodes += fit.proxy_encodes
+            self.per_image.append((name, fit.quality, fit.encodes, len(fit.data)))
+            if not fit.fits:
+                self.misses.append(name)
+
+    def summary(self) -> str:
+        if not self.images:
+            return f"目标大小 {self.target // 1024} KB：没有需要搜索的输出"
+        text = (f"目标大小 {self.target // 1024} KB：{self.images} 个输出，全尺寸编码 {self.encodes} 次"
+                f"（平均 {self.encodes / self.images:.1f} 次/张），代理图编码 {self.proxy_encodes} 次")
+        if self.misses:
+            text += f"，{len(self.misses)} 个在最低质量下仍超标"
+        return text
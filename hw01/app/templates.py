@@ -0,0 +1,144 @@
+"""
+模板与导出设置的互相转换。
+
+GUI 保存的模板（~/.watermark_tool/templates/*.json）记录的是界面控件的值，
+这里把它们换算成与界面导出完全一致的 ExportSettings，供无界面场景（服务、脚本）使用。
+"""
+
+import json
+import os
+from dataclasses import asdict, fields
+from typing import Any, Dict, List, Optional, Tuple
+
+from .exporter import ExportSettings, Rendition
+
+
+TEMPLATE_DIR = os.path.join(os.path.expanduser("~"), ".watermark_tool", "templates")
+
+# 与任何一张具体图片/输出目录无关的字段，不参与设置的比较与缓存键
+_PER_RUN_FIELDS = {"input_paths", "output_dir"}
+
+
+def template_path(name: str, tpl_dir: str = TEMPLATE_DIR) -> str:
+    """模板文件路径（去掉文件名中的非法字符）"""
+    safe = "".join(c for c in name if c not in '\\/:*?"<>|').strip()
+    return os.path.join(tpl_dir, f"{safe}.json")
+
+
+def load_template(name: str, tpl_dir: str = TEMPLATE_DIR) -> Dict[str, Any]:
+    """读取模板字典；不存在时抛出 FileNotFoundError"""
+    with open(template_path(name, tpl_dir), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def parse_renditions(text: str) -> Tuple[Rendition, ...]:
+    """界面上的规格宽度（逗号分隔，如 "3840,1920,1024,320"）-> 多规格设置，文件名后缀为 _宽度"""
+    widths = []
+    for part in (text or "").replace("，", ",").split(","):
+        part = part.strip()
+        if part:
+            width = int(part)
+            if width <= 0:
+                raise ValueError(f"无效的规格宽度：{part}")
+            if width not in widths:
+                widths.append(width)
+    return tuple((w, f"_{w}", "", None) for w in widths)
+
+
+def settings_from_template(data: Dict[str, Any], input_paths: Optional[List[str]] = None,
+                           output_dir: str = "") -> ExportSettings:
+    """把界面模板字典换算为 ExportSettings（与 WatermarkApp._collect_settings 保持一致）"""
+    naming = data.get("naming_rule", ["keep", ""])
+    naming = (naming[0], naming[1]) if naming[0] in ("prefix", "suffix") else ("keep", "")
+
+    if data.get("resize_mode") == "width":
+        resize_mode, resize_value = "width", int(data.get("resize_value") or 1920)
+    else:
+        resize_mode, resize_value = "none", None
+
+    img_scale = data.get("img_wm_scale", ["percent", 30, None, None])
+    if img_scale[0] == "percent":
+        img_scale = ("percent", img_scale[1], None, None)
+    else:
+        img_scale = ("size", None, img_scale[2] or 200, img_scale[3] or 200)
+
+    r, g, b = tuple(data.get("wm_color_rgba", [255, 255, 255, 128]))[:3]
+    a = int(data.get("text_opacity", 50) / 100 * 255)
+
+    position = data.get("position", "bottom-right")
+    if data.get("tile_mode"):
+        position_mode = "tile"
+    elif position == "auto":
+        position_mode = "auto"
+    else:
+        position_mode = "preset"
+    spacing = int(data.get("tile_spacing", 120))
+    output_format = data.get("output_format", "PNG")
+
+    return ExportSettings(
+        input_paths=list(input_paths or []),
+        output_dir=output_dir,
+        output_format=output_format,
+        jpeg_quality=data.get("jpeg_quality", 90) if output_format in ("JPEG", "WEBP") else None,
+        naming_rule=naming,
+        resize_mode=resize_mode,
+        resize_value=resize_value,
+        wm_text=data.get("wm_text", ""),
+        wm_font_family=data.get("wm_font_family", "Microsoft YaHei"),
+        wm_font_size=int(data.get("wm_font_size", 32)),
+        wm_bold=bool(data.get("wm_bold", False)),
+        wm_italic=bool(data.get("wm_italic", False)),
+        wm_color_rgba=(r, g, b, a),
+        wm_shadow=bool(data.get("wm_shadow", False)),
+        wm_outline=bool(data.get("wm_outline", False)),
+        wm_color_mode="adaptive" if data.get("adaptive_color") else "fixed",
+        img_wm_path=data.get("img_wm_path", ""),
+        img_wm_scale=img_scale,
+        img_wm_opacity=int(data.get("img_opacity", 60)),
+        position_mode=position_mode,
+        preset_position=position,
+        rotation_deg=float(data.get("rotation", 0)),
+        tile_spacing=(spacing, spacing),
+        tile_stagger=0.5 if data.get("tile_stagger", True) else 0.0,
+        tile_angle_deg=float(data.get("tile_angle", 30)),
+        wm_use_text=bool(data.get("wm_use_text", True)),
+        wm_use_image=bool(data.get("wm_use_image", False)),
+        dedup=bool(data.get("dedup", False)),
+        target_kb=int(data.get("target_kb", 0) or 0),
+        invisible_payload=data.get("invisible_payload", ""),
+        invisible_key=data.get("invisible_key", ""),
+        seen_mode=data.get("seen_mode", "record"),
+        hash_index=data.get("hash_index", ""),
+        renditions=parse_renditions(data.get("renditions", "")) if data.get("resize_mode") == "renditions" else (),
+    )
+
+
+def settings_to_dict(settings: ExportSettings) -> Dict[str, Any]:
+    """ExportSettings -> 可 JSON 序列化的字典（不含输入列表和输出目录）"""
+    data = asdict(settings)
+    for name in _PER_RUN_FIELDS:
+        data.pop(name, None)
+    return data
+
+
+def settings_from_dict(data: Dict[str, Any], base: Optional[ExportSettings] = None) -> ExportSettings:
+    """按字段名构造 ExportSettings；给出 base 时只覆盖 data 中出现的字段。未知字段报 ValueError"""
+    known = {f.name: f for f in fields(ExportSettings)}
+    unknown = sorted(set(data) - set(known))
+    if unknown:
+        raise ValueError(f"未知的设置字段：{', '.join(unknown)}")
+    values = asdict(base) if base is not None else {
+        "input_paths": [], "output_dir": "", "output_format": "JPEG", "jpeg_quality": 90,
+        "naming_rule": ("keep", ""), "resize_mode": "none", "resize_value": None,
+    }
+    values.update(data)
+    # JSON 只有列表，元组字段转回元组
+    for name, value in values.items():
+        if isinstance(value, list) and name not in _PER_RUN_FIELDS:
+            values[name] = tuple(tuple(v) if isinstance(v, list) else v for v in value)
+    return ExportSettings(**values)
+
+
+def settings_key(settings: ExportSettings) -> str:
+    """设置的规范 JSON 文本，可用作缓存键或跨进程传递"""
+    return json.dumps(settings_to_dict(settings), sort_keys=True, ensure_ascii=False)
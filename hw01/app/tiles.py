@@ -0,0 +1,151 @@
+"""
+导出分辨率下的分块预览（100%/200% 缩放与平移）。
+
+导出底图（与 Exporter 相同的解码、缩放与方向处理）只解码一次；
+水印叠加层及其位置也只确定一次（自动位置、自适应颜色需要整幅图像），
+之后每个图块只裁剪底图并合成与之相交的叠加层，结果与完整导出的对应区域逐像素一致。
+平移时不再可见的图块任务在开始前即被取消。
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from PIL import Image
+
+from .compositing import composite_layers
+from .exporter import Exporter
+from .metadata import display_size
+from .probe import read_header
+from .tokens import has_tokens
+from .utils import LruCache
+
+
+TILE_SIZE = 256
+
+TileKey = Tuple[int, int]  # (列, 行)
+
+
+class TileRenderer:
+    """按需渲染某张图片在当前设置下的导出分辨率图块，结果按图块缓存"""
+
+    def __init__(self, exporter: Exporter, path: str, index: int = 1, workers: int = 2,
+                 base_cache: Optional[LruCache] = None, tile_size: int = TILE_SIZE) -> None:
+        header = read_header(path, with_meta=True)
+        if header is None:
+            raise ValueError(f"无法识别的图像：{path}")
+        self.exporter = exporter
+        self.path = path
+        self.header = header
+        self.index = index
+        self.tile_size = tile_size
+        # 导出尺寸只由文件头决定，不需要解码
+        self.size = exporter.target_size(*display_size(header.width, header.height, header.orientation))
+        self._base_cache = base_cache if base_cache is not None else LruCache(1)
+        self._base: Optional[Image.Image] = None
+        self._entries = None
+        self._backend = "pillow"
+        self._prepare_lock = threading.Lock()
+        self._tiles = LruCache(256)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._pending: Dict[TileKey, Future] = {}
+        self._wanted = set()
+        self._lock = threading.Lock()
+        self.rendered = 0
+
+    @property
+    def grid(self) -> Tuple[int, int]:
+        t = self.tile_size
+        return -(-self.size[0] // t), -(-self.size[1] // t)
+
+    def tile_box(self, key: TileKey) -> Tuple[int, int, int, int]:
+        t = self.tile_size
+        x0, y0 = key[0] * t, key[1] * t
+        return x0, y0, min(x0 + t, self.size[0]), min(y0 + t, self.size[1])
+
+    def tiles_in(self, box: Tuple[int, int, int, int]) -> List[TileKey]:
+        """与 box（导出坐标 x0, y0, x1, y1）相交的图块，从中心向外排列，先渲染视野中央"""
+        t = self.tile_size
+        cols, rows = self.grid
+        c0, r0 = max(0, box[0] // t), max(0, box[1] // t)
+        c1, r1 = min(cols - 1, (box[2] - 1) // t), min(rows - 1, (box[3] - 1) // t)
+        keys = [(c, r) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+        cx, cy = (c0 + c1) / 2, (r0 + r1) / 2
+        keys.sort(key=lambda k: (k[0] - cx) ** 2 + (k[1] - cy) ** 2)
+        return keys
+
+    def cached(self, key: TileKey) -> Optional[Image.Image]:
+        with self._lock:
+            return self._tiles.get(key)
+
+    def _prepare(self) -> None:
+        with self._prepare_lock:
+            if self._entries is not None:
+                return
+            exporter = self.exporter
+            # 换水印设置不必重新解码：底图按路径与缩放设置缓存
+            settings = exporter.settings
+            base_key: Hashable = (self.path, settings.resize_mode, settings.resize_value)
+            base = self._base_cache.get(base_key)
+            if base is None:
+                base, _ = exporter.decode(self.header)
+                self._base_cache.put(base_key, base)
+            dynamic = settings.wm_use_text and has_tokens(settings.wm_text)
+            text = exporter.expand_text(self.header, self.index) if dynamic else None
+            layers = exporter.prepare_layers(base.size, text)
+            self._backend = layers.backend
+            self._entries = exporter.resolve_entries(base, layers) if layers.entries else []
+            self._base = base
+
+    def render_tile(self, key: TileKey) -> Image.Image:
+        """渲染单个图块（导出分辨率，与完整导出的对应区域一致）"""
+        self._prepare()
+        x0, y0, x1, y1 = self.tile_box(key)
+        tile = self._base.crop((x0, y0, x1, y1))
+        # 叠加层坐标平移到图块内，合成时按图块边界裁剪
+        entries = []
+        for overlay, (px, py) in self._entries:
+            ow, oh = overlay.size
+            if px < x1 and py < y1 and px + ow > x0 and py + oh > y0:
+                entries.append((overlay, (px - x0, py - y0)))
+        if entries:
+            tile = composite_layers(tile, entries, self._backend)
+        with self._lock:
+            self._tiles.put(key, tile)
+            self.rendered += 1
+        return tile
+
+    def request(self, keys: List[TileKey], on_done: Callable[[TileKey, Image.Image], None]) -> None:
+        """请求一组可见图块：取消不再可见的待处理任务，提交尚未缓存的图块
+
+        on_done 在工作线程中调用，调用方负责转交到界面线程。
+        """
+        with self._lock:
+            self._wanted = set(keys)
+            for key, future in list(self._pending.items()):
+                if key not in self._wanted and future.cancel():
+                    del self._pending[key]
+            todo = [k for k in keys if k not in self._pending and self._tiles.get(k) is None]
+            for key in todo:
+                self._pending[key] = self._pool.submit(self._job, key, on_done)
+
+    def _job(self, key: TileKey, on_done: Callable[[TileKey, Image.Image], None]) -> None:
+        try:
+            with self._lock:
+                stale = key not in self._wanted
+            if stale:
+                return
+            on_done(key, self.render_tile(key))
+        except Exception as e:
+            print(f"渲染预览图块失败: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def close(self) -> None:
+        with self._lock:
+            self._wanted = set()
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        self._pool.shutdown(wait=False)
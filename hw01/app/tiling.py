@@ -0,0 +1,93 @@
+"""
+平铺（重复）水印。
+
+单个水印只旋转、渲染一次，先拼成一个周期单元（含错位行），
+再用倍增拷贝铺满整幅图层；图层按画布尺寸缓存，
+每张图只需做一次整幅合成，成本与平铺数量无关。
+"""
+
+from typing import Dict, Iterator, Tuple
+
+from PIL import Image
+
+
+def build_tile_cell(tile: Image.Image, spacing: Tuple[int, int], stagger: float) -> Image.Image:
+    """把单个水印拼成可无缝重复的周期单元（两行，第二行按 stagger 错位）"""
+    if tile.mode != "RGBA":
+        tile = tile.convert("RGBA")
+    tw, th = tile.size
+    gx, gy = max(0, int(spacing[0])), max(0, int(spacing[1]))
+    cw, ch = tw + gx, th + gy
+    shift = int(round((float(stagger) % 1.0) * cw))
+    cell = Image.new("RGBA", (cw, ch * 2), (0, 0, 0, 0))
+    cell.paste(tile, (0, 0))
+    # 错位行向右平移，越界部分绕回左侧，保证水平方向无缝
+    cell.paste(tile, (shift, ch))
+    if shift + tw > cw:
+        cell.paste(tile, (shift - cw, ch))
+    return cell
+
+
+def fill_pattern(cell: Image.Image, size: Tuple[int, int], offset: Tuple[int, int] = (0, 0)) -> Image.Image:
+    """用倍增拷贝把周期单元铺满 size，offset 为图案原点相对画布的偏移"""
+    width, height = size
+    cw, ch = cell.size
+    ox, oy = offset[0] % cw, offset[1] % ch
+    full_w, full_h = width + cw, height + ch
+
+    row = Image.new("RGBA", (full_w, ch), (0, 0, 0, 0))
+    row.paste(cell, (0, 0))
+    filled = cw
+    while filled < full_w:
+        row.paste(row.crop((0, 0, filled, ch)), (filled, 0))
+        filled *= 2
+
+    layer = Image.new("RGBA", (full_w, full_h), (0, 0, 0, 0))
+    layer.paste(row, (0, 0))
+    filled = ch
+    while filled < full_h:
+        layer.paste(layer.crop((0, 0, full_w, filled)), (0, filled))
+        filled *= 2
+
+    # 裁出画布大小；原点落在 (ox, oy)
+    return layer.crop((cw - ox, ch - oy, cw - ox + width, ch - oy + height))
+
+
+def tile_positions(size: Tuple[int, int], tile_size: Tuple[int, int], spacing: Tuple[int, int],
+                   stagger: float) -> Iterator[Tuple[int, int]]:
+    """TilePattern.layer(size) 中与画布相交的各个水印的左上角坐标（不栅格化）"""
+    width, height = size
+    tw, th = tile_size
+    cw, ch = tw + max(0, int(spacing[0])), th + max(0, int(spacing[1]))
+    shift = int(round((float(stagger) % 1.0) * cw))
+    ox, oy = (width - tw) // 2, (height - th) // 2
+    for row in range((-th - oy) // ch, (height - oy) // ch + 1):
+        y = oy + row * ch
+        dx = ox + (shift if row % 2 else 0)
+        for col in range((-tw - dx) // cw, (width - dx) // cw + 1):
+            x = dx + col * cw
+            if x < width and y < height and x + tw > 0 and y + th > 0:
+                yield x, y
+
+
+class TilePattern:
+    """一个水印的平铺图案，整幅图层按画布尺寸缓存"""
+
+    def __init__(self, tile: Image.Image, spacing: Tuple[int, int], stagger: float, max_layers: int = 4) -> None:
+        self.tile_size = tile.size
+        self.cell = build_tile_cell(tile, spacing, stagger)
+        self.max_layers = max_layers
+        self._layers: Dict[Tuple[int, int], Image.Image] = {}
+
+    def layer(self, size: Tuple[int, int]) -> Image.Image:
+        """返回铺满 size 的图层；图案以画布中心对齐"""
+        cached = self._layers.get(size)
+        if cached is not None:
+            return cached
+        tw, th = self.tile_size
+        offset = ((size[0] - tw) // 2, (size[1] - th) // 2)
+        layer = fill_pattern(self.cell, size, offset)
+        if len(self._layers) >= self.max_layers:
+            self._layers.pop(next(iter(self._layers)))
+        self._layers[size] = layer
+        return layer
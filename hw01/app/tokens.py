@@ -0,0 +1,62 @@
+"""
+文本水印占位符，例如 ``{date}``、``{datetime:%Y}``、``{filename}``、
+``{camera}``、``{lens}``、``{iso}``、``{index}``。
+"""
+
+import os
+import re
+import string
+from typing import Any, Dict, Optional
+
+from .probe import ImageMeta
+
+
+TOKENS = ("date", "datetime", "filename", "camera", "lens", "iso", "index")
+
+_TOKEN_RE = re.compile(r"\{(%s)(?::([^{}]*))?\}" % "|".join(TOKENS))
+
+
+def has_tokens(template: str) -> bool:
+    """文本中是否含有需要逐张展开的占位符"""
+    return bool(template) and _TOKEN_RE.search(template) is not None
+
+
+class _TokenFormatter(string.Formatter):
+    """缺失值输出为空；格式说明不适用时由调用方保留原文"""
+
+    def format_field(self, value, format_spec):
+        if value is None:
+            return ""
+        return super().format_field(value, format_spec)
+
+
+_formatter = _TokenFormatter()
+
+
+def token_values(path: str, meta: Optional[ImageMeta], index: int) -> Dict[str, Any]:
+    meta = meta or ImageMeta()
+    return {
+        "date": meta.taken.strftime("%Y-%m-%d") if meta.taken else "",
+        "datetime": meta.taken,
+        "filename": os.path.splitext(os.path.basename(path))[0],
+        "camera": meta.camera,
+        "lens": meta.lens,
+        "iso": meta.iso,
+        "index": index,
+    }
+
+
+def expand_text(template: str, path: str, meta: Optional[ImageMeta], index: int) -> str:
+    """按单张图片的信息展开占位符；index 从 1 开始"""
+    if not has_tokens(template):
+        return template
+    values = token_values(path, meta, index)
+
+    def replace(match: "re.Match") -> str:
+        # 只替换已知占位符，其余文本（包括多余的花括号、未知占位符）原样保留
+        try:
+            return _formatter.format_field(values[match.group(1)], match.group(2) or "")
+        except (ValueError, TypeError):
+            return match.group(0)
+
+    return _TOKEN_RE.sub(replace, template)
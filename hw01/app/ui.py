@@ -1,20 +1,57 @@
 import os
 import sys
 import json
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, colorchooser
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from PIL import Image, ImageTk, ImageDraw
 
-from .utils import is_supported_image_path, unique_paths_preserve_order, generate_thumbnail, render_text_overlay
+from .utils import LruCache, is_supported_image_path, unique_paths_preserve_order, generate_thumbnail
 from .exporter import ExportSettings, Exporter
+from .invisible import PAYLOAD_BYTES
+from .phash import Match, check_files, open_index
+from .probe import ImageHeader, ImageMeta, read_header
+from .preview import PreviewRenderer
+from .pyramid import ImagePyramid
+from .tiles import TileKey, TileRenderer
+from .templates import TEMPLATE_DIR, parse_renditions, settings_key, template_path
+from .bundles import BUNDLE_EXT, TemplateBundle, build_bundle, load_bundle
+
+# 已加水印检测：界面显示的名称 -> ExportSettings.seen_mode
+SEEN_MODE_LABELS = {"标记": "flag", "跳过": "skip", "仅记录": "record", "关闭": "off"}
 
 
 class PreviewCanvas(tk.Canvas):
     """预览画布 - 支持拖动水印"""
+    # Ctrl+滚轮在这些倍数之间切换（相对适应窗口的大小，不超过原图分辨率）
+    ZOOM_STEPS = (1.0, 1.5, 2.0, 3.0, 4.0)
+    
     def __init__(self, parent):
         super().__init__(parent, bg='#2b2b2b', highlightthickness=0, cursor='crosshair')
         self.base_image: Optional[Image.Image] = None
+        self.image_path: str = ""
+        # 分辨率金字塔：窗口缩放和预览缩放从缓存的层重新生成，不再解码源文件
+        self.pyramid: Optional[ImagePyramid] = None
+        self._pyramids = LruCache(4)
+        self.zoom_index = 0
+        self._base_key = None
+        self._resize_job = None
+        # 导出分辨率的分块预览：view_zoom 为 1/2 表示 100%/200%，0 表示适应窗口
+        self.view_zoom = 0
+        self.view_origin: Optional[Tuple[float, float]] = None  # 视野左上角（导出坐标），None 表示居中
+        self.settings_provider: Optional[Callable[[], ExportSettings]] = None
+        self._tiles: Optional[TileRenderer] = None
+        self._tiles_key = None
+        self._tile_bases = LruCache(2)  # 导出底图按 (路径, 缩放设置) 缓存，改水印设置不重新解码
+        self._tile_items: Dict[TileKey, list] = {}  # 图块 -> [画布对象, PhotoImage, 是否为最终图块]
+        self._tile_results: "queue.Queue" = queue.Queue()
+        self._tile_poll_job = None
+        self._pan_start: Optional[Tuple[int, int]] = None
+        self.image_meta: Optional[ImageMeta] = None
+        self._header: Optional[ImageHeader] = None
+        self._preview = PreviewRenderer()
         self.preview_photo: Optional[ImageTk.PhotoImage] = None
         self.settings: Optional[dict] = None
         
@@ -31,23 +68,229 @@ class PreviewCanvas(tk.Canvas):
         self.bind('<B1-Motion>', self._on_mouse_drag)
         self.bind('<ButtonRelease-1>', self._on_mouse_up)
         self.bind('<Double-Button-1>', self._on_double_click)
+        self.bind('<Configure>', self._on_resize)
+        self.bind('<Control-MouseWheel>', self._on_zoom_wheel)
+        self.bind('<Control-Button-4>', lambda e: self._step_zoom(1))
+        self.bind('<Control-Button-5>', lambda e: self._step_zoom(-1))
         
     def set_image(self, image_path: str):
         """设置基础图像"""
         try:
-            self.base_image = Image.open(image_path)
-            self.base_image.thumbnail((600, 400), Image.LANCZOS)
+            self.image_path = image_path
+            header = read_header(image_path, with_meta=True)
+            self._header = header
+            self.image_meta = header.meta if header else None
+            pyramid = self._pyramids.get(image_path)
+            if pyramid is None:
+                pyramid = ImagePyramid(image_path)
+                self._pyramids.put(image_path, pyramid)
+            self.pyramid = pyramid
+            self._base_key = None
+            self.view_origin = None
+            self._fit_base()
             self.update_preview()
         except Exception as e:
             print(f"加载图片失败: {e}")
     
+    def clear(self):
+        """清空预览"""
+        self._close_tiles()
+        self.pyramid = None
+        self.base_image = None
+        self._base_key = None
+        self.delete("all")
+    
+    def _canvas_box(self) -> Tuple[int, int]:
+        w, h = self.winfo_width(), self.winfo_height()
+        return (w if w > 1 else 600, h if h > 1 else 400)
+    
+    def _fit_base(self) -> bool:
+        """按画布大小和缩放倍数从金字塔取预览底图；尺寸未变时不重建，返回是否更新"""
+        if self.pyramid is None:
+            return False
+        key = (self._canvas_box(), self.ZOOM_STEPS[self.zoom_index])
+        if key == self._base_key:
+            return False
+        self.base_image = self.pyramid.render(*key)
+        self._base_key = key
+        return True
+    
+    def _on_resize(self, event):
+        """窗口大小变化：合并连续的 Configure 事件后再重建"""
+        if self._resize_job is not None:
+            self.after_cancel(self._resize_job)
+        self._resize_job = self.after(80, self._apply_resize)
+    
+    def _apply_resize(self):
+        self._resize_job = None
+        if self.view_zoom and self._tiles is not None:
+            self._draw_tiles()
+        elif self._fit_base():
+            self.update_preview()
+    
+    def _on_zoom_wheel(self, event):
+        self._step_zoom(1 if event.delta > 0 else -1)
+        return "break"  # 不让右侧设置面板跟着滚动
+    
+    def _step_zoom(self, step: int):
+        if self.view_zoom:
+            self.set_view_zoom(max(1, min(2, self.view_zoom + step)))
+            return
+        index = max(0, min(len(self.ZOOM_STEPS) - 1, self.zoom_index + step))
+        if index != self.zoom_index:
+            self.zoom_index = index
+            if self._fit_base():
+                self.update_preview()
+    
     def update_settings(self, settings: dict):
         """更新水印设置"""
         self.settings = settings
         self.update_preview()
     
+    def set_view_zoom(self, zoom: int):
+        """切换视图：0 适应窗口，1/2 为导出分辨率的 100%/200%（保持视野中心）"""
+        if zoom == self.view_zoom or not self.pyramid:
+            return
+        center = None
+        if self.view_zoom and self._tiles is not None and self.view_origin is not None:
+            cw, ch = self._canvas_box()
+            ox, oy = self.view_origin
+            center = (ox + cw / (2 * self.view_zoom), oy + ch / (2 * self.view_zoom))
+        self.view_zoom = zoom
+        self.delete("all")
+        self._tile_items.clear()
+        if zoom == 0:
+            self._close_tiles()
+            self.config(cursor='crosshair')
+            self.update_preview()
+            return
+        if not self._ensure_tiles():
+            self.view_zoom = 0
+            self.update_preview()
+            return
+        if center is not None:
+            cw, ch = self._canvas_box()
+            self.view_origin = (center[0] - cw / (2 * zoom), center[1] - ch / (2 * zoom))
+        self.config(cursor='fleur')
+        self._draw_tiles()
+    
+    def _ensure_tiles(self) -> bool:
+        """按当前图片与设置准备图块渲染器；设置变化时换新渲染器，已显示的图块保留到新图块到达"""
+        if self.settings_provider is None or not self.image_path:
+            return False
+        settings = self.settings_provider()
+        index = (self.settings or {}).get('image_index', 1)
+        key = (self.image_path, settings_key(settings), index)
+        if self._tiles is not None and key == self._tiles_key:
+            return True
+        if self._tiles_key is not None and self._tiles_key[0] != self.image_path:
+            # 换了图片：旧图块不能作占位
+            self.delete("tile")
+            self._tile_items.clear()
+        self._close_tiles()
+        try:
+            self._tiles = TileRenderer(Exporter(settings), self.image_path, index, base_cache=self._tile_bases)
+        except Exception as e:
+            print(f"准备分块预览失败: {e}")
+            return False
+        self._tiles_key = key
+        for item in self._tile_items.values():
+            item[2] = False
+        return True
+    
+    def _close_tiles(self):
+        if self._tiles is not None:
+            self._tiles.close()
+        self._tiles = None
+        self._tiles_key = None
+    
+    def _clamp_origin(self) -> Tuple[float, float]:
+        """视野不超出图像；图像小于画布时居中"""
+        w, h = self._tiles.size
+        cw, ch = self._canvas_box()
+        vw, vh = cw / self.view_zoom, ch / self.view_zoom
+        ox, oy = self.view_origin if self.view_origin is not None else ((w - vw) / 2, (h - vh) / 2)
+        ox = (w - vw) / 2 if vw >= w else max(0.0, min(w - vw, ox))
+        oy = (h - vh) / 2 if vh >= h else max(0.0, min(h - vh, oy))
+        self.view_origin = (ox, oy)
+        return ox, oy
+    
+    def _draw_tiles(self):
+        """摆放可见图块：已缓存的直接显示，其余先用金字塔中的低分辨率图占位并提交渲染"""
+        tiles = self._tiles
+        z = self.view_zoom
+        cw, ch = self._canvas_box()
+        ox, oy = self._clamp_origin()
+        keys = tiles.tiles_in((int(ox), int(oy), int(ox + cw / z) + 1, int(oy + ch / z) + 1))
+        visible = set(keys)
+        for key in list(self._tile_items):
+            if key not in visible:
+                self.delete(self._tile_items.pop(key)[0])
+        for key in keys:
+            x0, y0, _, _ = tiles.tile_box(key)
+            sx, sy = round((x0 - ox) * z), round((y0 - oy) * z)
+            item = self._tile_items.get(key)
+            if item is not None:
+                self.coords(item[0], sx, sy)
+                if item[2]:
+                    continue
+            tile = tiles.cached(key)
+            if item is None or tile is not None:
+                photo = ImageTk.PhotoImage(self._display_tile(tile) if tile is not None else self._placeholder(key))
+                if item is None:
+                    item = [self.create_image(sx, sy, anchor=tk.NW, image=photo, tags="tile"), photo, False]
+                    self._tile_items[key] = item
+                else:
+                    self.itemconfig(item[0], image=photo)
+                    item[1] = photo
+                item[2] = tile is not None
+        renderer = tiles
+        tiles.request([k for k in keys if not self._tile_items[k][2]],
+                      lambda key, img: self._tile_results.put((renderer, key, img)))
+        if self._tile_poll_job is None:
+            self._tile_poll_job = self.after(15, self._poll_tiles)
+    
+    def _display_tile(self, tile: Image.Image) -> Image.Image:
+        if self.view_zoom > 1:
+            # 200% 按最近邻放大，便于检查描边和旋转锯齿
+            tile = tile.resize((tile.width * self.view_zoom, tile.height * self.view_zoom), Image.NEAREST)
+        return tile
+    
+    def _placeholder(self, key: TileKey) -> Image.Image:
+        """占位图：从已缓存的金字塔层裁剪放大（不含水印，真实图块到达后替换）"""
+        x0, y0, x1, y1 = self._tiles.tile_box(key)
+        z = self.view_zoom
+        pyramid = self.pyramid
+        fit_scale = self.base_image.width / pyramid.size[0] if self.base_image else 1.0 / 8
+        level = pyramid.level(pyramid.level_for(fit_scale))
+        f = level.width / self._tiles.size[0]
+        box = (int(x0 * f), int(y0 * f), max(int(x0 * f) + 1, int(x1 * f)), max(int(y0 * f) + 1, int(y1 * f)))
+        return level.crop(box).resize(((x1 - x0) * z, (y1 - y0) * z), Image.BILINEAR)
+    
+    def _poll_tiles(self):
+        """在界面线程中接收渲染好的图块（Tk 不是线程安全的）"""
+        self._tile_poll_job = None
+        while True:
+            try:
+                renderer, key, tile = self._tile_results.get_nowait()
+            except queue.Empty:
+                break
+            item = self._tile_items.get(key)
+            if renderer is not self._tiles or item is None or item[2]:
+                continue
+            photo = ImageTk.PhotoImage(self._display_tile(tile))
+            self.itemconfig(item[0], image=photo)
+            item[1] = photo
+            item[2] = True
+        if self.view_zoom and any(not item[2] for item in self._tile_items.values()):
+            self._tile_poll_job = self.after(15, self._poll_tiles)
+    
     def update_preview(self):
         """更新预览"""
+        if self.view_zoom:
+            if self._ensure_tiles():
+                self._draw_tiles()
+            return
         if not self.base_image:
                     return
         
@@ -81,157 +324,21 @@ class PreviewCanvas(tk.Canvas):
             )
     
     def _apply_watermarks(self, img: Image.Image) -> Tuple[Image.Image, Optional[Tuple[int, int, int, int]]]:
-        """应用水印到图像，返回 (图像, 水印矩形)"""
-        settings = self.settings
-        watermark_rect = None
-        
-        if not settings:
+        """按导出几何合成水印（比例、位置与导出结果一致），返回 (图像, 水印矩形)"""
+        if self.settings_provider is None or self._header is None:
             return img, None
-        
-        # 图片水印
-        if settings.get('use_image_wm') and settings.get('img_wm_path'):
-            img, rect = self._apply_image_watermark(img, settings)
-            if rect:
-                watermark_rect = rect
-        
-        # 文本水印
-        if settings.get('use_text_wm') and settings.get('wm_text'):
-            img, rect = self._apply_text_watermark(img, settings)
-            if rect:
-                watermark_rect = rect
-        
-        return img, watermark_rect
-    
-    def _apply_image_watermark(self, img: Image.Image, settings: dict) -> Tuple[Image.Image, Optional[Tuple[int, int, int, int]]]:
-        """应用图片水印，返回 (图像, 水印矩形)"""
         try:
-            wm_path = settings['img_wm_path']
-            if not os.path.isfile(wm_path):
-                return img, None
-            
-            wm = Image.open(wm_path).convert('RGBA')
-            
-            # 缩放
-            if settings['img_scale_mode'] == 'percent':
-                percent = settings['img_percent']
-                target_w = max(1, int(img.width * (percent / 100.0)))
-                ratio = target_w / wm.width
-                target_h = max(1, int(wm.height * ratio))
-                wm = wm.resize((target_w, target_h), Image.LANCZOS)
-            else:
-                w, h = settings['img_width'], settings['img_height']
-                wm = wm.resize((w, h), Image.LANCZOS)
-            
-            # 透明度
-            opacity = settings['img_opacity']
-            if opacity < 100:
-                alpha = wm.split()[-1]
-                alpha = alpha.point(lambda p: p * (opacity / 100.0))
-                wm.putalpha(alpha)
-            
-            # 旋转
-            rotation = settings.get('rotation', 0)
-            if rotation != 0:
-                wm = wm.rotate(-rotation, resample=Image.BICUBIC, expand=True)
-            
-            # 位置（手动模式或预设）
-            if self.manual_mode:
-                pos = self._compute_manual_position(img.size, wm.size)
-            else:
-                pos = self._compute_position(img.size, wm.size, settings['position'])
-            
-            img.alpha_composite(wm, dest=pos)
-            
-            # 返回水印矩形 (x, y, width, height)
-            return img, (pos[0], pos[1], wm.width, wm.height)
-            
+            return self._preview.render(self.settings_provider(), img, self._header,
+                                        self.settings.get('image_index', 1))
         except Exception as e:
-            print(f"应用图片水印失败: {e}")
-        
+            print(f"应用水印失败: {e}")
         return img, None
     
-    def _apply_text_watermark(self, img: Image.Image, settings: dict) -> Tuple[Image.Image, Optional[Tuple[int, int, int, int]]]:
-        """应用文本水印，返回 (图像, 水印矩形)"""
-        try:
-            text = settings['wm_text']
-            if not text:
-                return img, None
-            
-            # 渲染文本
-            r, g, b, _ = settings['wm_color']
-            a = int(settings['text_opacity'] / 100 * 255)
-            
-            text_overlay = render_text_overlay(
-                text=text,
-                font_family=settings['font_family'],
-                point_size=settings['font_size'],
-                bold=settings['font_bold'],
-                italic=settings['font_italic'],
-                rgba=(r, g, b, a),
-                shadow=settings['wm_shadow'],
-                outline=settings['wm_outline']
-            )
-            
-            # 旋转
-            rotation = settings.get('rotation', 0)
-            if rotation != 0:
-                text_overlay = text_overlay.rotate(-rotation, resample=Image.BICUBIC, expand=True)
-            
-            # 位置（手动模式或预设）
-            if self.manual_mode:
-                pos = self._compute_manual_position(img.size, text_overlay.size)
-            else:
-                pos = self._compute_position(img.size, text_overlay.size, settings['position'])
-            
-            img.alpha_composite(text_overlay, dest=pos)
-            
-            # 返回水印矩形
-            return img, (pos[0], pos[1], text_overlay.width, text_overlay.height)
-            
-        except Exception as e:
-            print(f"应用文本水印失败: {e}")
-        
-        return img, None
-    
-    def _compute_position(self, base_size: Tuple[int, int], wm_size: Tuple[int, int], 
-                         position: str) -> Tuple[int, int]:
-        """计算水印位置"""
-        bw, bh = base_size
-        ww, wh = wm_size
-        margin = max(8, int(min(bw, bh) * 0.02))
-        
-        positions = {
-            'top-left': (margin, margin),
-            'top-center': ((bw - ww) // 2, margin),
-            'top-right': (bw - ww - margin, margin),
-            'center-left': (margin, (bh - wh) // 2),
-            'center': ((bw - ww) // 2, (bh - wh) // 2),
-            'center-right': (bw - ww - margin, (bh - wh) // 2),
-            'bottom-left': (margin, bh - wh - margin),
-            'bottom-center': ((bw - ww) // 2, bh - wh - margin),
-            'bottom-right': (bw - ww - margin, bh - wh - margin),
-        }
-        
-        return positions.get(position, positions['bottom-right'])
-    
-    def _compute_manual_position(self, base_size: Tuple[int, int], wm_size: Tuple[int, int]) -> Tuple[int, int]:
-        """计算手动位置"""
-        bw, bh = base_size
-        ww, wh = wm_size
-        
-        # 归一化坐标转换为像素坐标
-        nx, ny = self.manual_pos_norm
-        px = int(nx * bw)
-        py = int(ny * bh)
-        
-        # 限制在图像范围内
-        px = max(0, min(bw - ww, px))
-        py = max(0, min(bh - wh, py))
-        
-        return (px, py)
-    
     def _on_mouse_down(self, event):
         """鼠标按下事件"""
+        if self.view_zoom:
+            self._pan_start = (event.x, event.y)
+            return
         if not self.watermark_rect or not self.base_image:
             return
         
@@ -257,6 +364,15 @@ class PreviewCanvas(tk.Canvas):
     
     def _on_mouse_drag(self, event):
         """鼠标拖动事件"""
+        if self.view_zoom:
+            # 平移视野；移出视野的图块任务会被取消
+            if self._pan_start is not None and self._tiles is not None:
+                dx, dy = event.x - self._pan_start[0], event.y - self._pan_start[1]
+                self._pan_start = (event.x, event.y)
+                ox, oy = self._clamp_origin()
+                self.view_origin = (ox - dx / self.view_zoom, oy - dy / self.view_zoom)
+                self._draw_tiles()
+            return
         if not self.dragging or not self.base_image or not self.watermark_rect:
             return
         
@@ -296,12 +412,16 @@ class PreviewCanvas(tk.Canvas):
     
     def _on_mouse_up(self, event):
         """鼠标释放事件"""
+        self._pan_start = None
         if self.dragging:
             self.dragging = False
             self.config(cursor='crosshair')
     
     def _on_double_click(self, event):
-        """双击重置为预设位置"""
+        """双击重置为预设位置；分块预览中双击回到适应窗口"""
+        if self.view_zoom:
+            self.set_view_zoom(0)
+            return
         self.manual_mode = False
         self.manual_pos_norm = (0.8, 0.8)
         self.update_preview()
@@ -325,9 +445,17 @@ class WatermarkApp:
         self.current_image_index = -1
         
         # 模板目录
-        self.tpl_dir = os.path.join(os.path.expanduser("~"), ".watermark_tool", "templates")
+        self.tpl_dir = TEMPLATE_DIR
         os.makedirs(self.tpl_dir, exist_ok=True)
         self.last_file = os.path.join(self.tpl_dir, "last.json")
+        self.bundle: Optional[TemplateBundle] = None
+        
+        # 已加水印检测：后台线程检查新导入的图片，结果经队列回到界面线程
+        self.seen_matches: Dict[str, Match] = {}
+        self._seen_results: "queue.Queue" = queue.Queue()
+        self._seen_generation = 0  # 清空列表后丢弃旧检查的结果
+        self._seen_pending = 0
+        self._seen_poll_job = None
         
         self._build_ui()
         self._load_last_settings()
@@ -355,6 +483,12 @@ class WatermarkApp:
         
         self.preview_canvas = PreviewCanvas(preview_container)
         self.preview_canvas.pack(fill=tk.BOTH, expand=True)
+        self.preview_canvas.settings_provider = lambda: self._build_settings([], "")
+        
+        # 适应窗口 / 导出分辨率 100%、200%（拖动平移）
+        for text, zoom in (("200%", 2), ("100%", 1), ("适应", 0)):
+            ttk.Button(preview_header, text=text, width=5,
+                       command=lambda z=zoom: self.preview_canvas.set_view_zoom(z)).pack(side=tk.RIGHT, padx=1)
         
         # 图片列表
         list_label = ttk.Label(left_frame, text="图片列表", font=("Arial", 10, "bold"))
@@ -378,6 +512,11 @@ class WatermarkApp:
         ttk.Button(list_btn_frame, text="导入图片", command=self._import_files).pack(side=tk.LEFT, padx=2)
         ttk.Button(list_btn_frame, text="导入文件夹", command=self._import_folder).pack(side=tk.LEFT, padx=2)
         ttk.Button(list_btn_frame, text="清空", command=self._clear_list).pack(side=tk.LEFT, padx=2)
+        ttk.Button(list_btn_frame, text="移除已加水印", command=self._remove_seen).pack(side=tk.LEFT, padx=2)
+        
+        self.seen_status = tk.StringVar(value="")
+        ttk.Label(left_frame, textvariable=self.seen_status, foreground='#c0392b',
+                  font=("Arial", 8)).pack(fill=tk.X, padx=5)
         
         # === 右侧：设置面板 ===
         right_frame = ttk.Frame(main_paned)
@@ -415,15 +554,32 @@ class WatermarkApp:
         
         ttk.Label(output_group, text="输出格式:").grid(row=1, column=0, sticky=tk.W, pady=2)
         self.output_format = tk.StringVar(value="PNG")
-        ttk.Combobox(output_group, textvariable=self.output_format, values=["PNG", "JPEG"], 
+        ttk.Combobox(output_group, textvariable=self.output_format, values=["PNG", "JPEG", "WEBP"], 
                      state="readonly", width=10).grid(row=1, column=1, sticky=tk.W, padx=5)
         
-        ttk.Label(output_group, text="JPEG质量:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        ttk.Label(output_group, text="JPEG/WebP质量:").grid(row=2, column=0, sticky=tk.W, pady=2)
         self.jpeg_quality = tk.IntVar(value=90)
         ttk.Scale(output_group, from_=0, to=100, variable=self.jpeg_quality, 
                   orient=tk.HORIZONTAL, command=lambda _: self._update_preview()).grid(row=2, column=1, sticky=tk.EW, padx=5)
         ttk.Label(output_group, textvariable=self.jpeg_quality).grid(row=2, column=2)
         
+        # JPEG/WebP 按目标文件大小逐张搜索质量（质量滑块为上限），0 表示不限
+        ttk.Label(output_group, text="目标大小(KB):").grid(row=3, column=0, sticky=tk.W, pady=2)
+        self.target_kb = tk.IntVar(value=0)
+        ttk.Spinbox(output_group, from_=0, to=100000, increment=50, textvariable=self.target_kb,
+                    width=8).grid(row=3, column=1, sticky=tk.W, padx=5)
+        
+        # 相同内容的图片只渲染一次，其余输出从第一份硬链接
+        self.dedup = tk.BooleanVar(value=False)
+        ttk.Checkbutton(output_group, text="按内容去重（相同图片只处理一次）",
+                        variable=self.dedup).grid(row=4, column=0, columnspan=3, sticky=tk.W, pady=2)
+        
+        # 导入时检查图片是否像以前导出过的结果（感知哈希），标出或在导出时跳过
+        ttk.Label(output_group, text="已加水印检测:").grid(row=5, column=0, sticky=tk.W, pady=2)
+        self.seen_mode = tk.StringVar(value="仅记录")
+        ttk.Combobox(output_group, textvariable=self.seen_mode, values=list(SEEN_MODE_LABELS),
+                     state="readonly", width=10).grid(row=5, column=1, sticky=tk.W, padx=5)
+        
         output_group.columnconfigure(1, weight=1)
         
         # === 命名规则 ===
@@ -457,6 +613,13 @@ class WatermarkApp:
         self.width_value = tk.IntVar(value=1920)
         ttk.Spinbox(width_frame, from_=1, to=10000, textvariable=self.width_value, width=8).pack(side=tk.LEFT, padx=5)
         
+        # 多规格：一次解码输出多个宽度，文件名加 _宽度 后缀
+        renditions_frame = ttk.Frame(resize_group)
+        renditions_frame.pack(fill=tk.X)
+        ttk.Radiobutton(renditions_frame, text="多规格", variable=self.resize_mode, value="renditions").pack(side=tk.LEFT)
+        self.renditions_text = tk.StringVar(value="3840,1920,1024,320")
+        ttk.Entry(renditions_frame, textvariable=self.renditions_text, width=20).pack(side=tk.LEFT, padx=5)
+        
         # === 水印类型 ===
         wm_type_group = ttk.LabelFrame(scrollable_frame, text="水印类型", padding=10)
         wm_type_group.pack(fill=tk.X, padx=5, pady=5)
@@ -469,6 +632,20 @@ class WatermarkApp:
         ttk.Checkbutton(wm_type_group, text="使用图片水印", variable=self.use_image_wm,
                        command=self._update_preview).pack(anchor=tk.W)
         
+        # === 隐形水印（嵌入 DCT 中频系数，肉眼不可见，可用 main.py detect 读出）===
+        invisible_group = ttk.LabelFrame(scrollable_frame, text="隐形水印", padding=10)
+        invisible_group.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(invisible_group, text="载荷:").grid(row=0, column=0, sticky=tk.W, pady=2)
+        self.invisible_payload = tk.StringVar(value="")
+        ttk.Entry(invisible_group, textvariable=self.invisible_payload, width=25).grid(row=0, column=1, sticky=tk.EW, padx=5)
+        ttk.Label(invisible_group, text="密钥:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        self.invisible_key = tk.StringVar(value="")
+        ttk.Entry(invisible_group, textvariable=self.invisible_key, width=25).grid(row=1, column=1, sticky=tk.EW, padx=5)
+        ttk.Label(invisible_group, text=f"载荷最多 {PAYLOAD_BYTES} 字节（如客户 ID），留空不嵌入；需要 numpy",
+                 font=("Arial", 8), foreground='gray', wraplength=260).grid(row=2, column=0, columnspan=2, sticky=tk.W)
+        invisible_group.columnconfigure(1, weight=1)
+        
         # === 文本水印设置 ===
         text_wm_group = ttk.LabelFrame(scrollable_frame, text="文本水印", padding=10)
         text_wm_group.pack(fill=tk.X, padx=5, pady=5)
@@ -478,6 +655,8 @@ class WatermarkApp:
         text_entry = ttk.Entry(text_wm_group, textvariable=self.wm_text, width=25)
         text_entry.grid(row=0, column=1, columnspan=2, sticky=tk.EW, padx=5)
         text_entry.bind('<KeyRelease>', lambda e: self._update_preview())
+        ttk.Label(text_wm_group, text="占位符: {date} {datetime:%Y} {filename} {camera} {lens} {iso} {index}",
+                 font=("Arial", 8), foreground='gray', wraplength=260).grid(row=7, column=0, columnspan=3, sticky=tk.W)
         
         ttk.Label(text_wm_group, text="字体:").grid(row=1, column=0, sticky=tk.W, pady=2)
         self.font_family = tk.StringVar(value="Microsoft YaHei")
@@ -521,6 +700,10 @@ class WatermarkApp:
         ttk.Checkbutton(text_wm_group, text="描边", variable=self.wm_outline,
                        command=self._update_preview).grid(row=6, column=1, sticky=tk.W)
         
+        self.adaptive_color = tk.BooleanVar(value=False)
+        ttk.Checkbutton(text_wm_group, text="自适应颜色", variable=self.adaptive_color,
+                       command=self._update_preview).grid(row=6, column=2, sticky=tk.W)
+        
         text_wm_group.columnconfigure(1, weight=1)
         
         # === 图片水印设置 ===
@@ -579,6 +762,26 @@ class WatermarkApp:
                   orient=tk.HORIZONTAL, command=lambda _: self._update_preview()).grid(row=3, column=1, sticky=tk.EW, padx=5)
         ttk.Label(pos_group, textvariable=self.rotation).grid(row=3, column=2)
         
+        self.tile_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(pos_group, text="平铺", variable=self.tile_mode,
+                       command=self._on_position_change).grid(row=4, column=0, sticky=tk.W)
+        ttk.Radiobutton(pos_group, text="自动避让", variable=self.position,
+                        value="auto", command=self._on_position_change).grid(row=4, column=2, sticky=tk.W)
+        self.tile_stagger = tk.BooleanVar(value=True)
+        ttk.Checkbutton(pos_group, text="错位", variable=self.tile_stagger,
+                       command=self._update_preview).grid(row=4, column=1, sticky=tk.W, padx=5)
+        
+        ttk.Label(pos_group, text="间距:").grid(row=5, column=0, sticky=tk.W, pady=2)
+        self.tile_spacing = tk.IntVar(value=120)
+        ttk.Spinbox(pos_group, from_=0, to=2000, textvariable=self.tile_spacing,
+                    width=8, command=self._update_preview).grid(row=5, column=1, sticky=tk.W, padx=5)
+        
+        ttk.Label(pos_group, text="平铺角度:").grid(row=6, column=0, sticky=tk.W, pady=2)
+        self.tile_angle = tk.IntVar(value=30)
+        ttk.Scale(pos_group, from_=0, to=360, variable=self.tile_angle,
+                  orient=tk.HORIZONTAL, command=lambda _: self._update_preview()).grid(row=6, column=1, sticky=tk.EW, padx=5)
+        ttk.Label(pos_group, textvariable=self.tile_angle).grid(row=6, column=2)
+        
         # === 模板管理 ===
         tpl_group = ttk.LabelFrame(scrollable_frame, text="模板管理", padding=10)
         tpl_group.pack(fill=tk.X, padx=5, pady=5)
@@ -598,6 +801,12 @@ class WatermarkApp:
         ttk.Button(tpl_btn_frame, text="载入", command=self._load_template, width=6).pack(side=tk.LEFT, padx=1)
         ttk.Button(tpl_btn_frame, text="删除", command=self._delete_template, width=6).pack(side=tk.LEFT, padx=1)
         
+        # 模板包：内嵌 logo 与预渲染叠加层，可拷贝到其他机器
+        bundle_frame = ttk.Frame(tpl_group)
+        bundle_frame.grid(row=2, column=0, columnspan=3, sticky=tk.W, pady=2)
+        ttk.Button(bundle_frame, text="导出模板包", command=self._export_bundle).pack(side=tk.LEFT, padx=1)
+        ttk.Button(bundle_frame, text="导入模板包", command=self._import_bundle).pack(side=tk.LEFT, padx=1)
+        
         tpl_group.columnconfigure(1, weight=1)
         
         # === 导出按钮 ===
@@ -635,6 +844,7 @@ class WatermarkApp:
             'text_opacity': self.text_opacity.get(),
             'wm_shadow': self.wm_shadow.get(),
             'wm_outline': self.wm_outline.get(),
+            'adaptive_color': self.adaptive_color.get(),
             'img_wm_path': self.img_wm_path.get(),
             'img_scale_mode': self.img_scale_mode.get(),
             'img_percent': self.img_percent.get(),
@@ -643,12 +853,17 @@ class WatermarkApp:
             'img_opacity': self.img_opacity.get(),
             'position': self.position.get(),
             'rotation': self.rotation.get(),
+            'tile_mode': self.tile_mode.get(),
+            'tile_spacing': self.tile_spacing.get(),
+            'tile_stagger': 0.5 if self.tile_stagger.get() else 0.0,
+            'tile_angle': self.tile_angle.get(),
+            'image_index': max(0, self.current_image_index) + 1,
         }
         self.preview_canvas.update_settings(settings)
     
     def _import_files(self):
         """导入图片文件"""
-        filetypes = [("图像文件", "*.png *.jpg *.jpeg *.bmp *.tif *.tiff"), ("所有文件", "*.*")]
+        filetypes = [("图像文件", "*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.gif *.webp"), ("所有文件", "*.*")]
         files = filedialog.askopenfilenames(title="选择图片", filetypes=filetypes)
         if files:
             self._add_files(list(files))
@@ -670,10 +885,14 @@ class WatermarkApp:
     def _add_files(self, files: List[str]):
         """添加文件到列表"""
         files = unique_paths_preserve_order(files)
+        added = []
         for f in files:
             if f not in self.image_paths:
                 self.image_paths.append(f)
                 self.image_listbox.insert(tk.END, os.path.basename(f))
+                added.append(f)
+        if added and self._seen_mode() in ("flag", "skip"):
+            self._start_seen_check(added)
         
         # 自动选择第一张
         if self.current_image_index == -1 and self.image_paths:
@@ -685,8 +904,81 @@ class WatermarkApp:
         self.image_paths.clear()
         self.image_listbox.delete(0, tk.END)
         self.current_image_index = -1
-        self.preview_canvas.base_image = None
-        self.preview_canvas.delete("all")
+        self.preview_canvas.clear()
+        self.seen_matches.clear()
+        self._seen_generation += 1
+        self._seen_pending = 0
+        self.seen_status.set("")
+    
+    def _seen_mode(self) -> str:
+        return SEEN_MODE_LABELS.get(self.seen_mode.get(), "record")
+    
+    def _start_seen_check(self, paths: List[str]):
+        """在后台线程中检查新导入的图片（首次检查时加载索引，可能较慢）"""
+        generation = self._seen_generation
+        self._seen_pending += len(paths)
+        self.seen_status.set(f"正在检查是否已加水印（{self._seen_pending} 张）…")
+        
+        def work():
+            try:
+                for path, match in check_files(open_index(), paths):
+                    self._seen_results.put((generation, path, match))
+            except Exception:
+                pass  # 索引不可读时不影响导入
+            finally:
+                self._seen_results.put((generation, None, len(paths)))
+        
+        threading.Thread(target=work, daemon=True).start()
+        if self._seen_poll_job is None:
+            self._seen_poll_job = self.root.after(100, self._poll_seen)
+    
+    def _poll_seen(self):
+        """在界面线程中接收检查结果，把疑似已加水印的图片标红（Tk 不是线程安全的）"""
+        self._seen_poll_job = None
+        while True:
+            try:
+                generation, path, match = self._seen_results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self._seen_generation:
+                continue
+            if path is None:
+                self._seen_pending -= match
+            elif match is not None and path in self.image_paths:
+                self.seen_matches[path] = match
+                self.image_listbox.itemconfig(self.image_paths.index(path), foreground='#c0392b')
+        if self._seen_pending > 0:
+            self._seen_poll_job = self.root.after(100, self._poll_seen)
+        self._update_seen_status()
+    
+    def _update_seen_status(self):
+        if self._seen_pending > 0:
+            self.seen_status.set(f"正在检查是否已加水印（{self._seen_pending} 张）…")
+        elif self.seen_matches:
+            path, match = next(iter(self.seen_matches.items()))
+            hint = "导出时将跳过" if self._seen_mode() == "skip" else "已标红"
+            self.seen_status.set(f"{len(self.seen_matches)} 张疑似已加过水印，{hint}"
+                                 f"（如 {os.path.basename(path)} 像 {os.path.basename(match.path)}）")
+        else:
+            self.seen_status.set("")
+    
+    def _remove_seen(self):
+        """从列表中移除疑似已加水印的图片"""
+        if not self.seen_matches:
+            return
+        keep = [p for p in self.image_paths if p not in self.seen_matches]
+        self.seen_matches.clear()
+        self.image_paths = []
+        self.image_listbox.delete(0, tk.END)
+        self.current_image_index = -1
+        self.preview_canvas.clear()
+        for f in keep:
+            self.image_paths.append(f)
+            self.image_listbox.insert(tk.END, os.path.basename(f))
+        if self.image_paths:
+            self.image_listbox.selection_set(0)
+            self._on_image_select(None)
+        self._update_seen_status()
     
     def _choose_output_dir(self):
         """选择输出目录"""
@@ -732,6 +1024,22 @@ class WatermarkApp:
             messagebox.showwarning("提示", "为防止覆盖原图，禁止导出到源目录")
             return None
         
+        # 多规格
+        renditions = ()
+        if self.resize_mode.get() == "renditions":
+            try:
+                renditions = parse_renditions(self.renditions_text.get())
+            except ValueError:
+                messagebox.showwarning("提示", "多规格宽度应为逗号分隔的正整数，如 3840,1920,1024")
+                return None
+            if not renditions:
+                messagebox.showwarning("提示", "请填写多规格宽度")
+                return None
+        
+        return self._build_settings(self.image_paths[:], output, renditions)
+    
+    def _build_settings(self, input_paths: List[str], output_dir: str, renditions=()) -> ExportSettings:
+        """按界面当前的值构造 ExportSettings（不做校验；预览也用它得到与导出一致的设置）"""
         # 命名规则
         rule = self.naming_rule.get()
         if rule == "prefix":
@@ -742,8 +1050,7 @@ class WatermarkApp:
             naming = ("keep", "")
         
         # 尺寸
-        resize = self.resize_mode.get()
-        if resize == "width":
+        if self.resize_mode.get() == "width":
             resize_mode, resize_value = "width", self.width_value.get()
         else:
             resize_mode, resize_value = "none", None
@@ -759,14 +1066,19 @@ class WatermarkApp:
         a = int(self.text_opacity.get() / 100 * 255)
         
         # 获取位置模式
-        position_mode = "manual" if self.preview_canvas.manual_mode else "preset"
+        if self.tile_mode.get():
+            position_mode = "tile"
+        elif self.position.get() == "auto" and not self.preview_canvas.manual_mode:
+            position_mode = "auto"
+        else:
+            position_mode = "manual" if self.preview_canvas.manual_mode else "preset"
         manual_pos = self.preview_canvas.manual_pos_norm if self.preview_canvas.manual_mode else (0.8, 0.8)
         
         return ExportSettings(
-            input_paths=self.image_paths[:],
-            output_dir=output,
+            input_paths=input_paths,
+            output_dir=output_dir,
             output_format=self.output_format.get(),
-            jpeg_quality=self.jpeg_quality.get() if self.output_format.get() == "JPEG" else None,
+            jpeg_quality=self.jpeg_quality.get() if self.output_format.get() in ("JPEG", "WEBP") else None,
             naming_rule=naming,
             resize_mode=resize_mode,
             resize_value=resize_value,
@@ -778,6 +1090,7 @@ class WatermarkApp:
             wm_color_rgba=(r, g, b, a),
             wm_shadow=self.wm_shadow.get(),
             wm_outline=self.wm_outline.get(),
+            wm_color_mode="adaptive" if self.adaptive_color.get() else "fixed",
             img_wm_path=self.img_wm_path.get(),
             img_wm_scale=img_scale,
             img_wm_opacity=self.img_opacity.get(),
@@ -785,10 +1098,25 @@ class WatermarkApp:
             preset_position=self.position.get(),
             manual_pos_norm=manual_pos,
             rotation_deg=float(self.rotation.get()),
+            tile_spacing=(self.tile_spacing.get(), self.tile_spacing.get()),
+            tile_stagger=0.5 if self.tile_stagger.get() else 0.0,
+            tile_angle_deg=float(self.tile_angle.get()),
             wm_use_text=self.use_text_wm.get(),
             wm_use_image=self.use_image_wm.get(),
+            dedup=self.dedup.get(),
+            renditions=renditions,
+            target_kb=self._target_kb(),
+            invisible_payload=self.invisible_payload.get().strip(),
+            invisible_key=self.invisible_key.get(),
+            seen_mode=self._seen_mode(),
         )
     
+    def _target_kb(self) -> int:
+        try:
+            return max(0, int(self.target_kb.get()))
+        except (tk.TclError, ValueError):
+            return 0
+    
     def _export(self):
         """开始导出"""
         settings = self._collect_settings()
@@ -796,9 +1124,17 @@ class WatermarkApp:
             return
         
         try:
-            exporter = Exporter(settings)
+            # 最近导入的模板包：设置未改动时直接使用包内预渲染的叠加层
+            exporter = self.bundle.exporter(settings) if self.bundle is not None else Exporter(settings)
             ok_count, fail_count = exporter.export_all()
-            messagebox.showinfo("完成", f"导出完成：成功 {ok_count} 张，失败 {fail_count} 张")
+            message = f"导出完成：成功 {ok_count} 张，失败 {fail_count} 张\n{exporter.stats.summary()}\n{exporter.write_stats.summary()}"
+            if exporter.dedup_report is not None:
+                message += f"\n{exporter.dedup_report.summary()}"
+            if exporter.size_report is not None:
+                message += f"\n{exporter.size_report.summary()}"
+            if exporter.seen_report is not None:
+                message += f"\n{exporter.seen_report.summary()}"
+            messagebox.showinfo("完成", message)
         except Exception as e:
             messagebox.showerror("错误", f"导出失败：{e}")
     
@@ -850,10 +1186,41 @@ class WatermarkApp:
         except Exception as e:
             messagebox.showerror("错误", f"删除失败：{e}")
     
+    def _export_bundle(self):
+        """把当前设置导出为模板包"""
+        name = self.tpl_name.get().strip() or self.tpl_list.get() or "template"
+        path = filedialog.asksaveasfilename(title="导出模板包", initialfile=f"{name}{BUNDLE_EXT}",
+                                            defaultextension=BUNDLE_EXT,
+                                            filetypes=[("模板包", f"*{BUNDLE_EXT}")])
+        if not path:
+            return
+        try:
+            content_hash = build_bundle(self._collect_template_dict(), path)
+            messagebox.showinfo("提示", f"模板包已导出\n内容哈希：{content_hash[:16]}")
+        except Exception as e:
+            messagebox.showerror("错误", f"导出失败：{e}")
+
+    def _import_bundle(self):
+        """导入模板包：保存为同名模板并应用，导出时直接使用包内预渲染的叠加层"""
+        path = filedialog.askopenfilename(title="导入模板包", filetypes=[("模板包", f"*{BUNDLE_EXT}")])
+        if not path:
+            return
+        try:
+            bundle = load_bundle(path)
+            name = os.path.splitext(os.path.basename(path))[0]
+            with open(self._tpl_path(name), 'w', encoding='utf-8') as f:
+                json.dump(bundle.template, f, ensure_ascii=False, indent=2)
+            self._apply_template_dict(bundle.template)
+            self.bundle = bundle
+            self._reload_template_list()
+            self.tpl_list.set(name)
+            self._update_preview()
+        except Exception as e:
+            messagebox.showerror("错误", f"导入失败：{e}")
+
     def _tpl_path(self, name: str) -> str:
         """获取模板路径"""
-        safe = "".join(c for c in name if c not in '\\/:*?"<>|').strip()
-        return os.path.join(self.tpl_dir, f"{safe}.json")
+        return template_path(name, self.tpl_dir)
     
     def _reload_template_list(self):
         """重新加载模板列表"""
@@ -878,6 +1245,8 @@ class WatermarkApp:
         resize = self.resize_mode.get()
         if resize == "width":
             resize_mode, resize_value = "width", self.width_value.get()
+        elif resize == "renditions":
+            resize_mode, resize_value = "renditions", None
         else:
             resize_mode, resize_value = "none", None
         
@@ -892,6 +1261,7 @@ class WatermarkApp:
             "naming_rule": list(naming),
             "resize_mode": resize_mode,
             "resize_value": resize_value,
+            "renditions": self.renditions_text.get(),
             "wm_text": self.wm_text.get(),
             "wm_font_family": self.font_family.get(),
             "wm_font_size": self.font_size.get(),
@@ -901,13 +1271,23 @@ class WatermarkApp:
             "text_opacity": self.text_opacity.get(),
             "wm_shadow": self.wm_shadow.get(),
             "wm_outline": self.wm_outline.get(),
+            "adaptive_color": self.adaptive_color.get(),
             "img_wm_path": self.img_wm_path.get(),
             "img_wm_scale": img_scale,
             "img_opacity": self.img_opacity.get(),
             "position": self.position.get(),
             "rotation": self.rotation.get(),
+            "tile_mode": self.tile_mode.get(),
+            "tile_spacing": self.tile_spacing.get(),
+            "tile_stagger": self.tile_stagger.get(),
+            "tile_angle": self.tile_angle.get(),
             "wm_use_text": self.use_text_wm.get(),
             "wm_use_image": self.use_image_wm.get(),
+            "dedup": self.dedup.get(),
+            "target_kb": self._target_kb(),
+            "invisible_payload": self.invisible_payload.get().strip(),
+            "invisible_key": self.invisible_key.get(),
+            "seen_mode": self._seen_mode(),
         }
     
     def _apply_template_dict(self, data: dict):
@@ -929,6 +1309,7 @@ class WatermarkApp:
         self.resize_mode.set(resize_mode)
         if resize_mode == "width":
             self.width_value.set(data.get("resize_value", 1920))
+        self.renditions_text.set(data.get("renditions", "3840,1920,1024,320"))
         
         self.wm_text.set(data.get("wm_text", ""))
         self.font_family.set(data.get("wm_font_family", "Microsoft YaHei"))
@@ -942,6 +1323,7 @@ class WatermarkApp:
         
         self.wm_shadow.set(data.get("wm_shadow", False))
         self.wm_outline.set(data.get("wm_outline", False))
+        self.adaptive_color.set(data.get("adaptive_color", False))
         
         self.img_wm_path.set(data.get("img_wm_path", ""))
         
@@ -957,8 +1339,18 @@ class WatermarkApp:
         self.img_opacity.set(data.get("img_opacity", 60))
         self.position.set(data.get("position", "bottom-right"))
         self.rotation.set(data.get("rotation", 0))
+        self.tile_mode.set(data.get("tile_mode", False))
+        self.tile_spacing.set(data.get("tile_spacing", 120))
+        self.tile_stagger.set(data.get("tile_stagger", True))
+        self.tile_angle.set(data.get("tile_angle", 30))
         self.use_text_wm.set(data.get("wm_use_text", True))
         self.use_image_wm.set(data.get("wm_use_image", False))
+        self.dedup.set(data.get("dedup", False))
+        self.target_kb.set(data.get("target_kb", 0))
+        self.invisible_payload.set(data.get("invisible_payload", ""))
+        self.invisible_key.set(data.get("invisible_key", ""))
+        seen_mode = data.get("seen_mode", "record")
+        self.seen_mode.set(next((k for k, v in SEEN_MODE_LABELS.items() if v == seen_mode), "仅记录"))
     
     def _save_last_settings(self):
         """保存上次设置"""
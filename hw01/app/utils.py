@@ -1,9 +1,12 @@
+import io
 import os
-from typing import Iterable, List, Tuple
+from collections import OrderedDict
+from functools import lru_cache
+from typing import IO, Any, Hashable, Iterable, List, Optional, Tuple
 from PIL import Image, ImageDraw, ImageFont
 
 
-SUPPORTED_EXTS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}
+SUPPORTED_EXTS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".gif", ".webp"}
 
 
 def is_supported_image_path(path: str) -> bool:
@@ -22,6 +25,85 @@ def unique_paths_preserve_order(paths: Iterable[str]) -> List[str]:
     return result
 
 
+class MemoryReader(io.RawIOBase):
+    """只读、可 seek 的内存缓冲区视图；包装 bytearray/memoryview 时不复制整个缓冲区"""
+
+    def __init__(self, buffer) -> None:
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        chunk = self._view[self._pos:self._pos + len(b)]
+        n = len(chunk)
+        memoryview(b).cast("B")[:n] = chunk
+        self._pos += n
+        return n
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+def as_stream(source) -> IO[bytes]:
+    """bytes/bytearray/memoryview/文件对象 -> 可 seek 的二进制流（尽量不复制）"""
+    if isinstance(source, bytes):
+        return io.BytesIO(source)  # BytesIO 与 bytes 共享内存，写入前不复制
+    if isinstance(source, (bytearray, memoryview)):
+        return MemoryReader(source)
+    if hasattr(source, "read"):
+        if hasattr(source, "seekable") and not source.seekable():
+            return io.BytesIO(source.read())
+        return source
+    raise TypeError(f"不支持的图像来源类型：{type(source).__name__}")
+
+
+class LruCache:
+    """按最近使用淘汰的小型缓存"""
+
+    def __init__(self, capacity: int = 64) -> None:
+        self.capacity = capacity
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        return list(self._data.items())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
 def generate_thumbnail(path: str, max_size: int = 96) -> Image.Image:
     """生成缩略图"""
     with Image.open(path) as im:
@@ -29,21 +111,9 @@ def generate_thumbnail(path: str, max_size: int = 96) -> Image.Image:
         return im.copy()
 
 
-def render_text_overlay(
-    text: str,
-    font_family: str,
-    point_size: int,
-    bold: bool,
-    italic: bool,
-    rgba: Tuple[int, int, int, int],
-    shadow: bool,
-    outline: bool,
-) -> Image.Image:
-    """渲染文本水印为 PIL Image"""
-    if not text:
-        return Image.new("RGBA", (1, 1), (0, 0, 0, 0))
-
-    # 尝试加载字体
+@lru_cache(maxsize=32)
+def load_font(font_family: str, point_size: int) -> ImageFont.ImageFont:
+    """加载字体；按 (字体, 字号) 缓存，长驻进程中只解析一次字体文件"""
     try:
         # Windows 系统字体路径
         if font_family == "Microsoft YaHei" or font_family == "微软雅黑":
@@ -56,23 +126,57 @@ def render_text_overlay(
             font_path = None
         
         if font_path and os.path.exists(font_path):
-            font = ImageFont.truetype(font_path, point_size)
-        else:
-            font = ImageFont.load_default()
+            return ImageFont.truetype(font_path, point_size)
+        return _default_font(point_size)
     except:
-        font = ImageFont.load_default()
+        return _default_font(point_size)
+
+
+def _default_font(point_size: int) -> ImageFont.ImageFont:
+    """内置字体；Pillow 10.1+ 可按字号缩放，否则退回固定大小的位图字体"""
+    try:
+        return ImageFont.load_default(point_size)
+    except (TypeError, OSError, ImportError):
+        return ImageFont.load_default()
+
 
-    # 计算文本大小
+def _text_layout(text: str, font, shadow: bool, outline: bool) -> Tuple[int, int, int]:
+    """文本水印图层的 (宽, 高, 边距)"""
     dummy = Image.new("RGBA", (1, 1))
     draw = ImageDraw.Draw(dummy)
     bbox = draw.textbbox((0, 0), text, font=font)
     text_w = bbox[2] - bbox[0]
     text_h = bbox[3] - bbox[1]
-    
     # 添加边距
     pad = 6 if (shadow or outline) else 4
-    w = text_w + pad * 2
-    h = text_h + pad * 2
+    return text_w + pad * 2, text_h + pad * 2, pad
+
+
+def text_overlay_size(text: str, font_family: str, point_size: int, shadow: bool, outline: bool) -> Tuple[int, int]:
+    """render_text_overlay 的输出尺寸（只测量，不栅格化）"""
+    if not text:
+        return 1, 1
+    w, h, _ = _text_layout(text, load_font(font_family, point_size), shadow, outline)
+    return w, h
+
+
+def render_text_overlay(
+    text: str,
+    font_family: str,
+    point_size: int,
+    bold: bool,
+    italic: bool,
+    rgba: Tuple[int, int, int, int],
+    shadow: bool,
+    outline: bool,
+    outline_rgb: Tuple[int, int, int] = (0, 0, 0),
+) -> Image.Image:
+    """渲染文本水印为 PIL Image"""
+    if not text:
+        return Image.new("RGBA", (1, 1), (0, 0, 0, 0))
+
+    font = load_font(font_family, point_size)
+    w, h, pad = _text_layout(text, font, shadow, outline)
 
     # 创建透明图像
     img = Image.new("RGBA", (w, h), (0, 0, 0, 0))
@@ -90,7 +194,7 @@ def render_text_overlay(
 
     # 绘制描边
     if outline:
-        outline_color = (0, 0, 0, a)
+        outline_color = (*outline_rgb, a)
         for dx, dy in ((-1, -1), (-1, 1), (1, -1), (1, 1), (-2, 0), (2, 0), (0, -2), (0, 2)):
             draw.text((x + dx, y + dy), text, font=font, fill=outline_color)
 
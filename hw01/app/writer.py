@@ -0,0 +1,194 @@
+"""
+输出写入阶段：编码好的字节交给写线程池落盘。
+
+每个文件先写入同目录下的临时文件，再用 os.replace 原子改名，中途崩溃不会留下
+被截断的输出。两种模式：
+- durable：文件内容 fsync 后再改名；目录项的 fsync 按批合并，每个目录每批只做一次
+- fast：不做 fsync，仍然原子改名（掉电时可能丢失最近写入的文件，但不会出现半个文件）
+写入与编码并行；待写字节数有上限，超过时 submit 阻塞，内存占用不会无限增长。
+"""
+
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Set
+
+
+WRITE_MODES = ("durable", "fast")
+_counter = itertools.count()
+
+
+@dataclass
+class WriteStats:
+    files: int = 0
+    bytes: int = 0
+    failed: int = 0
+    file_fsyncs: int = 0
+    dir_fsyncs: int = 0
+    elapsed: float = 0.0  # 第一次提交到最后一次 flush 的墙钟时间
+
+    @property
+    def bytes_per_s(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"写出 {self.files} 个文件 {self.bytes / 1e6:.1f} MB，"
+                f"{self.bytes_per_s / 1e6:.1f} MB/s，fsync {self.file_fsyncs}+{self.dir_fsyncs} 次")
+
+
+def _fsync_dir(path: str) -> bool:
+    # Windows 不能打开目录做 fsync，NTFS 的改名由日志保证
+    if os.name == "nt":
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return True
+
+
+class OutputWriter:
+    """后台写文件：临时文件 + 原子改名，按批合并目录 fsync"""
+
+    def __init__(self, mode: str = "durable", threads: int = 2, max_pending_bytes: int = 256 * 1024 * 1024,
+                 batch_files: int = 256) -> None:
+        if mode not in WRITE_MODES:
+            raise ValueError(f"未知的写入模式：{mode}")
+        self.mode = mode
+        self.batch_files = batch_files
+        self.max_pending_bytes = max_pending_bytes
+        self.stats = WriteStats()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="writer")
+        self._cond = threading.Condition()
+        self._pending_bytes = 0
+        self._futures: List[Future] = []
+        self._dirty_dirs: Set[str] = set()
+        self._since_sync = 0
+        self._started = 0.0
+
+    def submit(self, path: str, data: bytes) -> Future:
+        """提交一个文件；待写字节超过上限时阻塞等待"""
+        size = len(data)
+        with self._cond:
+            if not self._started:
+                self._started = time.perf_counter()
+            while self._pending_bytes and self._pending_bytes + size > self.max_pending_bytes:
+                self._cond.wait()
+            self._pending_bytes += size
+        future = self._pool.submit(self._write, path, data)
+        self._futures.append(future)
+        self._since_sync += 1
+        if self._since_sync >= self.batch_files:
+            self._sync_dirs()
+        return future
+
+    @staticmethod
+    def temp_path(path: str) -> str:
+        """path 同目录下的临时文件名（改名前不会被当作输出）"""
+        folder = os.path.dirname(os.path.abspath(path))
+        return os.path.join(folder, f".{os.path.basename(path)}.{os.getpid()}.{next(_counter)}.tmp")
+
+    def submit_file(self, path: str, tmp: str) -> Future:
+        """提交一个已由调用方直接写好的临时文件（见 temp_path），写线程负责 fsync 与原子改名
+
+        用于逐帧编码的多页输出，编码结果不在内存中整体保存，也不计入待写字节数。
+        """
+        with self._cond:
+            if not self._started:
+                self._started = time.perf_counter()
+        future = self._pool.submit(self._commit_file, path, tmp)
+        self._futures.append(future)
+        self._since_sync += 1
+        if self._since_sync >= self.batch_files:
+            self._sync_dirs()
+        return future
+
+    def _commit_file(self, path: str, tmp: str) -> str:
+        try:
+            size = os.path.getsize(tmp)
+            if self.mode == "durable":
+                with open(tmp, "r+b") as f:
+                    os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            with self._cond:
+                self.stats.failed += 1
+            raise
+        with self._cond:
+            self.stats.files += 1
+            self.stats.bytes += size
+            if self.mode == "durable":
+                self.stats.file_fsyncs += 1
+                self._dirty_dirs.add(os.path.dirname(os.path.abspath(path)))
+        return path
+
+    def _write(self, path: str, data: bytes) -> str:
+        folder = os.path.dirname(os.path.abspath(path))
+        tmp = self.temp_path(path)
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+                if self.mode == "durable":
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            with self._cond:
+                self.stats.failed += 1
+                self._pending_bytes -= len(data)
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self.stats.files += 1
+            self.stats.bytes += len(data)
+            if self.mode == "durable":
+                self.stats.file_fsyncs += 1
+                self._dirty_dirs.add(folder)
+            self._pending_bytes -= len(data)
+            self._cond.notify_all()
+        return path
+
+    def _sync_dirs(self) -> None:
+        """等待已提交的写入完成，并对涉及的目录各做一次 fsync（使改名持久化）"""
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.exception()  # 只等待；错误已计入 stats.failed
+        self._since_sync = 0
+        with self._cond:
+            dirs, self._dirty_dirs = self._dirty_dirs, set()
+        for folder in sorted(dirs):
+            try:
+                if _fsync_dir(folder):
+                    self.stats.dir_fsyncs += 1
+            except OSError:
+                pass
+
+    def flush(self) -> WriteStats:
+        """等待全部写入完成并持久化，返回统计"""
+        self._sync_dirs()
+        if self._started:
+            self.stats.elapsed = time.perf_counter() - self._started
+        return self.stats
+
+    def close(self) -> WriteStats:
+        stats = self.flush()
+        self._pool.shutdown(wait=True)
+        return stats
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -1,13 +1,21 @@
 import sys
-from app.ui import WatermarkApp
+import multiprocessing
 
 
 def main() -> None:
+    # python main.py serve [...]：无界面的 HTTP 水印服务
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from app.server import main as serve
+        sys.exit(serve(sys.argv[2:]))
+    # python main.py archive|bundle|plan|shard ...：命令行子命令
+    if len(sys.argv) > 1 and sys.argv[1] in ("archive", "bundle", "detect", "plan", "seen", "shard"):
+        from app.cli import main as cli
+        sys.exit(cli(sys.argv[1:]))
+    from app.ui import WatermarkApp
     app = WatermarkApp()
     sys.exit(app.run())
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
-
-
@@ -0,0 +1,44 @@
+import io
+import tarfile
+import zipfile
+
+from PIL import Image
+
+from app.archives import ArchiveWriter, zip_date_time
+from app.exporter import Exporter
+from app.templates import settings_from_dict
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 24), (40, 90, 160)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_zip_date_is_clamped():
+    assert zip_date_time(1e8) == (1980, 1, 1, 0, 0, 0)
+    assert zip_date_time(0) == (1980, 1, 1, 0, 0, 0)
+    assert zip_date_time(5e9) == (2107, 12, 31, 23, 59, 58)
+    assert zip_date_time(1.7e9)[0] in (2023, 2024)
+
+
+def test_old_tar_members_export_to_zip(tmp_path):
+    src = tmp_path / "old.tar"
+    with tarfile.open(src, "w") as tf:
+        for name, mtime in (("a.png", 1e8), ("b.png", 0)):
+            data = _png()
+            info = tarfile.TarInfo(name)
+            info.size, info.mtime = len(data), int(mtime)
+            tf.addfile(info, io.BytesIO(data))
+    exporter = Exporter(settings_from_dict({"output_format": "PNG", "seen_mode": "off"}))
+    assert exporter.export_archive([str(src)], str(tmp_path / "out.zip")) == (2, 0)
+    with zipfile.ZipFile(tmp_path / "out.zip") as zf:
+        assert [i.date_time for i in zf.infolist()] == [(1980, 1, 1, 0, 0, 0)] * 2
+
+
+def test_zero_mtime_is_kept_in_tar(tmp_path):
+    writer = ArchiveWriter(str(tmp_path / "out.tar"))
+    writer.add("a.png", _png(), 0)
+    writer.close()
+    with tarfile.open(tmp_path / "out.tar") as tf:
+        assert tf.getmember("a.png").mtime == 0
@@ -0,0 +1,75 @@
+import io
+import json
+import zipfile
+
+import pytest
+from PIL import Image
+
+from app.bundles import build_bundle, load_bundle
+
+TEMPLATE = {"wm_text": "Sample", "adaptive_color": True, "wm_use_image": True, "seen_mode": "off"}
+
+
+@pytest.fixture
+def bundle_path(tmp_path):
+    logo = tmp_path / "logo.png"
+    Image.new("RGBA", (80, 40), (200, 30, 30, 255)).save(logo)
+    path = tmp_path / "t.wmbundle"
+    build_bundle(dict(TEMPLATE, img_wm_path=str(logo)), str(path), widths=(640, 1280))
+    return path
+
+
+def _rewrite(path, edit) -> None:
+    """按 edit(名称, 内容) -> 新内容 改写包内的文件"""
+    with zipfile.ZipFile(path) as zf:
+        items = [(name, zf.read(name)) for name in zf.namelist()]
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, data in items:
+            zf.writestr(name, edit(name, data))
+
+
+def _edit_manifest(path, change) -> None:
+    def edit(name, data):
+        if name != "manifest.json":
+            return data
+        manifest = json.loads(data)
+        change(manifest)
+        return json.dumps(manifest).encode("utf-8")
+    _rewrite(path, edit)
+
+
+def _assert_not_intact(bundle) -> None:
+    assert bundle.fingerprint == ""
+    assert not bundle.text_overlays and not bundle.logo_overlays
+    assert bundle.settings().wm_text == "Sample"  # 模板本身仍可使用
+
+
+def test_intact_bundle_keeps_overlays(bundle_path, tmp_path):
+    bundle = load_bundle(str(bundle_path), str(tmp_path / "x"))
+    assert bundle.fingerprint
+    assert len(bundle.text_overlays) > 1 and len(bundle.logo_overlays) == 2
+
+
+def test_edited_overlay_png_is_detected(bundle_path, tmp_path):
+    def edit(name, data):
+        if not name.startswith("overlays/text_"):
+            return data
+        with Image.open(io.BytesIO(data)) as im:
+            im = im.convert("RGBA")
+        im.putpixel((0, 0), (1, 2, 3, 255))
+        buf = io.BytesIO()
+        im.save(buf, "PNG")
+        return buf.getvalue()
+    _rewrite(bundle_path, edit)
+    _assert_not_intact(load_bundle(str(bundle_path), str(tmp_path / "x")))
+
+
+@pytest.mark.parametrize("change", [
+    lambda m: m.update(fingerprint="0" * 16),
+    lambda m: m["overlays"][0].update(variant="dark"),
+    lambda m: m["overlays"].pop(),
+    lambda m: m["overlays"].append({"kind": "logo", "size": [9, 9], "file": "overlays/missing.png"}),
+])
+def test_edited_manifest_is_detected(bundle_path, tmp_path, change):
+    _edit_manifest(bundle_path, change)
+    _assert_not_intact(load_bundle(str(bundle_path), str(tmp_path / "x")))
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+from PIL import Image, ImageChops
+
+from app import compositing
+from app.compositing import apply_opacity, blend_into, composite, composite_stack, prepare_overlay
+
+needs_numpy = pytest.mark.skipif(not compositing.HAS_NUMPY, reason="numpy 未安装")
+BACKENDS = ["pillow", pytest.param("numpy", marks=needs_numpy)]
+# 叠加层位置：完全在内、跨越四条边、完全在外
+DESTS = [(10, 8), (-12, -9), (45, 30), (-20, 25), (50, -10), (80, 80)]
+TOLERANCE = 2  # numpy 后端用浮点计算，Pillow 用整数近似，逐通道允许的最大差
+
+
+def _noise(mode: str, size, seed: int, alpha=(0, 255)) -> Image.Image:
+    rng = random.Random(seed)
+    w, h = size
+    img = Image.frombytes("RGB", size, bytes(rng.randrange(256) for _ in range(w * h * 3)))
+    if mode == "RGBA":
+        img.putalpha(Image.frombytes("L", size, bytes(rng.randint(*alpha) for _ in range(w * h))))
+    return img
+
+
+def _reference(base: Image.Image, overlay: Image.Image, dest) -> Image.Image:
+    """Image.alpha_composite 的结果：叠加层先贴到与底图同尺寸的透明图层上（超出部分裁掉）"""
+    layer = Image.new("RGBA", base.size, (0, 0, 0, 0))
+    layer.paste(overlay, dest)
+    return Image.alpha_composite(base.convert("RGBA"), layer)
+
+
+def _max_diff(result: Image.Image, expected: Image.Image) -> int:
+    if result.mode == "RGB":
+        expected = expected.convert("RGB")
+    elif result.mode == "RGBA":
+        # 近乎透明的像素颜色误差会被放大且不可见，按预乘 alpha 比较
+        result, expected = result.convert("RGBa"), expected.convert("RGBa")
+    return max(high for _, high in ImageChops.difference(result, expected).getextrema())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("base_mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("dest", DESTS)
+def test_composite_matches_alpha_composite(backend, base_mode, dest):
+    base = _noise(base_mode, (64, 48), 1, alpha=(128, 255))
+    overlay = _noise("RGBA", (30, 22), 2)
+    expected = _reference(base, overlay, dest)
+    result = composite(base, overlay, dest, backend)
+    assert result.size == base.size
+    assert _max_diff(result, expected) <= TOLERANCE
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("opacity", [100, 60, 5])
+def test_partly_transparent_overlay(backend, opacity):
+    base = _noise("RGB", (64, 48), 3)
+    overlay = _noise("RGBA", (40, 30), 4, alpha=(0, 200))
+    dest = (34, -6)
+    expected = _reference(base, apply_opacity(overlay, opacity), dest)
+    layer = prepare_overlay(overlay, opacity) if backend == "numpy" else apply_opacity(overlay, opacity)
+    assert _max_diff(composite(base, layer, dest, backend), expected) <= TOLERANCE
+
+
+@pytest.mark.parametrize("base_mode", ["RGB", "RGBA"])
+def test_prepared_overlay_is_reusable(base_mode):
+    pytest.importorskip("numpy")
+    base = _noise(base_mode, (64, 48), 5, alpha=(1, 255))
+    overlay = _noise("RGBA", (30, 22), 6)
+    prepared = prepare_overlay(overlay)
+    for dest in DESTS:
+        assert _max_diff(composite(base, prepared, dest, "numpy"), _reference(base, overlay, dest)) <= TOLERANCE
+
+
+@needs_numpy
+@pytest.mark.parametrize("base_mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("dest", DESTS)
+def test_blend_into_matches_alpha_composite(base_mode, dest):
+    import numpy as np
+    base = _noise(base_mode, (64, 48), 7, alpha=(0, 255))
+    overlay = _noise("RGBA", (30, 22), 8)
+    arr = np.array(base)
+    blend_into(arr, prepare_overlay(overlay, 70), dest)
+    expected = _reference(base, apply_opacity(overlay, 70), dest)
+    assert _max_diff(Image.fromarray(arr), expected) <= TOLERANCE
+
+
+@needs_numpy
+@pytest.mark.parametrize("base_mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("dest", [(5, 5), (-8, 30)])
+def test_composite_stack_matches_alpha_composite(base_mode, dest):
+    import numpy as np
+    bases = [_noise(base_mode, (48, 40), 10 + i, alpha=(64, 255)) for i in range(3)]
+    overlay = _noise("RGBA", (24, 18), 9)
+    stack = np.stack([np.array(b) for b in bases])
+    composite_stack(stack, prepare_overlay(overlay), dest)
+    for base, out in zip(bases, stack):
+        assert _max_diff(Image.fromarray(out), _reference(base, overlay, dest)) <= TOLERANCE
+
+
+@needs_numpy
+def test_backends_agree():
+    base = _noise("RGB", (64, 48), 11)
+    overlay = _noise("RGBA", (30, 22), 12)
+    pillow = composite(base, overlay, (40, -5), "pillow")
+    numpy_ = composite(base, overlay, (40, -5), "numpy")
+    assert _max_diff(numpy_, pillow) <= TOLERANCE
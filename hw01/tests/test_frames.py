@@ -0,0 +1,74 @@
+import io
+from typing import List
+
+from PIL import Image, ImageDraw
+
+from app.exporter import Exporter
+from app.frames import write_frames
+from app.templates import settings_from_dict
+
+DURATIONS = [40, 120, 70, 200]
+
+
+def _gif(loop: int = 3) -> bytes:
+    """四帧各不相同、时长各不相同的 GIF（相同的相邻帧会被 Pillow 合并）"""
+    frames = []
+    for i, color in enumerate([(200, 40, 40), (40, 200, 40), (40, 40, 200), (220, 200, 60)]):
+        frame = Image.new("RGB", (160, 120), (30, 30, 30))
+        ImageDraw.Draw(frame).rectangle((10 + 30 * i, 20, 60 + 30 * i, 100), fill=color)
+        frames.append(frame)
+    buf = io.BytesIO()
+    frames[0].save(buf, "GIF", save_all=True, append_images=frames[1:], duration=DURATIONS, loop=loop)
+    return buf.getvalue()
+
+
+def _color_tables(data: bytes) -> List[bool]:
+    """逐块解析 GIF：[是否有全局颜色表, 各帧是否有局部颜色表...]"""
+    def skip_sub_blocks(pos: int) -> int:
+        while data[pos]:
+            pos += data[pos] + 1
+        return pos + 1
+
+    flags = data[10]
+    tables = [bool(flags & 0x80)]
+    pos = 13 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+    while data[pos] != 0x3B:
+        if data[pos] == 0x21:
+            pos = skip_sub_blocks(pos + 2)
+        else:
+            assert data[pos] == 0x2C
+            local = data[pos + 9]
+            tables.append(bool(local & 0x80))
+            pos += 10 + (3 << ((local & 7) + 1) if local & 0x80 else 0)
+            pos = skip_sub_blocks(pos + 1)
+    return tables
+
+
+def _info(data: bytes):
+    with Image.open(io.BytesIO(data)) as im:
+        durations = []
+        for i in range(im.n_frames):
+            im.seek(i)
+            durations.append(im.info["duration"])
+        return im.n_frames, durations, im.info.get("loop")
+
+
+def test_write_frames_keeps_timing_loop_and_one_palette():
+    buf = io.BytesIO()
+    with Image.open(io.BytesIO(_gif())) as im:
+        assert write_frames(im, buf, lambda frame: frame) == 4
+    data = buf.getvalue()
+    assert _info(data) == (4, DURATIONS, 3)
+    # 只有全局颜色表，各帧不再带局部颜色表
+    assert _color_tables(data) == [True, False, False, False, False]
+
+
+def test_exported_gif_is_animated_with_watermark():
+    settings = settings_from_dict({"output_format": "PNG", "seen_mode": "off", "wm_use_text": True,
+                                   "wm_text": "© demo", "resize_mode": "width", "resize_value": 80})
+    result = Exporter(settings).export_bytes(_gif(loop=0), "a.gif")
+    assert _info(result.data) == (4, DURATIONS, 0)
+    assert _color_tables(result.data)[1:] == [False] * 4
+    with Image.open(io.BytesIO(result.data)) as im:
+        assert im.format == "GIF" and im.size == (80, 60)
+        assert len(im.getpalette()) // 3 <= 256
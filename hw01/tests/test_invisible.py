@@ -0,0 +1,49 @@
+import io
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("numpy")
+
+from app import invisible  # noqa: E402
+from app.exporter import Exporter  # noqa: E402
+from app.templates import settings_from_dict  # noqa: E402
+
+
+def _photo(size=(640, 480)) -> Image.Image:
+    # 渐变加噪点，接近照片的系数分布
+    noise = Image.effect_noise(size, 25)
+    gradient = Image.linear_gradient("L").resize(size)
+    return Image.merge("RGB", (Image.blend(gradient, noise, 0.4), noise, gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+
+
+def _jpeg(img: Image.Image, quality: int) -> Image.Image:
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    buf.seek(0)
+    return Image.open(buf)
+
+
+@pytest.mark.parametrize("quality", [95, 75, 60])
+def test_payload_survives_jpeg(quality):
+    marked = invisible.embed(_photo(), "cust-0042", key="k1")
+    result = invisible.detect(_jpeg(marked, quality), key="k1")
+    assert result.payload == "cust-0042"
+    assert result.confidence >= invisible.MIN_CONFIDENCE
+
+
+def test_wrong_key_and_unmarked_image_detect_nothing():
+    marked = _jpeg(invisible.embed(_photo(), "cust-0042", key="k1"), 75)
+    assert invisible.detect(marked, key="k2").payload is None
+    assert invisible.detect(_jpeg(_photo(), 75), key="k1").payload is None
+
+
+def test_exported_jpeg_carries_payload():
+    settings = settings_from_dict({"output_format": "JPEG", "jpeg_quality": 60, "seen_mode": "off",
+                                   "invisible_payload": "客户7", "invisible_key": "secret"})
+    buf = io.BytesIO()
+    _photo().save(buf, "PNG")
+    result = Exporter(settings).export_bytes(buf.getvalue(), "a.png")
+    with Image.open(io.BytesIO(result.data)) as im:
+        assert invisible.detect(im, key="secret").payload == "客户7"
+        assert invisible.detect(im).payload is None
@@ -0,0 +1,30 @@
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+pytest.importorskip("numpy")  # tools/check_preview.py 依赖 numpy
+
+from tools.check_preview import CASES, MIN_IOU, check  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def photo(tmp_path_factory):
+    """2400x1800 的合成照片：双向渐变底色 + 彩色色块 + 轻微噪点，按 JPEG 保存"""
+    w, h = 2400, 1800
+    ramp = Image.linear_gradient("L").resize((w, h))
+    img = Image.merge("RGB", (ramp, ramp.transpose(Image.ROTATE_180), Image.new("L", (w, h), 110)))
+    draw = ImageDraw.Draw(img)
+    for i in range(12):
+        x, y = (i * 397) % w, (i * 613) % h
+        draw.ellipse((x, y, x + 300, y + 220), fill=((i * 50) % 256, (i * 90) % 256, (i * 130) % 256))
+    noise = Image.effect_noise((w, h), 40).convert("RGB")
+    img = Image.blend(img, noise, 0.15).filter(ImageFilter.GaussianBlur(1))
+    path = tmp_path_factory.mktemp("preview") / "photo.jpg"
+    img.save(path, quality=90)
+    return str(path)
+
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_preview_matches_export(photo, name):
+    result = check(photo, CASES[name])
+    assert result["preview_px"] > 500 and result["export_px"] > 500  # 水印确实渲染出来了
+    assert result["iou"] >= MIN_IOU, result
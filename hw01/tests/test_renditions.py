@@ -0,0 +1,55 @@
+import io
+import zipfile
+
+import pytest
+from PIL import Image
+
+from app.exporter import Exporter
+from app.server import HttpError, WatermarkService
+from app.templates import settings_from_dict
+
+RENDITIONS = {"renditions": [[64, "_m", "", None], [32, "_s", "", None]], "output_format": "PNG", "seen_mode": "off"}
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (96, 64), (40, 90, 160)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_folder_export_writes_every_rendition(tmp_path):
+    src = tmp_path / "a.png"
+    src.write_bytes(_png())
+    out = tmp_path / "out"
+    settings = settings_from_dict(RENDITIONS)
+    settings.input_paths, settings.output_dir = [str(src)], str(out)
+    assert Exporter(settings).export_all() == (1, 0)
+    assert sorted(p.name for p in out.iterdir()) == ["a_m.png", "a_s.png"]
+
+
+def test_in_memory_exports_reject_renditions(tmp_path):
+    exporter = Exporter(settings_from_dict(RENDITIONS))
+    with pytest.raises(ValueError):
+        exporter.export_bytes(_png(), "a.png")
+    with pytest.raises(ValueError):
+        exporter.export_many([_png()])
+
+    archive = tmp_path / "in.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.png", _png())
+    exporter.settings.output_dir = str(tmp_path / "out")
+    with pytest.raises(ValueError):
+        exporter.export_archive([str(archive)])
+    assert not (tmp_path / "out").exists()
+
+
+def test_in_memory_export_without_renditions():
+    exporter = Exporter(settings_from_dict({"output_format": "PNG", "seen_mode": "off"}))
+    assert exporter.export_bytes(_png(), "a.png").size == (96, 64)
+
+
+def test_service_rejects_renditions(tmp_path):
+    service = WatermarkService(workers=1, template_dir=str(tmp_path))
+    with pytest.raises(HttpError) as info:
+        service._settings_key("", '{"renditions": [[64, "_m", "", null]]}')
+    assert info.value.status == 400
@@ -0,0 +1,40 @@
+import io
+import zipfile
+from dataclasses import fields
+
+import pytest
+from PIL import Image
+
+from app.exporter import ExportSettings, Exporter
+from app.phash import HashIndex
+from app.templates import settings_from_dict, settings_from_template
+
+
+def test_seen_mode_defaults_agree():
+    default = next(f.default for f in fields(ExportSettings) if f.name == "seen_mode")
+    assert default == "record"
+    # 没有 seen_mode 的旧模板保持原来的行为：只记录输出
+    assert settings_from_template({}).seen_mode == default
+    assert settings_from_dict({}).seen_mode == default
+
+
+def test_archive_failure_flushes_recorded_outputs(tmp_path):
+    archive = tmp_path / "in.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for i in range(12):
+            buf = io.BytesIO()
+            Image.new("RGB", (64 + i, 48), (i * 20, 80, 160)).save(buf, "PNG")
+            zf.writestr(f"p{i}.png", buf.getvalue())
+    index_path = tmp_path / "outputs.phash"
+    settings = settings_from_dict({"output_format": "PNG", "seen_mode": "record", "hash_index": str(index_path),
+                                   "workers": 1})
+    settings.output_dir = str(tmp_path / "out")
+    exporter = Exporter(settings)
+    with pytest.raises(FileNotFoundError):
+        exporter.export_archive([str(archive), str(tmp_path / "missing.png")])
+
+    written = sorted(p.name for p in (tmp_path / "out").iterdir())
+    assert written
+    # 异常之前写出的输出都已写入索引文件
+    index = HashIndex(str(index_path))
+    assert len(index) == len(written)
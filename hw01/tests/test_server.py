@@ -0,0 +1,88 @@
+import asyncio
+import io
+import json
+import os
+import signal
+
+import pytest
+from PIL import Image
+
+from app.server import WatermarkService
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (40, 90, 160)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+async def _request(port: int, target: str, body: bytes = b"", headers: bytes = b""):
+    """发一个 POST（无请求体时为 GET），返回 (状态码, 头部字典, 响应体)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    method = b"POST" if body else b"GET"
+    writer.write(method + b" " + target.encode("ascii") + b" HTTP/1.1\r\nConnection: close\r\n" + headers
+                 + (b"Content-Length: %d\r\n" % len(body) if body else b"") + b"\r\n" + body)
+    await writer.drain()
+    data = await asyncio.wait_for(reader.read(), 60)
+    writer.close()
+    head, _, payload = data.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    fields = dict(line.split(": ", 1) for line in lines[1:])
+    return status, fields, payload
+
+
+@pytest.fixture
+def service(tmp_path):
+    async def run(check):
+        service = WatermarkService(workers=1, template_dir=str(tmp_path))
+        server = await service.start(port=0)
+        try:
+            await check(service, server.sockets[0].getsockname()[1])
+        finally:
+            server.close()
+            await service.close()
+    return lambda check: asyncio.run(run(check))
+
+
+SETTINGS = b'X-Export-Settings: {"output_format": "PNG", "seen_mode": "off"}\r\n'
+
+
+def test_download_name_is_encoded(service):
+    async def check(_, port):
+        status, fields, payload = await _request(port, "/watermark?name=%E7%85%A7.jpg", _png(), SETTINGS)
+        assert status == 200 and payload.startswith(b"\x89PNG")
+        assert fields["Content-Disposition"] == "attachment; filename=\"_.png\"; filename*=UTF-8''%E7%85%A7.png"
+
+        status, fields, _ = await _request(port, "/watermark?name=a%0D%0ASet-Cookie:%20x=1%22.jpg", _png(), SETTINGS)
+        assert status == 200 and "Set-Cookie" not in fields
+        assert fields["Content-Disposition"].startswith('attachment; filename="aSet-Cookie: x=1.png"')
+    service(check)
+
+
+def test_settings_header_is_utf8(service):
+    async def check(_, port):
+        settings = json.dumps({"版权": 1}, ensure_ascii=False).encode("utf-8")
+        status, _, payload = await _request(port, "/watermark", _png(), b"X-Export-Settings: " + settings + b"\r\n")
+        assert status == 400 and "版权" in payload.decode("utf-8")
+    service(check)
+
+
+def test_oversized_header_line(service):
+    async def check(_, port):
+        status, _, _ = await _request(port, "/health", headers=b"X-Long: " + b"a" * 100_000 + b"\r\n")
+        assert status == 431
+        status, _, _ = await _request(port, "/health")
+        assert status == 200
+    service(check)
+
+
+def test_pool_is_rebuilt_after_worker_dies(service):
+    async def check(svc, port):
+        for pid in list(svc._pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        await asyncio.sleep(0.5)
+        statuses = [(await _request(port, "/watermark", _png(), SETTINGS))[0] for _ in range(3)]
+        assert statuses[-1] == 200 and set(statuses) <= {200, 500}
+        assert svc.stats.pool_restarts == 1
+    service(check)
@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from PIL import Image
+
+from app.shards import load_job, merge_report, read_chunk
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETTINGS = json.dumps({"output_format": "PNG", "seen_mode": "off"})
+# 不同子目录中有同名文件
+TREE = ["x.png", "a/x.png", "a/y.png", "b/x.png", "b/c/x.png", "b/c/z.png", "d/x.png", "d/e/x.png"]
+
+
+def _main(*args: str, **kwargs) -> "subprocess.Popen":
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py"), *args], cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **kwargs)
+
+
+def _make_tree(root) -> None:
+    for i, rel in enumerate(TREE):
+        path = root.joinpath(*rel.split("/"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (40 + i, 30), (i * 20, 100, 200)).save(path)
+
+
+def test_workers_mirror_tree_and_take_over_stale_lease(tmp_path):
+    src, out, job = tmp_path / "in", tmp_path / "out", tmp_path / "job"
+    _make_tree(src)
+    plan = _main("shard", "plan", str(src), "-o", str(out), "--job", str(job), "--chunk-size", "2",
+                 "--lease-timeout", "2", "--settings", SETTINGS)
+    assert plan.wait(60) == 0, plan.stdout.read().decode()
+    manifest = load_job(str(job))
+    assert manifest.total == len(TREE) and manifest.chunks == 4
+    assert sorted(rel for c in range(4) for _, rel in read_chunk(manifest, c)) == sorted(
+        os.path.dirname(rel) for rel in TREE)
+
+    # 分片 0 由一个已经退出的工作者持有，心跳早已过期
+    stale = job / "leases" / "000000.0.lease"
+    stale.write_text("dead-worker")
+    past = time.time() - 600
+    os.utime(stale, (past, past))
+
+    workers = [_main("shard", "work", "--job", str(job), "--worker-id", f"w{i}") for i in range(3)]
+    for proc in workers:
+        assert proc.wait(120) == 0, proc.stdout.read().decode()
+
+    report = merge_report(str(job), write=False)
+    assert report.complete and report.ok == len(TREE) and report.fail == 0
+    assert report.reclaimed == 1
+    assert set(report.workers) <= {"w0", "w1", "w2"}
+    with open(job / "done" / "000000.json", encoding="utf-8") as f:
+        assert json.load(f)["generation"] == 1
+
+    # 输出保留目录结构，同名文件互不覆盖
+    outputs = sorted(p.relative_to(out).as_posix() for p in out.rglob("*.png"))
+    assert outputs == sorted(TREE)
+    for i, rel in enumerate(TREE):
+        assert Image.open(out.joinpath(*rel.split("/"))).width == 40 + i
+
@@ -0,0 +1,53 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app.sizing import QUALITY_LIMITS, fit_quality
+
+
+def _noisy(size=(900, 600)) -> Image.Image:
+    # 噪点让体积随质量明显变化，代理图和全尺寸的曲线形状也不完全一致
+    return Image.merge("RGB", [Image.effect_noise(size, 40 + 20 * i) for i in range(3)])
+
+
+def _encoder(img: Image.Image, calls: list):
+    def encode(q: int) -> bytes:
+        calls.append(q)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=q)
+        return buf.getvalue()
+    return encode
+
+
+def _encode_proxy(image: Image.Image, q: int) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=q)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("max_encodes", [1, 2, 4])
+@pytest.mark.parametrize("fraction", [0.2, 0.45, 0.8])
+def test_full_size_encodes_stay_within_budget(max_encodes, fraction):
+    img = _noisy()
+    top = len(_encode_proxy(img, QUALITY_LIMITS["JPEG"][1]))
+    target = int(top * fraction)
+    calls = []
+    fit = fit_quality(img, target, _encoder(img, calls), _encode_proxy, (20, 95), max_encodes=max_encodes)
+    assert fit.encodes == len(calls) <= max_encodes
+    assert fit.quality in calls
+    if fit.fits:
+        assert len(fit.data) <= target
+        # 合格结果是所有合格编码中质量最高的
+        assert fit.quality == max(q for q in calls if len(_encode_proxy(img, q)) <= target)
+
+
+def test_unreachable_target_returns_smallest_encode():
+    img = _noisy()
+    calls = []
+    fit = fit_quality(img, 1000, _encoder(img, calls), _encode_proxy, (20, 95), max_encodes=3)
+    assert not fit.fits
+    assert len(fit.data) > 1000
+    assert len(calls) <= 3
+    assert len(fit.data) == min(len(_encode_proxy(img, q)) for q in calls)
+    assert fit.quality == 20
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from PIL import Image
+
+from app.exporter import Exporter
+from app.probe import ImageMeta
+from app.templates import settings_from_dict
+from app.tokens import expand_text
+
+
+META = ImageMeta(taken=datetime(2024, 5, 6, 7, 8, 9), camera="X100V", iso=200)
+
+
+def test_known_tokens_are_expanded():
+    text = expand_text("{filename} {date} {datetime:%Y} #{index:03d} ISO{iso}", "/a/photo.jpg", META, 7)
+    assert text == "photo 2024-05-06 2024 #007 ISO200"
+
+
+def test_unknown_tokens_and_bad_specs_stay_literal():
+    assert expand_text("{filename} {unknown} {date:04d}", "/a/p.jpg", META, 1) == "p {unknown} {date:04d}"
+
+
+def test_stray_braces_stay_literal():
+    assert expand_text("{filename} :}", "/a/p.jpg", META, 1) == "p :}"
+    assert expand_text("{ {filename}", "/a/p.jpg", META, 1) == "{ p"
+    assert expand_text("{{filename}} }{", "/a/p.jpg", META, 1) == "{p} }{"
+
+
+def test_stray_brace_does_not_fail_the_batch(tmp_path):
+    paths = []
+    for name in ("a.png", "b.png"):
+        path = tmp_path / name
+        Image.new("RGB", (64, 48), (90, 120, 150)).save(path)
+        paths.append(str(path))
+    settings = settings_from_dict({"wm_text": "{filename} :}", "output_format": "PNG", "seen_mode": "off"})
+    settings.input_paths = paths
+    settings.output_dir = str(tmp_path / "out")
+    assert Exporter(settings).export_all() == (2, 0)
@@ -0,0 +1,127 @@
+"""
+隐形水印基准测试（需要 numpy）。
+
+    python tools/bench_invisible.py 图片目录 --payload CUST-0042 --qualities 95 85 75 60 50
+
+对目录中的每张图片：测量嵌入与检测的耗时（ms/百万像素）、嵌入后的 PSNR，
+以及按各 JPEG 质量重新编码后能否读出载荷；最后比较同一批图片开启/关闭隐形水印时
+整批导出的耗时，得到导出流程中每百万像素增加的时间。
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageChops, ImageStat  # noqa: E402
+
+from app.exporter import Exporter  # noqa: E402
+from app.invisible import HAS_NUMPY, detect, embed  # noqa: E402
+from app.templates import settings_from_dict  # noqa: E402
+from app.utils import is_supported_image_path  # noqa: E402
+
+
+def psnr(a: Image.Image, b: Image.Image) -> float:
+    mse = sum(v * v for v in ImageStat.Stat(ImageChops.difference(a, b)).rms) / len(a.getbands())
+    return 10 * math.log10(255 ** 2 / mse) if mse else float("inf")
+
+
+def bench_image(path: str, payload: str, key: str, qualities) -> dict:
+    with Image.open(path) as im:
+        img = im.convert("RGB")
+    mp = img.width * img.height / 1e6
+    start = time.perf_counter()
+    marked = embed(img, payload, key)
+    embed_s = time.perf_counter() - start
+    start = time.perf_counter()
+    result = detect(marked, key)
+    detect_s = time.perf_counter() - start
+    survived = {}
+    for quality in qualities:
+        buf = io.BytesIO()
+        marked.save(buf, format="JPEG", quality=quality)
+        buf.seek(0)
+        with Image.open(buf) as reencoded:
+            survived[quality] = detect(reencoded, key).payload == payload
+    return {
+        "file": os.path.basename(path),
+        "megapixels": round(mp, 2),
+        "embed_ms_per_mp": round(embed_s * 1000 / mp, 1),
+        "detect_ms_per_mp": round(detect_s * 1000 / mp, 1),
+        "psnr_db": round(psnr(img, marked), 1),
+        "lossless": result.payload == payload,
+        "jpeg": survived,
+    }
+
+
+def export_seconds(paths, overrides: dict) -> float:
+    root = tempfile.mkdtemp(prefix="wm_bench_")
+    try:
+        # 基准测试的输出不记入用户的已导出索引
+        settings = settings_from_dict(dict({"seen_mode": "off"}, **dict(overrides, write_mode="fast")))
+        settings.input_paths = list(paths)
+        settings.output_dir = root
+        start = time.perf_counter()
+        Exporter(settings).export_all()
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="隐形水印基准测试")
+    parser.add_argument("folder", help="输入图片目录")
+    parser.add_argument("--payload", default="CUST-0042")
+    parser.add_argument("--key", default="")
+    parser.add_argument("--qualities", nargs="+", type=int, default=[95, 85, 75, 60, 50], help="重新编码的 JPEG 质量")
+    parser.add_argument("--repeat", type=int, default=3, help="整批导出对比的重复次数（取最快一次）")
+    parser.add_argument("--settings", default="", help="整批导出使用的 ExportSettings 字段 JSON")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not HAS_NUMPY:
+        print("需要安装 numpy")
+        return 1
+    paths = sorted(os.path.join(args.folder, f) for f in os.listdir(args.folder)
+                   if is_supported_image_path(f))
+    if not paths:
+        print("目录中没有图片")
+        return 1
+    rows = [bench_image(p, args.payload, args.key, args.qualities) for p in paths]
+
+    base = json.loads(args.settings) if args.settings else {}
+    base.setdefault("output_format", "JPEG")
+    plain = min(export_seconds(paths, base) for _ in range(args.repeat))
+    marked = min(export_seconds(paths, dict(base, invisible_payload=args.payload, invisible_key=args.key))
+                 for _ in range(args.repeat))
+    total_mp = sum(r["megapixels"] for r in rows)
+    summary = {
+        "images": len(rows),
+        "megapixels": round(total_mp, 1),
+        "export_s": round(plain, 3),
+        "export_invisible_s": round(marked, 3),
+        "added_ms_per_mp": round((marked - plain) * 1000 / total_mp, 1) if total_mp else 0.0,
+        "added_percent": round((marked / plain - 1) * 100, 1) if plain else 0.0,
+    }
+    if args.json:
+        print(json.dumps({"images": rows, "export": summary}, ensure_ascii=False))
+        return 0
+    for r in rows:
+        jpeg = " ".join(f"q{q}:{'✓' if ok else '✗'}" for q, ok in r["jpeg"].items())
+        print(f"{r['file']:24s} {r['megapixels']:6.2f} MP  嵌入 {r['embed_ms_per_mp']:6.1f} ms/MP  "
+              f"检测 {r['detect_ms_per_mp']:6.1f} ms/MP  PSNR {r['psnr_db']:.1f} dB  {jpeg}")
+    print(f"整批导出 {summary['images']} 张 {summary['megapixels']} MP：关闭 {summary['export_s']}s，"
+          f"开启 {summary['export_invisible_s']}s，每百万像素增加 {summary['added_ms_per_mp']} ms"
+          f"（+{summary['added_percent']}%）")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
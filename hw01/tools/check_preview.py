@@ -0,0 +1,95 @@
+"""
+检查预览与导出是否一致（仅标准库 + Pillow + numpy）。
+
+    python tools/check_preview.py 图片.jpg --box 600 400 --settings '{"wm_text": "© 2024", "wm_font_size": 64}'
+
+按预览的方式（金字塔底图 + 预览分辨率叠加层）渲染，再把完整导出结果缩小到同一尺寸比较：
+- 水印区域：各自与无水印底图之差（模糊 2 像素，容忍笔画栅格化的差异），输出两者的加权 IoU
+- 像素误差：整幅的平均绝对误差
+不带 --settings 时依次检查一组内置设置（预设位置、旋转、手动位置、平铺、自适应颜色、缩放输出）；
+tests/test_preview.py 用合成图片对这组设置做同样的检查。
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.exporter import Exporter  # noqa: E402
+from app.preview import PreviewRenderer  # noqa: E402
+from app.probe import read_header  # noqa: E402
+from app.pyramid import ImagePyramid  # noqa: E402
+from app.templates import settings_from_dict  # noqa: E402
+
+
+MIN_IOU = 0.8  # 水印区域 IoU 低于该值视为不一致
+
+CASES = {
+    "preset": {"wm_text": "Sample Watermark", "wm_font_size": 96},
+    "rotated": {"wm_text": "Sample Watermark", "wm_font_size": 96, "rotation_deg": 30.0,
+                "preset_position": "center"},
+    "manual": {"wm_text": "Sample", "wm_font_size": 120, "position_mode": "manual", "manual_pos_norm": (0.1, 0.2)},
+    "tile": {"wm_text": "Sample", "wm_font_size": 80, "position_mode": "tile", "tile_spacing": (160, 120)},
+    "adaptive": {"wm_text": "Sample Watermark", "wm_font_size": 96, "wm_color_mode": "adaptive"},
+    "resized": {"wm_text": "Sample Watermark", "wm_font_size": 48, "resize_mode": "width", "resize_value": 1600},
+}
+
+
+def _strength(img: Image.Image, base: Image.Image) -> np.ndarray:
+    """水印强度图：与底图的逐像素最大通道差，再做 2 像素的方框模糊，容忍笔画栅格化的差异"""
+    a = np.asarray(img.convert("RGB"), dtype=np.int16)
+    b = np.asarray(base.convert("RGB"), dtype=np.int16)
+    diff = Image.fromarray(np.abs(a - b).max(axis=2).astype(np.uint8))
+    return np.asarray(diff.filter(ImageFilter.BoxBlur(2)), dtype=np.float64)
+
+
+def check(path: str, overrides: dict, box=(600, 400)) -> dict:
+    settings = settings_from_dict(dict({"output_format": "PNG"}, **overrides))
+    settings.input_paths = [path]
+    header = read_header(path, with_meta=True)
+
+    pyramid = ImagePyramid(path)
+    base = pyramid.render(box)
+    preview, _ = PreviewRenderer().render(settings, base, header)
+
+    exporter = Exporter(settings)
+    text = exporter.expand_text(header, 1)
+    export, _, _ = exporter.render(header, exporter.prepare_layers(exporter.target_size(*pyramid.size), text))
+    export_small = export.convert("RGB").resize(base.size, Image.LANCZOS)
+    plain_small = exporter.decode(header)[0].convert("RGB").resize(base.size, Image.LANCZOS)
+
+    ps, es = _strength(preview, base), _strength(export_small, plain_small)
+    union = np.maximum(ps, es).sum()
+    iou = float(np.minimum(ps, es).sum() / union) if union else 1.0
+    mae = float(np.abs(np.asarray(preview.convert("RGB"), dtype=np.int16)
+                       - np.asarray(export_small, dtype=np.int16)).mean())
+    return {"iou": round(iou, 3), "mae": round(mae, 2),
+            "preview_px": int((ps > 8).sum()), "export_px": int((es > 8).sum())}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="检查预览与导出是否一致")
+    parser.add_argument("image")
+    parser.add_argument("--box", type=int, nargs=2, default=(600, 400), help="预览区域大小")
+    parser.add_argument("--settings", default="", help="ExportSettings 字段的 JSON")
+    parser.add_argument("--min-iou", type=float, default=MIN_IOU, help="低于该值视为不一致")
+    args = parser.parse_args(argv)
+
+    cases = {"custom": json.loads(args.settings)} if args.settings else CASES
+    failed = 0
+    for name, overrides in cases.items():
+        result = check(args.image, overrides, tuple(args.box))
+        ok = result["iou"] >= args.min_iou
+        failed += 0 if ok else 1
+        print(f"{'OK ' if ok else 'BAD'} {name:10s} 水印区域 IoU {result['iou']:.3f}  平均误差 {result['mae']:.2f}  "
+              f"（预览 {result['preview_px']} px / 导出 {result['export_px']} px）")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+"""
+水印服务压测脚本（仅标准库）。
+
+    python tools/loadtest.py photo.jpg --url http://127.0.0.1:8765 --requests 200 --concurrency 8
+
+每个并发线程使用一条 keep-alive 连接反复 POST 同一张图片，
+结束后输出吞吐量与 p50/p90/p99 延迟，以及各状态码的数量（503 表示被队列拒绝）。
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法百分位"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run(url: str, body: bytes, total: int, concurrency: int, template: str = "",
+        settings: Optional[str] = None, name: str = "") -> Tuple[List[float], Counter, float, int]:
+    """发送 total 个请求，返回 (成功请求延迟毫秒, 状态码计数, 总耗时秒, 接收字节数)"""
+    parts = urlsplit(url)
+    query = {k: v for k, v in (("template", template), ("name", name)) if v}
+    target = "/watermark" + (f"?{urlencode(query)}" if query else "")
+    headers = {"Content-Type": "application/octet-stream"}
+    if settings:
+        headers["X-Export-Settings"] = settings
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    received = [0]
+    lock = threading.Lock()
+    remaining = [total]
+
+    def take() -> bool:
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def client() -> None:
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+        try:
+            while take():
+                start = time.perf_counter()
+                try:
+                    conn.request("POST", target, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    data = resp.read()
+                    status = resp.status
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+                    status, data = 0, b""
+                elapsed = (time.perf_counter() - start) * 1000.0
+                with lock:
+                    statuses[status] += 1
+                    if status == 200:
+                        latencies.append(elapsed)
+                        received[0] += len(data)
+        finally:
+            conn.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    return sorted(latencies), statuses, time.perf_counter() - start, received[0]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="水印服务压测")
+    parser.add_argument("image", help="用于请求体的图片文件")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--template", default="", help="服务端模板名")
+    parser.add_argument("--settings", default="", help="X-Export-Settings JSON")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args(argv)
+
+    with open(args.image, "rb") as f:
+        body = f.read()
+    latencies, statuses, wall, received = run(args.url, body, args.requests, args.concurrency,
+                                              args.template, args.settings, os.path.basename(args.image))
+    result = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "ok": len(latencies),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p90_ms": round(percentile(latencies, 90), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(latencies[-1], 1) if latencies else 0.0,
+        "received_mb": round(received / 1e6, 2),
+    }
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(f"请求 {result['requests']}（并发 {result['concurrency']}），成功 {result['ok']}，"
+              f"状态码 {result['statuses']}")
+        print(f"耗时 {result['wall_s']}s，吞吐 {result['throughput_rps']} 次/秒，接收 {result['received_mb']} MB")
+        print(f"延迟 p50 {result['p50_ms']} ms  p90 {result['p90_ms']} ms  p99 {result['p99_ms']} ms  "
+              f"max {result['max_ms']} ms")
+    return 0 if latencies else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())